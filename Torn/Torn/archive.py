@@ -0,0 +1,175 @@
+"""
+Cold-history archive for append-only tables.
+
+``archive_history`` moves rows older than a cutoff out of the database into
+date-partitioned, compressed columnar files under ``HISTORY_ARCHIVE_DIR``:
+
+    <HISTORY_ARCHIVE_DIR>/<table>/date=YYYY-MM-DD/part-<first pk>-<last pk>.<ext>
+
+Files are Parquet (zstd) when pyarrow is installed and compressed NumPy
+``.npz`` otherwise; readers accept both. ``history_values`` yields archived
+rows followed by the live ones so analytics code does not need to know where
+a row currently lives.
+"""
+
+import io
+import os
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.apps import apps
+from django.conf import settings
+from django.utils import timezone
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Optional: fall back to compressed NumPy files
+    pyarrow = None
+
+# Tables that can be archived: name -> (model label, creation timestamp field)
+ARCHIVE_TABLES = {
+    'userrecord': ('users.UserRecord', 'created_on'),
+    'employee': ('company.Employee', 'created_on'),
+}
+FORMATS = ('parquet', 'npz')
+
+# Suffix marking the null mask stored next to a nullable column in .npz files
+NULL_SUFFIX = '__null'
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+
+def default_format():
+    return 'parquet' if pyarrow is not None else 'npz'
+
+
+def table_model(table):
+    return apps.get_model(ARCHIVE_TABLES[table][0])
+
+
+def archive_columns(table):
+    """Database column names (attnames) of ``table``, in model order."""
+    return [field.attname for field in table_model(table)._meta.concrete_fields]
+
+
+def partition_dir(table, day, root=None):
+    return os.path.join(root or settings.HISTORY_ARCHIVE_DIR, table, f'date={day.isoformat()}')
+
+
+def write_partition(table, day, rows, file_format=None, root=None):
+    """
+    Write ``rows`` (dicts keyed by attname, all created on ``day``) as one part
+    file and return its path. The file appears atomically, and writing the
+    same pk range again replaces it.
+    """
+    file_format = file_format or default_format()
+    columns = archive_columns(table)
+    directory = partition_dir(table, day, root)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"part-{rows[0]['id']}-{rows[-1]['id']}.{file_format}")
+
+    data = {column: [row[column] for row in rows] for column in columns}
+    buffer = io.BytesIO()
+    if file_format == 'parquet':
+        if pyarrow is None:
+            raise RuntimeError('Parquet archives need pyarrow installed')
+        pyarrow.parquet.write_table(pyarrow.table(data), buffer, compression='zstd')
+    else:
+        np.savez_compressed(buffer, **_to_arrays(table, data))
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(buffer.getvalue())
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_partition(path):
+    """Rows of one part file as dicts keyed by attname."""
+    if path.endswith('.parquet'):
+        if pyarrow is None:
+            raise RuntimeError(f'{path} needs pyarrow installed to be read')
+        return pyarrow.parquet.read_table(path).to_pylist()
+
+    with np.load(path) as arrays:
+        columns = {
+            name: _to_python(arrays[name], arrays.get(name + NULL_SUFFIX))
+            for name in arrays.files if not name.endswith(NULL_SUFFIX)
+        }
+    count = len(next(iter(columns.values()), []))
+    return [{name: values[i] for name, values in columns.items()} for i in range(count)]
+
+
+def archived_rows(table, start=None, end=None, root=None):
+    """Rows of every partition dated within [start, end], oldest partition first."""
+    table_dir = os.path.join(root or settings.HISTORY_ARCHIVE_DIR, table)
+    if not os.path.isdir(table_dir):
+        return
+    for partition in sorted(os.listdir(table_dir)):
+        day = datetime.strptime(partition.split('=', 1)[1], '%Y-%m-%d').date()
+        if (start and day < start) or (end and day > end):
+            continue
+        directory = os.path.join(table_dir, partition)
+        parts = [name for name in os.listdir(directory) if name.endswith(FORMATS)]
+        # part-<first pk>-<last pk>: read in pk order
+        for name in sorted(parts, key=lambda name: int(name.split('-')[1])):
+            yield from read_partition(os.path.join(directory, name))
+
+
+def history_values(table, fields, start=None, end=None, root=None):
+    """
+    Yield ``fields`` of every ``table`` row created between the ``start`` and
+    ``end`` dates (inclusive), archived rows first and then the live rows.
+    """
+    model_label, time_field = ARCHIVE_TABLES[table]
+    for row in archived_rows(table, start, end, root):
+        created = timezone.localdate(row[time_field])
+        if (start and created < start) or (end and created > end):
+            continue
+        yield {field: row[field] for field in fields}
+
+    # Aware datetime bounds rather than __date so the created_on index is usable
+    queryset = apps.get_model(model_label).objects.order_by('pk')
+    if start:
+        queryset = queryset.filter(**{f'{time_field}__gte': day_start(start)})
+    if end:
+        queryset = queryset.filter(**{f'{time_field}__lt': day_start(end + timedelta(days=1))})
+    yield from queryset.values(*fields).iterator(chunk_size=5000)
+
+
+def _to_arrays(table, data):
+    """Typed NumPy arrays per column, with a null mask for nullable non-datetime columns."""
+    types = {field.attname: field.get_internal_type() for field in table_model(table)._meta.concrete_fields}
+    arrays = {}
+    for column, values in data.items():
+        if types[column] == 'DateTimeField':
+            # NaT stands in for NULL; stored as naive UTC
+            arrays[column] = np.array(
+                [value.astimezone(dt_timezone.utc).replace(tzinfo=None) if value else None for value in values],
+                dtype='datetime64[us]',
+            )
+            continue
+        nulls = np.array([value is None for value in values])
+        if nulls.any():
+            arrays[column + NULL_SUFFIX] = nulls
+        if types[column] in ('CharField', 'TextField'):
+            arrays[column] = np.array(['' if value is None else value for value in values], dtype=str)
+        elif types[column] == 'FloatField':
+            arrays[column] = np.array([0.0 if value is None else value for value in values], dtype=np.float64)
+        elif types[column] == 'BooleanField':
+            arrays[column] = np.array([bool(value) for value in values])
+        else:
+            arrays[column] = np.array([0 if value is None else value for value in values], dtype=np.int64)
+    return arrays
+
+
+def _to_python(array, nulls=None):
+    if np.issubdtype(array.dtype, np.datetime64):
+        return [value.replace(tzinfo=dt_timezone.utc) if value else None for value in array.tolist()]
+    values = array.tolist()
+    if nulls is not None:
+        values = [None if null else value for value, null in zip(values, nulls)]
+    return values
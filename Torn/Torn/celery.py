@@ -17,10 +17,65 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 # Load task modules from all registered Django app configs.
 app.autodiscover_tasks()
 
+# Tasks waiting on the Torn API (or other remote sources) and tasks that only
+# work the database run on separate queues, so a slow API cannot hold up
+# maintenance and vice versa:
+#   celery -A Torn worker -Q torn_api --concurrency 2
+#   celery -A Torn worker -Q database --concurrency 1
+API_QUEUE = 'torn_api'
+DB_QUEUE = 'database'
+
+app.conf.task_routes = {
+    'racket.tasks.fetch_rackets_task': {'queue': API_QUEUE},
+    'users.tasks.update_user_data_task': {'queue': API_QUEUE},
+    'users.tasks.update_user_data_shard_task': {'queue': API_QUEUE},
+    'users.tasks.merge_user_data_shards': {'queue': DB_QUEUE},
+    'users.tasks.update_cpr_data_task': {'queue': API_QUEUE},
+    'faction.tasks.update_faction_data_task': {'queue': API_QUEUE},
+    'company.tasks.fetch_company_data_task': {'queue': API_QUEUE},
+    'company.tasks.compact_employee_history_task': {'queue': DB_QUEUE},
+    'users.tasks.archive_history_task': {'queue': DB_QUEUE},
+}
+
+# 'expires' drops a run still queued when the next one is due, so a stalled
+# worker does not come back to a pile of identical ingests
 app.conf.beat_schedule = {
     'fetch-rackets-every-minute': {
         'task': 'racket.tasks.fetch_rackets_task',
         'schedule': crontab(minute='*'),  # Runs every minute
+        'options': {'expires': 55},
+    },
+    # Each run only fetches the factions due a poll (see faction/polling.py),
+    # so this is the shortest possible interval rather than the usual one
+    'update-user-data-every-3-minutes': {
+        'task': 'users.tasks.update_user_data_task',
+        'schedule': crontab(minute='*/3'),
+        'options': {'expires': 170},  # A tick that finds a run still going skips on its lock
+    },
+    'update-faction-data-hourly': {
+        'task': 'faction.tasks.update_faction_data_task',
+        'schedule': crontab(minute=10),
+        'options': {'expires': 3000},
+    },
+    'fetch-company-data-hourly': {
+        'task': 'company.tasks.fetch_company_data_task',
+        'schedule': crontab(minute=25),
+        'options': {'expires': 3000},
+    },
+    'update-cpr-data-daily': {
+        'task': 'users.tasks.update_cpr_data_task',
+        'schedule': crontab(hour=3, minute=40),
+        'options': {'expires': 3600},
+    },
+    'compact-employee-history-daily': {
+        'task': 'company.tasks.compact_employee_history_task',
+        'schedule': crontab(hour=4, minute=15),
+        'options': {'expires': 3600},
+    },
+    'archive-history-weekly': {
+        'task': 'users.tasks.archive_history_task',
+        'schedule': crontab(hour=5, minute=0, day_of_week='sunday'),
+        'options': {'expires': 3600},
     },
 }
 
@@ -31,6 +86,9 @@ app.conf.update(
     task_serializer='json',
     result_serializer='json',
     timezone='UTC',
+    # With acks_late a worker holds one unacknowledged task at a time, so a
+    # crash only redelivers the task that was running
+    worker_prefetch_multiplier=1,
 )
 
 @app.task(bind=True)
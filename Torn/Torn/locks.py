@@ -0,0 +1,147 @@
+"""
+Cross-host "only one run at a time" locks for ingest commands and tasks.
+
+``single_instance(name)`` holds a database lock for the duration of a block:
+
+    with single_instance('update_user_data'):
+        ...  # raises AlreadyRunning if another run holds the lock
+
+or, as a decorator, skips the call (returning None) while another run holds it:
+
+    @shared_task
+    @single_instance('fetch_rackets')
+    def fetch_rackets_task(): ...
+
+``single_instance(name, shared=True)`` may be held by several runs at once,
+but never together with the exclusive lock of the same name; update_user_data
+shards use it so they exclude an unsharded run without excluding each other.
+
+On PostgreSQL this is a session advisory lock, released by the server even if
+the process dies. Other databases use a lease row in ``users.InstanceLock``
+that expires after ``lease_seconds`` so a crashed run cannot block forever;
+keep the lease longer than the run it protects.
+"""
+
+import functools
+import hashlib
+import logging
+import os
+import socket
+import uuid
+from contextlib import ContextDecorator
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Shared lease rows are named <lock name><SHARED_SEPARATOR><holder>
+SHARED_SEPARATOR = '/shared/'
+
+
+class AlreadyRunning(Exception):
+    """Another process holds the named lock."""
+
+    def __init__(self, name):
+        super().__init__(f'{name} is already running')
+        self.name = name
+
+
+def advisory_key(name):
+    """Stable signed 64-bit key for pg_try_advisory_lock."""
+    return int.from_bytes(hashlib.blake2b(name.encode(), digest_size=8).digest(), 'big', signed=True)
+
+
+class single_instance(ContextDecorator):
+    """Hold the named lock for a block, or skip a decorated call while it is held elsewhere."""
+
+    def __init__(self, name, lease_seconds=None, shared=False):
+        self.name = name
+        self.lease_seconds = lease_seconds or settings.INSTANCE_LOCK_LEASE_SECONDS
+        self.shared = shared
+        self.owner = None
+        self.lease_name = None
+
+    def __enter__(self):
+        if not self.acquire():
+            raise AlreadyRunning(self.name)
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+        return False
+
+    def __call__(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            # A fresh lock per call so overlapping calls in one process do not share an owner
+            try:
+                with type(self)(self.name, self.lease_seconds, self.shared):
+                    return func(*args, **kwargs)
+            except AlreadyRunning:
+                logger.info('Skipping %s: another run holds the lock', self.name)
+                return None
+        return wrapper
+
+    def acquire(self):
+        """Try to take the lock without waiting; return whether it was taken."""
+        holder = uuid.uuid4().hex[:8]
+        owner = f'{socket.gethostname()}:{os.getpid()}:{holder}'
+        if connection.vendor == 'postgresql':
+            function = 'pg_try_advisory_lock_shared' if self.shared else 'pg_try_advisory_lock'
+            with connection.cursor() as cursor:
+                cursor.execute(f'SELECT {function}(%s)', [advisory_key(self.name)])
+                acquired = cursor.fetchone()[0]
+        else:
+            self.lease_name = self.name + SHARED_SEPARATOR + holder if self.shared else self.name
+            acquired = self._take_lease(owner)
+        if acquired:
+            self.owner = owner
+        return acquired
+
+    def release(self):
+        if self.owner is None:
+            return
+        if connection.vendor == 'postgresql':
+            function = 'pg_advisory_unlock_shared' if self.shared else 'pg_advisory_unlock'
+            with connection.cursor() as cursor:
+                cursor.execute(f'SELECT {function}(%s)', [advisory_key(self.name)])
+        else:
+            self._drop_lease(self.owner)
+        self.owner = None
+
+    def _take_lease(self, owner):
+        InstanceLock = apps.get_model('users', 'InstanceLock')
+        now = timezone.now()
+        expires_at = now + timedelta(seconds=self.lease_seconds)
+
+        # Take over an expired lease; the expiry check and the write are one statement
+        if not InstanceLock.objects.filter(name=self.lease_name, expires_at__lte=now).update(
+            owner=owner, acquired_at=now, expires_at=expires_at
+        ):
+            try:
+                with transaction.atomic():
+                    InstanceLock.objects.create(
+                        name=self.lease_name, owner=owner, acquired_at=now, expires_at=expires_at
+                    )
+            except IntegrityError:
+                return False
+
+        # Claim first, then look for live holders of the other mode, so two
+        # racing runs cannot both miss each other (at worst both back off)
+        live = InstanceLock.objects.filter(expires_at__gt=now)
+        if self.shared:
+            conflict = live.filter(name=self.name).exists()
+        else:
+            conflict = live.filter(name__startswith=self.name + SHARED_SEPARATOR).exists()
+        if conflict:
+            self._drop_lease(owner)
+            return False
+        return True
+
+    def _drop_lease(self, owner):
+        InstanceLock = apps.get_model('users', 'InstanceLock')
+        InstanceLock.objects.filter(name=self.lease_name, owner=owner).delete()
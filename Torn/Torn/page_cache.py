@@ -0,0 +1,51 @@
+"""
+Cache for page data that only changes when an ingest command runs.
+
+Every dataset ("company", "faction", "racket") has a version stamp stored in
+the cache. Views cache their computed context under a key made of the page
+name, its request parameters and the current versions of the datasets it
+reads; ingest commands call ``bump_dataset_version`` after writing, so every
+entry built from older data simply stops being looked up and ages out.
+"""
+
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+COMPANY = 'company'
+FACTION = 'faction'
+RACKET = 'racket'
+
+
+def _version_key(dataset):
+    return f'dataset-version:{dataset}'
+
+
+def dataset_version(dataset):
+    """Current version stamp of ``dataset``."""
+    # A missing stamp (fresh or evicted cache) gets the current time, never a value used before
+    return cache.get_or_set(_version_key(dataset), time.time_ns, timeout=None)
+
+
+def bump_dataset_version(*datasets):
+    """Invalidate every cached page built from ``datasets``; called by ingest commands."""
+    cache.set_many({_version_key(dataset): time.time_ns() for dataset in datasets}, timeout=None)
+
+
+def cached_page_data(name, params, datasets, compute):
+    """
+    Return ``compute()`` for page ``name``, reusing the cached value while the
+    request ``params`` match and none of ``datasets`` has been re-ingested.
+    """
+    versions = {dataset: dataset_version(dataset) for dataset in datasets}
+    digest = hashlib.md5(json.dumps([params, versions], sort_keys=True, default=str).encode()).hexdigest()
+    key = f'page-data:{name}:{digest}'
+
+    data = cache.get(key)
+    if data is None:
+        data = compute()
+        cache.set(key, data, settings.PAGE_CACHE_TIMEOUT)
+    return data
@@ -176,6 +176,50 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Torn API client (see Torn/torn_api.py)
+# Calls per minute allowed per API key, shared by every command on this host
+TORN_API_CALLS_PER_MINUTE = env.int('TORN_API_CALLS_PER_MINUTE', default=60)
+# Directory holding the per-key rate limiter state files (defaults to the temp dir)
+TORN_API_STATE_DIR = env('TORN_API_STATE_DIR', default=None)
+
+# Cache used for page data (see Torn/page_cache.py). Ingest commands and Celery
+# workers bump dataset versions in it, so it must be shared by every host that
+# runs the web server or a worker: the default is Redis next to the Celery broker
+# (database 1). A filecache:// or locmemcache:// CACHE_URL only works when the web
+# server and every ingest run on one host and share a temp dir.
+# Tests that touch the cache override it with locmem.
+CACHES = {'default': env.cache_url('CACHE_URL', default='redis://localhost:6379/1')}
+# Seconds a page's data stays cached when no ingest has run in between
+PAGE_CACHE_TIMEOUT = env.int('PAGE_CACHE_TIMEOUT', default=3600)
+
+# The racket page's live event feed (racket/events.py) is an endless async response, so
+# it only works when the site is served through Torn.asgi by an ASGI server (install one,
+# e.g. `gunicorn Torn.asgi:application -k uvicorn.workers.UvicornWorker`). Under WSGI each
+# open page would hold a worker forever, so it stays off and the page reloads instead.
+RACKET_EVENTS_ENABLED = env.bool('RACKET_EVENTS_ENABLED', default=False)
+# Seconds between the racket event feed's checks for new Racket rows (one check per process)
+RACKET_EVENTS_POLL_SECONDS = env.int('RACKET_EVENTS_POLL_SECONDS', default=5)
+# Seconds between reloads of the racket page when the event feed is off
+RACKET_PAGE_REFRESH_SECONDS = env.int('RACKET_PAGE_REFRESH_SECONDS', default=60)
+
+# Shard tasks the scheduled update_user_data run is split into (see users/sharding.py);
+# give each shard its own active TornUserProfile key
+USER_DATA_SHARDS = env.int('USER_DATA_SHARDS', default=1)
+# Faction requests the scheduled update_user_data keeps in flight (its --concurrency)
+USER_DATA_CONCURRENCY = env.int('USER_DATA_CONCURRENCY', default=4)
+
+# Bounds of the adaptive per-faction poll interval used by update_user_data --due-only
+# (see faction/polling.py): busiest factions every MIN seconds, dormant ones every MAX
+FACTION_POLL_MIN_SECONDS = env.int('FACTION_POLL_MIN_SECONDS', default=180)
+FACTION_POLL_MAX_SECONDS = env.int('FACTION_POLL_MAX_SECONDS', default=3600)
+
+# Seconds a single_instance lease lasts on databases without advisory locks
+# (see Torn/locks.py); a run that dies leaves the lock held for at most this long
+INSTANCE_LOCK_LEASE_SECONDS = env.int('INSTANCE_LOCK_LEASE_SECONDS', default=3600)
+
+# Directory archive_history writes date-partitioned cold history to (see Torn/archive.py)
+HISTORY_ARCHIVE_DIR = env('HISTORY_ARCHIVE_DIR', default=str(BASE_DIR / 'archive'))
+
 # Celery configuration
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Torn.settings')
 
@@ -190,12 +234,7 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 # Load task modules from all registered Django app configs.
 app.autodiscover_tasks()
 
-CELERY_BEAT_SCHEDULE = {
-    'fetch-rackets-every-hour': {
-        'task': 'racket.tasks.fetch_rackets_task',
-        'schedule': 3600.0,  # Run every hour
-    },
-}
+# The beat schedule and queue routing live in Torn/celery.py
 
 CELERY_BROKER_URL = 'redis://localhost:6379/0'  # Example broker URL, adjust as needed
 CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'  # Example result backend, adjust as needed
@@ -0,0 +1,235 @@
+import tempfile
+import time
+import uuid
+from unittest import mock
+
+import httpx
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from users.models import TornUserProfile
+from .celery import API_QUEUE, DB_QUEUE, app as celery_app
+from .torn_api import KeyPool, TokenBucket, TornAPIError, TornClient, get_key_pool
+
+
+class TokenBucketTests(SimpleTestCase):
+    def setUp(self):
+        self.state_dir = tempfile.mkdtemp()
+
+    def test_burst_up_to_capacity_then_waits(self):
+        bucket = TokenBucket('test', capacity=3, period=60, state_dir=self.state_dir)
+        with mock.patch('Torn.torn_api.time.time', return_value=1000.0):
+            delays = [bucket.reserve() for _ in range(4)]
+        self.assertEqual(delays[:3], [0.0, 0.0, 0.0])
+        self.assertAlmostEqual(delays[3], 20.0)
+
+    def test_budget_is_shared_between_instances(self):
+        first = TokenBucket('shared', capacity=1, period=60, state_dir=self.state_dir)
+        second = TokenBucket('shared', capacity=1, period=60, state_dir=self.state_dir)
+        with mock.patch('Torn.torn_api.time.time', return_value=1000.0):
+            self.assertEqual(first.reserve(), 0.0)
+            self.assertAlmostEqual(second.reserve(), 60.0)
+
+    def test_tokens_refill_over_time(self):
+        bucket = TokenBucket('refill', capacity=2, period=60, state_dir=self.state_dir)
+        with mock.patch('Torn.torn_api.time.time', return_value=1000.0):
+            bucket.reserve()
+            bucket.reserve()
+        with mock.patch('Torn.torn_api.time.time', return_value=1030.0):
+            self.assertEqual(bucket.reserve(), 0.0)
+
+    def test_available_does_not_consume(self):
+        bucket = TokenBucket('peek', capacity=5, state_dir=self.state_dir)
+        with mock.patch('Torn.torn_api.time.time', return_value=1000.0):
+            bucket.reserve()
+            self.assertEqual(bucket.available(), 4)
+            self.assertEqual(bucket.available(), 4)
+
+
+class TornClientParseTests(SimpleTestCase):
+    def _response(self, status_code, payload):
+        return mock.Mock(status_code=status_code, json=mock.Mock(return_value=payload))
+
+    def test_returns_payload(self):
+        self.assertEqual(TornClient.parse(self._response(200, {'ID': 1})), {'ID': 1})
+
+    def test_error_payload_raises_with_code(self):
+        with self.assertRaises(TornAPIError) as ctx:
+            TornClient.parse(self._response(200, {'error': {'code': 5, 'error': 'Too many requests'}}))
+        self.assertEqual(ctx.exception.code, 5)
+
+    def test_http_failure_raises(self):
+        with self.assertRaises(TornAPIError) as ctx:
+            TornClient.parse(self._response(502, None))
+        self.assertEqual(ctx.exception.status_code, 502)
+
+
+class TornClientGetManyTests(SimpleTestCase):
+    def test_yields_every_job_with_payload_or_error(self):
+        def handler(request):
+            faction_id = request.url.path.rsplit('/', 1)[-1]
+            if faction_id == '2':
+                return httpx.Response(200, json={'error': {'code': 6, 'error': 'Incorrect ID'}})
+            return httpx.Response(200, json={'ID': int(faction_id)})
+
+        real_client = httpx.AsyncClient
+
+        def fake_client(**kwargs):
+            return real_client(transport=httpx.MockTransport(handler), **kwargs)
+
+        client = TornClient('test-key', calls_per_minute=600)
+        client.bucket = TokenBucket('get_many', capacity=600, state_dir=tempfile.mkdtemp())
+        jobs = [(i, f'faction/{i}', {'selections': 'basic'}) for i in (1, 2, 3)]
+        with mock.patch('Torn.torn_api.httpx.AsyncClient', side_effect=fake_client):
+            results = {tag: (data, error) for tag, data, error in client.get_many(jobs, concurrency=2)}
+
+        self.assertEqual(results[1], ({'ID': 1}, None))
+        self.assertEqual(results[3], ({'ID': 3}, None))
+        self.assertIsNone(results[2][0])
+        self.assertEqual(results[2][1].code, 6)
+
+    def test_closing_early_stops_sending_requests(self):
+        sent = []
+
+        def handler(request):
+            sent.append(request.url.path)
+            return httpx.Response(200, json={'ID': 1})
+
+        real_client = httpx.AsyncClient
+
+        def fake_client(**kwargs):
+            return real_client(transport=httpx.MockTransport(handler), **kwargs)
+
+        client = TornClient('test-key', calls_per_minute=6000)
+        client.bucket = TokenBucket('get_many_close', capacity=6000, state_dir=tempfile.mkdtemp())
+        jobs = [(i, f'faction/{i}', {}) for i in range(200)]
+        with mock.patch('Torn.torn_api.httpx.AsyncClient', side_effect=fake_client):
+            results = client.get_many(jobs, concurrency=2)
+            next(results)
+            # The loop runs ahead by at most the queue plus the requests in flight
+            time.sleep(0.2)
+            self.assertLessEqual(len(sent), 8)
+            results.close()
+            time.sleep(0.2)
+
+        self.assertLessEqual(len(sent), 8)
+
+
+class CelerySetupTests(SimpleTestCase):
+    def setUp(self):
+        celery_app.loader.import_default_modules()
+
+    def test_every_scheduled_task_is_registered_and_routed(self):
+        for entry in celery_app.conf.beat_schedule.values():
+            task = celery_app.tasks[entry['task']]
+            self.assertTrue(task.acks_late, entry['task'])
+            self.assertTrue(task.soft_time_limit < task.time_limit, entry['task'])
+            queue = celery_app.amqp.router.route({}, entry['task'])['queue'].name
+            self.assertIn(queue, (API_QUEUE, DB_QUEUE))
+
+    def test_task_runs_its_command(self):
+        task = celery_app.tasks['users.tasks.update_user_data_task']
+        with mock.patch('users.tasks.call_command') as call_command:
+            task.apply()
+        call_command.assert_called_once_with('update_user_data', delta=True, due_only=True, concurrency=4)
+
+
+@override_settings(TORN_API_STATE_DIR=tempfile.mkdtemp())
+class KeyPoolTests(TestCase):
+    def setUp(self):
+        owner = User.objects.create(username='owner')
+        # Fresh keys per test: clients and their budgets are shared process-wide
+        self.keys = [f'key-{uuid.uuid4().hex[:8]}' for _ in range(2)]
+        for key in self.keys:
+            TornUserProfile.objects.create(user=owner, tornuser=key, tornapi=key)
+        self.calls = []
+
+    def pool_with_responses(self, responses):
+        """KeyPool whose clients answer from ``responses`` ({key: payload or TornAPIError})."""
+        def fake_get(client, path, **params):
+            self.calls.append(client.api_key)
+            response = responses.get(client.api_key, {'ok': True})
+            if isinstance(response, TornAPIError):
+                raise response
+            return response
+
+        patcher = mock.patch.object(TornClient, 'get', autospec=True, side_effect=fake_get)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return KeyPool.from_profiles()
+
+    def test_calls_rotate_over_active_keys(self):
+        pool = self.pool_with_responses({})
+        for _ in range(4):
+            pool.get('torn/')
+        self.assertEqual(sorted(self.calls), sorted(self.keys * 2))
+
+    def test_invalid_key_is_deactivated_and_the_call_retried(self):
+        pool = self.pool_with_responses({self.keys[0]: TornAPIError('Incorrect key', code=2)})
+        for _ in range(3):
+            self.assertEqual(pool.get('torn/'), {'ok': True})
+
+        self.assertEqual(self.calls.count(self.keys[0]), 1)
+        self.assertFalse(TornUserProfile.objects.get(tornapi=self.keys[0]).is_active)
+        self.assertTrue(TornUserProfile.objects.get(tornapi=self.keys[1]).is_active)
+
+    def test_rate_limited_key_sits_out(self):
+        pool = self.pool_with_responses({self.keys[0]: TornAPIError('Too many requests', code=5)})
+        for _ in range(3):
+            pool.get('torn/')
+
+        self.assertEqual(self.calls.count(self.keys[0]), 1)
+        self.assertTrue(TornUserProfile.objects.get(tornapi=self.keys[0]).is_active)
+        self.assertGreater(pool.stats()[0]['paused_for'], 0)
+
+    def test_request_errors_are_not_retried(self):
+        error = TornAPIError('Incorrect ID', code=6)
+        pool = self.pool_with_responses({key: error for key in self.keys})
+        with self.assertRaises(TornAPIError):
+            pool.get('faction/1')
+        self.assertEqual(len(self.calls), 1)
+
+    def test_retries_stop_when_every_key_is_paused(self):
+        error = TornAPIError('Key paused', code=18)
+        pool = self.pool_with_responses({key: error for key in self.keys})
+        with self.assertRaises(TornAPIError):
+            pool.get('torn/')
+        self.assertEqual(sorted(self.calls), sorted(self.keys))
+
+    @mock.patch('Torn.torn_api.MAX_POOL_ATTEMPTS', 1)
+    def test_retries_are_capped(self):
+        error = TornAPIError('Too many requests', code=5)
+        pool = self.pool_with_responses({key: error for key in self.keys})
+        with self.assertRaises(TornAPIError) as ctx:
+            pool.get('torn/')
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(ctx.exception.code, 5)
+
+    def test_get_many_picks_keys_on_the_async_loop(self):
+        def handler(request):
+            self.calls.append(request.url.params['key'])
+            if request.url.params['key'] == self.keys[0]:
+                return httpx.Response(200, json={'error': {'code': 2, 'error': 'Incorrect key'}})
+            return httpx.Response(200, json={'ID': int(request.url.path.rsplit('/', 1)[-1])})
+
+        real_client = httpx.AsyncClient
+
+        def fake_client(**kwargs):
+            return real_client(transport=httpx.MockTransport(handler), **kwargs)
+
+        pool = KeyPool.from_profiles()
+        jobs = [(i, f'faction/{i}', {'selections': 'basic'}) for i in (1, 2, 3)]
+        with mock.patch('Torn.torn_api.httpx.AsyncClient', side_effect=fake_client):
+            results = {tag: (data, error) for tag, data, error in pool.get_many(jobs, concurrency=1)}
+
+        self.assertEqual(results, {i: ({'ID': i}, None) for i in (1, 2, 3)})
+        self.assertEqual(self.calls.count(self.keys[0]), 1)
+        self.assertFalse(TornUserProfile.objects.get(tornapi=self.keys[0]).is_active)
+
+    def test_get_key_pool_is_kept_per_fallback_key(self):
+        first, second = get_key_pool('fallback-a'), get_key_pool('fallback-b')
+        self.assertIs(get_key_pool('fallback-a'), first)
+        self.assertIn('fallback-a', [key.api_key for key in first.keys])
+        self.assertIn('fallback-b', [key.api_key for key in second.keys])
+        self.assertNotIn('fallback-a', [key.api_key for key in second.keys])
@@ -0,0 +1,561 @@
+"""
+Shared Torn API client.
+
+Every management command talks to the Torn API through ``TornClient`` so that
+they reuse one pooled ``requests.Session`` (keep-alive, connection reuse) and
+draw from one rate budget per API key, even when several commands run at the
+same time in different processes.
+
+The budget is a token bucket whose state lives in a small JSON file per key
+(see ``TORN_API_STATE_DIR``). Reads and writes of that file are serialised
+with an OS file lock, so cron jobs and Celery workers on the same host share
+the limit instead of each keeping their own ad-hoc ``deque`` of timestamps.
+
+``get_key_pool()`` spreads calls over every active ``TornUserProfile`` key:
+each call goes to the key with the most budget left, keys that hit a rate
+limit or are paused sit out for a while, and invalid keys are deactivated.
+"""
+
+import asyncio
+import collections
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import queue
+import tempfile
+import threading
+import time
+
+import httpx
+import requests
+from django.apps import apps
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# fcntl is only available on Unix; fall back to msvcrt on Windows
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:
+    HAS_FCNTL = False
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+BASE_URL = 'https://api.torn.com'
+
+# Torn API error codes that are about the key rather than the request
+KEY_INVALID = 2
+KEY_RATE_LIMITED = 5
+KEY_OWNER_INACTIVE = 13
+KEY_PAUSED = 18
+
+# Seconds a key sits out of the pool after each kind of error
+KEY_COOLDOWNS = {
+    KEY_RATE_LIMITED: 60,
+    KEY_OWNER_INACTIVE: 3600,
+    KEY_PAUSED: 3600,
+}
+# Longest the pool waits for a cooling-down key before giving up on a call
+MAX_POOL_WAIT = 60
+# Keys a pooled call tries before giving up
+MAX_POOL_ATTEMPTS = 5
+# Seconds before get_key_pool() reloads the active profile keys
+POOL_REFRESH_SECONDS = 300
+# How often the get_many() event loop checks for a full queue or a stopped consumer
+STREAM_POLL_SECONDS = 0.05
+
+
+class TornAPIError(Exception):
+    """Raised when the Torn API returns an HTTP failure or an error payload."""
+
+    def __init__(self, message, code=None, status_code=None):
+        super().__init__(message)
+        self.code = code
+        self.status_code = status_code
+
+
+def _state_dir():
+    return getattr(settings, 'TORN_API_STATE_DIR', None) or tempfile.gettempdir()
+
+
+def _key_fingerprint(api_key):
+    """Short stable identifier for a key so the key itself never hits disk."""
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:16]
+
+
+class TokenBucket:
+    """
+    Process-safe token bucket stored in a lock-protected JSON file.
+
+    ``capacity`` tokens refill evenly over ``period`` seconds. ``reserve()``
+    takes a token and returns how long the caller must wait before using it,
+    which lets sync and async callers share the same bookkeeping.
+    """
+
+    def __init__(self, name, capacity, period=60.0, state_dir=None):
+        self.capacity = float(capacity)
+        self.period = float(period)
+        self.rate = self.capacity / self.period
+        self.path = os.path.join(state_dir or _state_dir(), f'torn_api_{name}.bucket')
+        self._thread_lock = threading.Lock()
+
+    def _lock(self, fh):
+        if HAS_FCNTL:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+        else:
+            fh.seek(0)
+            msvcrt.locking(fh.fileno(), msvcrt.LK_LOCK, 1)
+
+    def _unlock(self, fh):
+        if HAS_FCNTL:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+        else:
+            fh.seek(0)
+            msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def reserve(self, tokens=1):
+        """Consume ``tokens`` and return the delay (seconds) before they are available."""
+        available = self._update(tokens)
+        if available >= 0:
+            return 0.0
+        return -available / self.rate
+
+    def available(self):
+        """Tokens left right now (negative while callers are queued behind the budget)."""
+        return self._update(0)
+
+    def _update(self, tokens):
+        """Refill, take ``tokens`` and return the tokens left, under the file lock."""
+        with self._thread_lock:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            with os.fdopen(fd, 'r+') as fh:
+                self._lock(fh)
+                try:
+                    now = time.time()
+                    fh.seek(0)
+                    try:
+                        state = json.loads(fh.read() or '{}')
+                    except ValueError:
+                        state = {}
+                    available = state.get('tokens', self.capacity)
+                    updated = state.get('updated', now)
+                    available = min(self.capacity, available + (now - updated) * self.rate)
+                    available -= tokens
+                    fh.seek(0)
+                    fh.truncate()
+                    fh.write(json.dumps({'tokens': available, 'updated': now}))
+                    fh.flush()
+                finally:
+                    self._unlock(fh)
+        return available
+
+    def acquire(self, tokens=1):
+        """Block until ``tokens`` are available; returns the time spent waiting."""
+        delay = self.reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+
+def _stream(fetch_all, maxsize=0):
+    """
+    Run the coroutine ``fetch_all(put, stop)`` on an event loop in a
+    background thread, yielding each item it ``await put(item)``s as it
+    arrives.
+
+    At most ``maxsize`` items wait for the consumer; ``put`` holds the loop
+    back beyond that, so fetching stays close behind the caller's writes.
+    When the consumer stops early (``close()``, an exception, a time limit)
+    the ``stop`` event is set and ``fetch_all`` must send no more requests.
+    """
+    results = queue.Queue(maxsize)
+    stop = threading.Event()
+    done = object()
+
+    async def put(item):
+        while not stop.is_set():
+            try:
+                results.put_nowait(item)
+                return
+            except queue.Full:
+                await asyncio.sleep(STREAM_POLL_SECONDS)
+
+    def run():
+        try:
+            asyncio.run(fetch_all(put, stop))
+        finally:
+            while not stop.is_set():
+                try:
+                    results.put(done, timeout=STREAM_POLL_SECONDS)
+                    break
+                except queue.Full:
+                    pass
+
+    threading.Thread(target=run, name='torn-api-fetch', daemon=True).start()
+    try:
+        while True:
+            item = results.get()
+            if item is done:
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+async def _gather_until_stopped(coros, stop):
+    """Await ``coros`` together, cancelling the ones still pending once ``stop`` is set."""
+    gathered = asyncio.gather(*coros)
+    while not gathered.done():
+        await asyncio.wait({gathered}, timeout=STREAM_POLL_SECONDS)
+        if stop.is_set():
+            gathered.cancel()
+            break
+    try:
+        await gathered
+    except asyncio.CancelledError:
+        pass
+
+
+def _async_http(concurrency, timeout):
+    """httpx client keeping up to ``concurrency`` connections to the API open."""
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    return httpx.AsyncClient(base_url=BASE_URL, timeout=timeout, limits=limits,
+                             headers={'accept': 'application/json'})
+
+
+class TornClient:
+    """
+    Pooled, rate-limited client for a single Torn API key.
+
+    Use ``get_client(api_key)`` rather than instantiating directly so the
+    session (and its connection pool) is shared within the process.
+    """
+
+    def __init__(self, api_key, calls_per_minute=None, timeout=30, pool_size=10):
+        self.api_key = api_key
+        self.timeout = timeout
+        if calls_per_minute is None:
+            calls_per_minute = getattr(settings, 'TORN_API_CALLS_PER_MINUTE', 60)
+        self.bucket = TokenBucket(_key_fingerprint(api_key), calls_per_minute)
+
+        self.session = requests.Session()
+        self.session.headers.update({'accept': 'application/json'})
+        retry = Retry(total=3, connect=3, read=2, status=0, backoff_factor=0.5)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('https://', adapter)
+
+    def url(self, path):
+        return f'{BASE_URL}/{path.lstrip("/")}'
+
+    def params(self, selections=None, comment=None, **params):
+        """Build the query string shared by v1 and v2 endpoints."""
+        query = {key: value for key, value in params.items() if value is not None}
+        if selections:
+            query['selections'] = ','.join(selections) if isinstance(selections, (list, tuple)) else selections
+        if comment:
+            query['comment'] = comment
+        query['key'] = self.api_key
+        return query
+
+    def get(self, path, selections=None, comment=None, **params):
+        """
+        Fetch ``path`` (e.g. ``'faction/123'`` or ``'v2/torn/factionhof'``) and
+        return the decoded JSON payload.
+
+        Waits for the shared rate budget first. Raises ``TornAPIError`` on a
+        network failure, a non-200 response or an ``error`` payload.
+        """
+        self.bucket.acquire()
+        try:
+            response = self.session.get(
+                self.url(path),
+                params=self.params(selections, comment, **params),
+                timeout=self.timeout,
+            )
+        except requests.RequestException as e:
+            raise TornAPIError(f'Network error: {e}') from e
+        return self.parse(response)
+
+    def get_many(self, jobs, concurrency=8):
+        """
+        Fetch many endpoints concurrently and yield ``(tag, data, error)`` as
+        each response arrives.
+
+        ``jobs`` is an iterable of ``(tag, path, params)`` tuples where
+        ``params`` holds the same keyword arguments ``get()`` accepts. Up to
+        ``concurrency`` requests are kept in flight on an asyncio/httpx loop
+        running in a background thread, each still drawing from the shared
+        rate budget. Results are handed back to the calling thread, so the
+        caller can do its (synchronous) database work while later requests
+        are still on the wire; fetching pauses once ``2 * concurrency``
+        results are waiting, and stops when the generator is closed.
+        """
+        jobs = list(jobs)
+        return _stream(
+            lambda put, stop: self._fetch_all(jobs, concurrency, put, stop), maxsize=2 * concurrency
+        )
+
+    async def _fetch_all(self, jobs, concurrency, put, stop):
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async with _async_http(concurrency, self.timeout) as http:
+            async def fetch(tag, path, params):
+                async with semaphore:
+                    if stop.is_set():
+                        return
+                    try:
+                        item = (tag, await self.get_async(http, path, **params), None)
+                    except TornAPIError as e:
+                        item = (tag, None, e)
+                    await put(item)
+
+            await _gather_until_stopped((fetch(*job) for job in jobs), stop)
+
+    async def get_async(self, http, path, selections=None, comment=None, **params):
+        """``get()`` on the ``httpx.AsyncClient`` ``http``, sleeping on the event loop for the rate budget."""
+        delay = self.bucket.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        try:
+            response = await http.get(f'/{path.lstrip("/")}', params=self.params(selections, comment, **params))
+        except httpx.HTTPError as e:
+            raise TornAPIError(f'Network error: {e}') from e
+        return self.parse(response)
+
+    @staticmethod
+    def parse(response):
+        """Return the JSON payload of ``response`` or raise ``TornAPIError``."""
+        if response.status_code != 200:
+            raise TornAPIError(f'HTTP {response.status_code}', status_code=response.status_code)
+        try:
+            data = response.json()
+        except ValueError as e:
+            raise TornAPIError('Invalid JSON response from API', status_code=response.status_code) from e
+        if 'error' in data:
+            error = data['error']
+            raise TornAPIError(error.get('error', 'Unknown error'), code=error.get('code'), status_code=response.status_code)
+        return data
+
+    def close(self):
+        self.session.close()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(api_key, **kwargs):
+    """Return the process-wide ``TornClient`` for ``api_key``, creating it on first use."""
+    with _clients_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            client = _clients[api_key] = TornClient(api_key, **kwargs)
+        return client
+
+
+
+class PooledKey:
+    """One key of a ``KeyPool`` with its usage and recent errors."""
+
+    def __init__(self, api_key):
+        self.client = get_client(api_key)
+        self.fingerprint = _key_fingerprint(api_key)
+        self.calls = 0
+        self.errors = collections.deque(maxlen=20)  # (time, code)
+        self.paused_until = 0.0
+        self.dead = False
+
+    @property
+    def api_key(self):
+        return self.client.api_key
+
+
+class KeyPool:
+    """
+    Rotates calls over several keys; ``get()`` and ``get_many()`` behave like
+    ``TornClient``'s. A call that fails because of its key is retried on the
+    next one, up to ``MAX_POOL_ATTEMPTS`` keys.
+    """
+
+    def __init__(self, api_keys, timeout=30):
+        self.keys = [PooledKey(api_key) for api_key in dict.fromkeys(api_keys) if api_key]
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._to_deactivate = []
+
+    @classmethod
+    def from_profiles(cls, fallback_key=None):
+        """Every active TornUserProfile key, oldest first, then ``fallback_key``."""
+        TornUserProfile = apps.get_model('users', 'TornUserProfile')
+        keys = list(
+            TornUserProfile.objects.filter(is_active=True)
+            .order_by('created_at', 'pk')
+            .values_list('tornapi', flat=True)
+        )
+        return cls(keys + [fallback_key])
+
+    def get(self, path, selections=None, comment=None, **params):
+        try:
+            return self._request(path, selections=selections, comment=comment, **params)
+        finally:
+            self.deactivate_dead_keys()
+
+    def get_many(self, jobs, concurrency=8):
+        """
+        Yield ``(tag, data, error)`` as each job completes. Like
+        ``TornClient.get_many()`` the calls run on an asyncio/httpx loop; each
+        call (and each retry) picks its key there.
+        """
+        jobs = list(jobs)
+        results = _stream(
+            lambda put, stop: self._fetch_all(jobs, concurrency, put, stop), maxsize=2 * concurrency
+        )
+        with contextlib.closing(results):
+            for result in results:
+                # Database writes stay in the calling thread
+                self.deactivate_dead_keys()
+                yield result
+
+    async def _fetch_all(self, jobs, concurrency, put, stop):
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async with _async_http(concurrency, self.timeout) as http:
+            async def fetch(tag, path, params):
+                async with semaphore:
+                    if stop.is_set():
+                        return
+                    try:
+                        item = (tag, await self._request_async(http, path, **params), None)
+                    except TornAPIError as e:
+                        item = (tag, None, e)
+                    await put(item)
+
+            await _gather_until_stopped((fetch(*job) for job in jobs), stop)
+
+    def stats(self):
+        """Per-key usage for reporting; keys appear only as fingerprints."""
+        now = time.time()
+        return [
+            {
+                'key': key.fingerprint,
+                'calls': key.calls,
+                'errors': len(key.errors),
+                'budget': round(key.client.bucket.available(), 1),
+                'paused_for': max(0, round(key.paused_until - now)),
+                'dead': key.dead,
+            }
+            for key in self.keys
+        ]
+
+    def deactivate_dead_keys(self):
+        """Turn off the profiles of keys the API reported as invalid."""
+        with self._lock:
+            dead_keys, self._to_deactivate = self._to_deactivate, []
+        if dead_keys:
+            TornUserProfile = apps.get_model('users', 'TornUserProfile')
+            TornUserProfile.objects.filter(tornapi__in=dead_keys).update(is_active=False)
+
+    def _request(self, path, **params):
+        for _ in range(MAX_POOL_ATTEMPTS):
+            key = self._pick()
+            try:
+                return key.client.get(path, **params)
+            except TornAPIError as e:
+                if not self._key_failed(key, e):
+                    raise
+                error = e
+        raise self._gave_up(path, error)
+
+    async def _request_async(self, http, path, **params):
+        for _ in range(MAX_POOL_ATTEMPTS):
+            key = await self._pick_async()
+            try:
+                return await key.client.get_async(http, path, **params)
+            except TornAPIError as e:
+                if not self._key_failed(key, e):
+                    raise
+                error = e
+        raise self._gave_up(path, error)
+
+    @staticmethod
+    def _gave_up(path, error):
+        return TornAPIError(
+            f'{path}: gave up after {MAX_POOL_ATTEMPTS} keys failed, last with: {error}',
+            code=error.code, status_code=error.status_code,
+        )
+
+    def _pick(self):
+        """The live key with the most budget left, waiting up to MAX_POOL_WAIT if every key is cooling down."""
+        deadline = time.monotonic() + MAX_POOL_WAIT
+        while True:
+            key, wait = self._choose(deadline)
+            if key is not None:
+                return key
+            time.sleep(wait)
+
+    async def _pick_async(self):
+        """``_pick()`` that waits on the event loop."""
+        deadline = time.monotonic() + MAX_POOL_WAIT
+        while True:
+            key, wait = self._choose(deadline)
+            if key is not None:
+                return key
+            await asyncio.sleep(wait)
+
+    def _choose(self, deadline):
+        """``(key, None)`` for a ready key, or ``(None, seconds)`` until the next one is."""
+        with self._lock:
+            live = [key for key in self.keys if not key.dead]
+            if not live:
+                raise TornAPIError('No usable Torn API key in the pool')
+            now = time.time()
+            ready = [key for key in live if key.paused_until <= now]
+            if ready:
+                key = max(ready, key=lambda key: (key.client.bucket.available(), -key.calls))
+                key.calls += 1
+                return key, None
+            wait = min(key.paused_until for key in live) - now
+        if wait > deadline - time.monotonic():
+            raise TornAPIError(f'Every Torn API key in the pool is paused for at least {round(wait)}s')
+        return None, wait
+
+    def _key_failed(self, key, error):
+        """Take ``key`` out of rotation if ``error`` is its fault; return whether the call should move on."""
+        if error.code != KEY_INVALID and error.code not in KEY_COOLDOWNS:
+            return False
+        with self._lock:
+            key.errors.append((time.time(), error.code))
+            if error.code == KEY_INVALID:
+                key.dead = True
+                self._to_deactivate.append(key.api_key)
+            else:
+                key.paused_until = time.time() + KEY_COOLDOWNS[error.code]
+        logger.warning('Torn API key %s: %s (code %s)', key.fingerprint, error, error.code)
+        return True
+
+
+_pools = {}  # fallback_key -> (KeyPool, time.monotonic() when loaded)
+_pool_lock = threading.Lock()
+
+
+def get_key_pool(fallback_key=None):
+    """
+    Return the process-wide ``KeyPool`` of active profile keys plus
+    ``fallback_key`` (one pool per fallback key), reloaded every
+    ``POOL_REFRESH_SECONDS``.
+    """
+    with _pool_lock:
+        pool, loaded = _pools.get(fallback_key, (None, 0.0))
+        if pool is None or time.monotonic() - loaded > POOL_REFRESH_SECONDS:
+            fresh = KeyPool.from_profiles(fallback_key)
+            if pool is not None:
+                # Keys still in the pool keep their cooldowns and error history
+                known = {key.api_key: key for key in pool.keys}
+                fresh.keys = [known.get(key.api_key, key) for key in fresh.keys]
+            pool = fresh
+            _pools[fallback_key] = (pool, time.monotonic())
+        return pool
@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Company, Employee, CurrentEmployee, DailyEmployeeSnapshot, Sale
+from .models import (
+    Company, CompanyDailyFinancials, CompanyWeeklyFinancials, CurrentEmployee, DailyEmployeeSnapshot, Employee,
+    EmployeeTrip, Sale,
+)
 
 
 class MultiCompanyFilter(admin.SimpleListFilter):
@@ -258,3 +261,28 @@ class SaleAdmin(admin.ModelAdmin):
     formatted_sold_worth.short_description = 'Sold Worth'
 
 
+
+
+@admin.register(CompanyDailyFinancials)
+class CompanyDailyFinancialsAdmin(admin.ModelAdmin):
+    list_display = ('snapshot_date', 'company', 'income', 'wages', 'advertising', 'profit', 'margin', 'updated_on')
+    list_filter = ('snapshot_date', MultiCompanyFilter)
+    readonly_fields = ('updated_on',)
+    ordering = ['-snapshot_date', 'company']
+
+
+@admin.register(CompanyWeeklyFinancials)
+class CompanyWeeklyFinancialsAdmin(admin.ModelAdmin):
+    list_display = ('week_start', 'week_end', 'company', 'income', 'wages', 'advertising', 'profit', 'margin', 'updated_on')
+    list_filter = ('iso_year', MultiCompanyFilter)
+    readonly_fields = ('updated_on',)
+    ordering = ['-week_start', 'company']
+
+
+@admin.register(EmployeeTrip)
+class EmployeeTripAdmin(admin.ModelAdmin):
+    list_display = ('employee_id', 'company', 'state', 'departed_at', 'arrived_at', 'returning_at', 'ended_at', 'last_seen_on')
+    list_filter = ('state', MultiCompanyFilter)
+    search_fields = ('employee_id',)
+    readonly_fields = ('created_on', 'updated_on')
+    ordering = ['-last_seen_on', '-id']
@@ -0,0 +1,129 @@
+from datetime import date, timedelta
+
+from django.apps import apps as global_apps
+from django.db import transaction
+from django.db.models import Sum
+
+DAILY_UPDATE_FIELDS = [
+    'iso_year', 'iso_week', 'income', 'wages', 'advertising', 'profit', 'margin', 'price',
+    'in_stock', 'sold_amount', 'created_amount', 'popularity', 'efficiency', 'environment', 'updated_on',
+]
+WEEKLY_SUM_FIELDS = ['income', 'wages', 'advertising', 'profit', 'in_stock', 'sold_amount', 'created_amount']
+
+
+def profit_margin(profit, income):
+    """Profit as a percentage of income (0 when there was no income)."""
+    return (profit / income) * 100 if income > 0 else 0
+
+
+def refresh_financials(company_ids=None, start_date=None, end_date=None, apps=global_apps):
+    """
+    Recompute CompanyDailyFinancials for every Sale in the given companies and
+    date range, then the CompanyWeeklyFinancials of each ISO week touched.
+    Any argument left as None is unbounded. ``apps`` lets a data migration
+    pass its historical models. Returns (daily rows, weekly rows).
+    """
+    Sale = apps.get_model('company', 'Sale')
+    DailyEmployeeSnapshot = apps.get_model('company', 'DailyEmployeeSnapshot')
+    CompanyDailyFinancials = apps.get_model('company', 'CompanyDailyFinancials')
+
+    sales = Sale.objects.all()
+    snapshots = DailyEmployeeSnapshot.objects.all()
+    if company_ids is not None:
+        sales = sales.filter(company_id__in=company_ids)
+        snapshots = snapshots.filter(company_id__in=company_ids)
+    if start_date:
+        sales = sales.filter(snapshot_date__gte=start_date)
+        snapshots = snapshots.filter(snapshot_date__gte=start_date)
+    if end_date:
+        sales = sales.filter(snapshot_date__lte=end_date)
+        snapshots = snapshots.filter(snapshot_date__lte=end_date)
+
+    wages_by_company_date = {
+        (row['company_id'], row['snapshot_date']): row['total_wages'] or 0
+        for row in snapshots.values('company_id', 'snapshot_date')
+        .annotate(total_wages=Sum('wage'))
+        .order_by()
+    }
+
+    daily_rows = []
+    for sale in sales.iterator():
+        income = sale.sold_worth or 0
+        wages = wages_by_company_date.get((sale.company_id, sale.snapshot_date), 0)
+        advertising = sale.advertising_budget or 0
+        profit = income - wages - advertising
+        iso_year, iso_week, _ = sale.snapshot_date.isocalendar()
+        daily_rows.append(CompanyDailyFinancials(
+            company_id=sale.company_id,
+            snapshot_date=sale.snapshot_date,
+            iso_year=iso_year,
+            iso_week=iso_week,
+            income=income,
+            wages=wages,
+            advertising=advertising,
+            profit=profit,
+            margin=profit_margin(profit, income),
+            price=sale.price or 0,
+            in_stock=sale.in_stock or 0,
+            sold_amount=sale.sold_amount or 0,
+            created_amount=sale.created_amount or 0,
+            popularity=sale.popularity or 0,
+            efficiency=sale.efficiency or 0,
+            environment=sale.environment or 0,
+        ))
+
+    if not daily_rows:
+        return 0, 0
+
+    with transaction.atomic():
+        CompanyDailyFinancials.objects.bulk_create(
+            daily_rows,
+            update_conflicts=True,
+            unique_fields=['company', 'snapshot_date'],
+            update_fields=DAILY_UPDATE_FIELDS,
+            batch_size=500,
+        )
+        weekly_count = _refresh_weeks({(row.company_id, row.iso_year, row.iso_week) for row in daily_rows}, apps)
+    return len(daily_rows), weekly_count
+
+
+def _refresh_weeks(weeks, apps):
+    """Re-aggregate the given (company_id, iso_year, iso_week) keys from the daily rows."""
+    CompanyDailyFinancials = apps.get_model('company', 'CompanyDailyFinancials')
+    CompanyWeeklyFinancials = apps.get_model('company', 'CompanyWeeklyFinancials')
+    week_starts = [date.fromisocalendar(iso_year, iso_week, 1) for _, iso_year, iso_week in weeks]
+    totals = (
+        CompanyDailyFinancials.objects.filter(
+            company_id__in={company_id for company_id, _, _ in weeks},
+            snapshot_date__gte=min(week_starts),
+            snapshot_date__lte=max(week_starts) + timedelta(days=6),
+        )
+        .values('company_id', 'iso_year', 'iso_week')
+        .annotate(**{field: Sum(field) for field in WEEKLY_SUM_FIELDS})
+        .order_by()
+    )
+
+    weekly_rows = []
+    for row in totals:
+        key = (row['company_id'], row['iso_year'], row['iso_week'])
+        if key not in weeks:
+            continue
+        week_start = date.fromisocalendar(row['iso_year'], row['iso_week'], 1)
+        weekly_rows.append(CompanyWeeklyFinancials(
+            company_id=row['company_id'],
+            iso_year=row['iso_year'],
+            iso_week=row['iso_week'],
+            week_start=week_start,
+            week_end=week_start + timedelta(days=6),
+            margin=profit_margin(row['profit'], row['income']),
+            **{field: row[field] for field in WEEKLY_SUM_FIELDS}
+        ))
+
+    CompanyWeeklyFinancials.objects.bulk_create(
+        weekly_rows,
+        update_conflicts=True,
+        unique_fields=['company', 'iso_year', 'iso_week'],
+        update_fields=['week_start', 'week_end', 'margin', 'updated_on'] + WEEKLY_SUM_FIELDS,
+        batch_size=500,
+    )
+    return len(weekly_rows)
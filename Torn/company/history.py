@@ -0,0 +1,30 @@
+from datetime import datetime, timedelta
+
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber, TruncDate
+from django.utils import timezone
+
+from .models import Employee
+
+
+def day_range(day):
+    """Aware [start, end) datetimes of ``day``, so created_on filters can use its index."""
+    start = timezone.make_aware(datetime.combine(day, datetime.min.time()))
+    return start, start + timedelta(days=1)
+
+
+def last_employee_rows(day):
+    """The last Employee row per (company, employee) fetched on ``day``, annotated with snapshot_date."""
+    start, end = day_range(day)
+    return (
+        Employee.objects.filter(created_on__gte=start, created_on__lt=end)
+        .annotate(
+            snapshot_date=TruncDate("created_on"),
+            row_number=Window(
+                expression=RowNumber(),
+                partition_by=[F("company_id"), F("employee_id")],
+                order_by=[F("created_on").desc(), F("pk").desc()],
+            ),
+        )
+        .filter(row_number=1)
+    )
@@ -1,8 +1,14 @@
-from datetime import datetime, date
+import json
+import os
+import tempfile
+from datetime import datetime, date, timedelta
 from django.core.management.base import BaseCommand
-from django.db.models import Max
-from django.db.models.functions import TruncDate
-from company.models import Employee, DailyEmployeeSnapshot
+from django.db import transaction
+from django.db.models import Max, Min
+from company.financials import refresh_financials
+from company.history import last_employee_rows
+from company.models import EMPLOYEE_SNAPSHOT_FIELDS, Employee, DailyEmployeeSnapshot
+from Torn.page_cache import COMPANY, bump_dataset_version
 
 
 class Command(BaseCommand):
@@ -23,74 +29,93 @@ class Command(BaseCommand):
             "--batch-size",
             type=int,
             default=500,
-            help="Chunk size for iterating aggregated rows"
+            help="Number of snapshots upserted per bulk statement"
+        )
+        parser.add_argument(
+            "--checkpoint-file",
+            type=str,
+            default=os.path.join(tempfile.gettempdir(), "backfill_daily_snapshots.checkpoint"),
+            help="File recording the last fully backfilled date"
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Continue from the day after the date stored in the checkpoint file"
         )
 
     def handle(self, *args, **options):
         start_date = self._parse_date(options.get("start_date"))
         end_date = self._parse_date(options.get("end_date"))
         batch_size = options.get("batch_size") or 500
+        checkpoint_file = options["checkpoint_file"]
 
-        qs = Employee.objects.all()
-        if start_date:
-            qs = qs.filter(created_on__date__gte=start_date)
-        if end_date:
-            qs = qs.filter(created_on__date__lte=end_date)
+        if options.get("resume"):
+            checkpoint = self._read_checkpoint(checkpoint_file)
+            if checkpoint:
+                self.stdout.write(f"Resuming after checkpoint {checkpoint}")
+                start_date = max(start_date, checkpoint + timedelta(days=1)) if start_date else checkpoint + timedelta(days=1)
 
-        daily_latest = (
-            qs.annotate(snapshot_date=TruncDate("created_on"))
-            .values("company_id", "employee_id", "snapshot_date")
-            .annotate(latest_created_on=Max("created_on"))
-            .order_by()
-        )
+        bounds = Employee.objects.aggregate(first=Min("created_on"), last=Max("created_on"))
+        if not bounds["first"]:
+            self.stdout.write("No Employee rows to backfill")
+            return
+        start_date = max(start_date, bounds["first"].date()) if start_date else bounds["first"].date()
+        end_date = min(end_date, bounds["last"].date()) if end_date else bounds["last"].date()
+
+        total_days = (end_date - start_date).days + 1
+        if total_days <= 0:
+            self.stdout.write("Nothing to backfill in the requested range")
+            return
+        self.stdout.write(f"Backfilling {total_days} day(s) from {start_date} to {end_date}")
 
-        total = daily_latest.count()
-        created_or_updated = 0
-        self.stdout.write(f"Aggregated {total} day/employee rows to process")
+        written = 0
+        company_ids = set()
+        day = start_date
+        for day_number in range(1, total_days + 1):
+            with transaction.atomic():
+                day_companies, day_written = self._backfill_day(day, batch_size)
+            company_ids |= day_companies
+            written += day_written
+            self._write_checkpoint(checkpoint_file, day)
+            self.stdout.write(f"[{day_number}/{total_days}] {day}: {day_written} snapshot(s) written")
+            day += timedelta(days=1)
 
-        for row in daily_latest.iterator(chunk_size=batch_size):
-            emp = (
-                Employee.objects.filter(
-                    company_id=row["company_id"],
-                    employee_id=row["employee_id"],
-                    created_on=row["latest_created_on"],
-                )
-                .order_by("-pk")
-                .first()
-            )
-            if not emp:
-                continue
+        # Wages in the P&L tables come from these snapshots
+        if company_ids:
+            daily, weekly = refresh_financials(company_ids, start_date, end_date)
+            self.stdout.write(f"Refreshed {daily} daily and {weekly} weekly financials row(s)")
+        bump_dataset_version(COMPANY)
+        self.stdout.write(self.style.SUCCESS(f"Backfill complete; snapshots written/updated: {written}"))
 
-            DailyEmployeeSnapshot.objects.update_or_create(
-                company=emp.company,
-                employee_id=emp.employee_id,
-                snapshot_date=row["snapshot_date"],
-                defaults={
-                    "name": emp.name,
-                    "position": emp.position,
-                    "wage": emp.wage,
-                    "manual_labour": emp.manual_labour,
-                    "intelligence": emp.intelligence,
-                    "endurance": emp.endurance,
-                    "effectiveness_working_stats": emp.effectiveness_working_stats,
-                    "effectiveness_settled_in": emp.effectiveness_settled_in,
-                    "effectiveness_merits": emp.effectiveness_merits,
-                    "effectiveness_director_education": emp.effectiveness_director_education,
-                    "effectiveness_management": emp.effectiveness_management,
-                    "effectiveness_inactivity": emp.effectiveness_inactivity,
-                    "effectiveness_addiction": emp.effectiveness_addiction,
-                    "effectiveness_total": emp.effectiveness_total,
-                    "last_action_status": emp.last_action_status,
-                    "last_action_timestamp": emp.last_action_timestamp,
-                    "last_action_relative": emp.last_action_relative,
-                    "status_description": emp.status_description,
-                    "status_state": emp.status_state,
-                    "status_until": emp.status_until,
-                },
-            )
-            created_or_updated += 1
+    def _backfill_day(self, day, batch_size):
+        """
+        Upsert one snapshot per (company, employee) from the last Employee row
+        of ``day``; return the companies touched and the number of snapshots.
+        """
+        latest_rows = last_employee_rows(day).values(
+            "company_id", "employee_id", "snapshot_date", *EMPLOYEE_SNAPSHOT_FIELDS
+        )
+
+        snapshots = [DailyEmployeeSnapshot(**row) for row in latest_rows]
+        DailyEmployeeSnapshot.objects.bulk_create(
+            snapshots,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=["company", "employee_id", "snapshot_date"],
+            update_fields=EMPLOYEE_SNAPSHOT_FIELDS + ["modified_on"],
+        )
+        return {snapshot.company_id for snapshot in snapshots}, len(snapshots)
+
+    def _read_checkpoint(self, path):
+        try:
+            with open(path, "r") as f:
+                return date.fromisoformat(json.load(f)["last_completed_date"])
+        except (OSError, ValueError, KeyError):
+            return None
 
-        self.stdout.write(self.style.SUCCESS(f"Backfill complete; snapshots written/updated: {created_or_updated}"))
+    def _write_checkpoint(self, path, day):
+        with open(path, "w") as f:
+            json.dump({"last_completed_date": day.isoformat()}, f)
 
     def _parse_date(self, value):
         if not value:
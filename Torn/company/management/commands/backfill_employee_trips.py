@@ -0,0 +1,74 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from company.models import DailyEmployeeSnapshot, EmployeeTrip
+from Torn.page_cache import COMPANY, bump_dataset_version
+
+
+class Command(BaseCommand):
+    help = "Rebuild EmployeeTrip rows from the Switzerland columns of DailyEmployeeSnapshot"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of trips inserted per bulk statement"
+        )
+
+    def handle(self, *args, **options):
+        trips = {}
+        latest_status = {}
+
+        # Timestamps accumulate over a trip, so the earliest one identifies it across days
+        rows = DailyEmployeeSnapshot.objects.filter(
+            Q(last_travelled_to_switzerland__isnull=False)
+            | Q(in_switzerland__isnull=False)
+            | Q(returning_from_switzerland__isnull=False)
+        ).order_by("snapshot_date").values(
+            "company_id", "employee_id", "snapshot_date", "modified_on", "last_travelled_to_switzerland",
+            "in_switzerland", "returning_from_switzerland",
+        )
+        for row in rows.iterator():
+            timestamps = [
+                row["last_travelled_to_switzerland"], row["in_switzerland"], row["returning_from_switzerland"]
+            ]
+            key = (row["company_id"], row["employee_id"], min(ts for ts in timestamps if ts))
+            trip = trips.setdefault(key, EmployeeTrip(
+                company_id=row["company_id"], employee_id=row["employee_id"], last_seen_on=row["snapshot_date"]
+            ))
+            trip.departed_at = trip.departed_at or row["last_travelled_to_switzerland"]
+            trip.arrived_at = trip.arrived_at or row["in_switzerland"]
+            trip.returning_at = trip.returning_at or row["returning_from_switzerland"]
+            trip.last_seen_on = row["snapshot_date"]
+            trip.ended_at = row["modified_on"]
+
+        # A trip is still open if it is on the employee's latest snapshot and they are still travelling
+        travellers = {employee_id for _, employee_id, _ in trips}
+        for row in DailyEmployeeSnapshot.objects.filter(employee_id__in=travellers).order_by("snapshot_date").values(
+            "company_id", "employee_id", "snapshot_date", "status_description"
+        ).iterator():
+            latest_status[(row["company_id"], row["employee_id"])] = (row["snapshot_date"], row["status_description"])
+
+        for (company_id, employee_id, _), trip in trips.items():
+            snapshot_date, status_desc = latest_status[(company_id, employee_id)]
+            if snapshot_date == trip.last_seen_on and "Switzerland" in status_desc:
+                trip.ended_at = None
+                trip.state = self._state(trip)
+            else:
+                trip.state = EmployeeTrip.COMPLETE
+
+        with transaction.atomic():
+            EmployeeTrip.objects.all().delete()
+            EmployeeTrip.objects.bulk_create(trips.values(), batch_size=options["batch_size"])
+        bump_dataset_version(COMPANY)
+
+        open_count = sum(1 for trip in trips.values() if trip.ended_at is None)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {len(trips)} trip(s); {open_count} still in progress"))
+
+    def _state(self, trip):
+        if trip.returning_at:
+            return EmployeeTrip.RETURNING
+        if trip.arrived_at:
+            return EmployeeTrip.ABROAD
+        return EmployeeTrip.OUTBOUND
@@ -0,0 +1,87 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+from company.history import day_range, last_employee_rows
+from company.models import EMPLOYEE_SNAPSHOT_FIELDS, Employee, DailyEmployeeSnapshot
+from Torn.page_cache import COMPANY, bump_dataset_version
+
+
+class Command(BaseCommand):
+    help = (
+        "Compact Employee fetch rows older than the retention window to the last row per "
+        "employee per day, filling any missing DailyEmployeeSnapshot from it first"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--keep-days",
+            type=int,
+            default=30,
+            help="Days of full-resolution Employee history to keep (default: 30)"
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Maximum Employee rows deleted per statement"
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report what would be deleted without changing anything"
+        )
+
+    def handle(self, *args, **options):
+        cutoff_day = timezone.now().date() - timedelta(days=options["keep_days"])
+        first = Employee.objects.filter(created_on__lt=day_range(cutoff_day)[0]).aggregate(first=Min("created_on"))["first"]
+        if not first:
+            self.stdout.write("No Employee rows older than the retention window")
+            return
+
+        total_days = (cutoff_day - first.date()).days
+        self.stdout.write(f"Compacting {total_days} day(s) before {cutoff_day}")
+
+        deleted = 0
+        day = first.date()
+        for day_number in range(1, total_days + 1):
+            with transaction.atomic():
+                day_deleted = self._compact_day(day, options["batch_size"], options["dry_run"])
+                if options["dry_run"]:
+                    transaction.set_rollback(True)
+            deleted += day_deleted
+            if day_deleted:
+                self.stdout.write(f"[{day_number}/{total_days}] {day}: {day_deleted} row(s) removed")
+            day += timedelta(days=1)
+
+        if deleted and not options["dry_run"]:
+            bump_dataset_version(COMPANY)
+        verb = "Would remove" if options["dry_run"] else "Removed"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {deleted} Employee row(s)"))
+
+    def _compact_day(self, day, batch_size, dry_run):
+        """Keep the last Employee row per (company, employee) of ``day``; return how many others were deleted."""
+        kept_rows = last_employee_rows(day)
+
+        # Days the ingest already snapshotted are left as they are
+        DailyEmployeeSnapshot.objects.bulk_create(
+            [
+                DailyEmployeeSnapshot(**row)
+                for row in kept_rows.values("company_id", "employee_id", "snapshot_date", *EMPLOYEE_SNAPSHOT_FIELDS)
+            ],
+            batch_size=500,
+            ignore_conflicts=True,
+        )
+
+        start, end = day_range(day)
+        redundant = Employee.objects.filter(created_on__gte=start, created_on__lt=end).exclude(pk__in=kept_rows.values("pk"))
+        if dry_run:
+            return redundant.count()
+
+        deleted = 0
+        while True:
+            batch = list(redundant.values_list("pk", flat=True)[:batch_size])
+            if not batch:
+                return deleted
+            deleted += Employee.objects.filter(pk__in=batch).delete()[0]
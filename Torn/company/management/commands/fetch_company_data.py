@@ -1,7 +1,14 @@
-import requests
 import environ
+from concurrent.futures import ThreadPoolExecutor
 from django.core.management.base import BaseCommand
-from company.models import Company, Employee, CurrentEmployee, DailyEmployeeSnapshot, Sale
+from django.db import transaction
+from django.utils import timezone
+from company.financials import refresh_financials
+from company.models import EMPLOYEE_SNAPSHOT_FIELDS, Company, Employee, CurrentEmployee, DailyEmployeeSnapshot, EmployeeTrip, Sale
+from company.travel import TRIP_UPDATE_FIELDS, advance_trip, current_trips, snapshot_travel_fields, trip_key
+from users.models import TornUserProfile
+from Torn.page_cache import COMPANY, bump_dataset_version
+from Torn.torn_api import TornAPIError, get_client
 from datetime import datetime, time, timedelta
 
 # Initialize environment variables
@@ -10,6 +17,11 @@ environ.Env.read_env()
 
 API_KEY = env('API_KEY')
 
+# Columns refreshed when a DailyEmployeeSnapshot for the same day already exists
+SNAPSHOT_UPDATE_FIELDS = EMPLOYEE_SNAPSHOT_FIELDS + [
+    'last_travelled_to_switzerland', 'in_switzerland', 'returning_from_switzerland', 'modified_on',
+]
+
 
 class Command(BaseCommand):
     help = 'Fetch company data from the Torn API and insert it into the database'
@@ -20,26 +32,28 @@ class Command(BaseCommand):
             action='store_true',
             help='Force run even before 18:22 UTC; snapshots will be recorded for the previous day'
         )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Maximum number of keys fetched concurrently (default: 4)'
+        )
 
     def handle(self, *args, **kwargs):
         force_run = kwargs.get('force', False)
         
-        # Run once per available key so we can ingest data for both companies if keys differ
-        pc_key = env('PC_KEY', default=None)
-        spag_key = env('SPAG_KEY', default=None)
-        keys_to_use = [
-            ("PC_KEY", pc_key),
-            ("SPAG_KEY", spag_key),
-            ("API_KEY", API_KEY),
-        ]
+        keys_to_use = self._keys_to_use()
 
         ran_any = False
         now_utc = datetime.utcnow().time()
 
-        for key_type, api_key in keys_to_use:
-            if not api_key:
-                continue
+        # Fetch every key's company concurrently; the database writes below stay sequential
+        with ThreadPoolExecutor(max_workers=max(1, min(len(keys_to_use), kwargs.get('workers') or 4))) as executor:
+            fetched = list(executor.map(lambda key: self._fetch_company(key[1]), keys_to_use))
 
+        ingested_company_ids = set()
+
+        for (key_type, api_key), (data, stock_error, error) in zip(keys_to_use, fetched):
             ran_any = True
             self.stdout.write(f'Using {key_type} for API requests')
 
@@ -64,23 +78,14 @@ class Command(BaseCommand):
                 # Before 18:00 UTC: use yesterday's date for snapshots
                 stock_snapshot_date = stock_snapshot_date - timedelta(days=1)
             # If at/after 18:00 UTC: use today's date
-            
-            # Fetch the company tied to the key owner (no hardcoded company ID)
-            # Try to fetch with stock data; fall back to without stock if it fails
-            url = f'https://api.torn.com/company/?selections=profile,employees,stock,detailed&key={api_key}&comment=FetchCompany'
-            try:
-                response = requests.get(url)
-                response.raise_for_status()
-                data = response.json()
-                # Check if the response indicates an error
-                if 'error' in data:
-                    raise Exception(data.get('error', {}).get('error', 'Unknown error'))
+
+            if stock_error:
+                self.stdout.write(self.style.WARNING(f'Failed to fetch with stock data ({stock_error}); retried without stock'))
+            if error:
+                self.stdout.write(self.style.ERROR(f'Failed to fetch company data ({error}); aborting fetch for this key'))
+                continue
+            if not stock_error:
                 self.stdout.write('Fetched company data with stock information')
-            except Exception as e:
-                self.stdout.write(self.style.WARNING(f'Failed to fetch with stock data ({e}); retrying without stock'))
-                url = f'https://api.torn.com/company/?selections=profile,employees&key={api_key}&comment=FetchCompany'
-                response = requests.get(url)
-                data = response.json()
 
             print("Top-level keys:", data.keys())
             print("Company keys:", data.get('company', {}).keys())
@@ -90,6 +95,11 @@ class Command(BaseCommand):
             # Check if the company data exists
             if 'company' in data:
                 company_data = data['company']
+                if company_data['ID'] in ingested_company_ids:
+                    # Several keys can belong to the same company; the first one wins
+                    self.stdout.write(f'Company {company_data["ID"]} already ingested this run; skipping {key_type}')
+                    continue
+                ingested_company_ids.add(company_data['ID'])
                 company, created = Company.objects.get_or_create(
                     company_id=company_data['ID'],
                     defaults={'name': company_data['name']}
@@ -189,154 +199,12 @@ class Command(BaseCommand):
 
             # Check if the employees data exists
             if 'company_employees' in data and data['company_employees']:
-                wage_count = 0
-                total_employees = len(data['company_employees'])
-                
-                for employee_id, employee_data in data['company_employees'].items():
-                    status_until = employee_data['status']['until']
-                    if status_until == 0:
-                        status_until = None
-                    else:
-                        status_until = datetime.fromtimestamp(status_until)
-
-                    wage = employee_data.get('wage')
-                    if wage is not None:
-                        wage_count += 1
-
-                    employee_defaults = {
-                        'name': employee_data['name'],
-                        'position': employee_data['position'],
-                        'wage': wage,  # Will be None if not available
-                        'manual_labour': employee_data.get('manual_labor', 0),
-                        'intelligence': employee_data.get('intelligence', 0),
-                        'endurance': employee_data.get('endurance', 0),
-                        'effectiveness_working_stats': employee_data.get('effectiveness', {}).get('working_stats', 0),
-                        'effectiveness_settled_in': employee_data.get('effectiveness', {}).get('settled_in', 0),
-                        'effectiveness_merits': employee_data.get('effectiveness', {}).get('merits', 0),
-                        'effectiveness_director_education': employee_data.get('effectiveness', {}).get('director_education', 0),
-                        'effectiveness_management': employee_data.get('effectiveness', {}).get('management', 0),
-                        'effectiveness_inactivity': employee_data.get('effectiveness', {}).get('inactivity', 0),
-                        'effectiveness_addiction': employee_data.get('effectiveness', {}).get('addiction', 0),
-                        'effectiveness_total': employee_data.get('effectiveness', {}).get('total', 0),
-                        'last_action_status': employee_data['last_action']['status'],
-                        'last_action_timestamp': datetime.fromtimestamp(employee_data['last_action']['timestamp']),
-                        'last_action_relative': employee_data['last_action']['relative'],
-                        'status_description': employee_data['status']['description'],
-                        'status_state': employee_data['status']['state'],
-                        'status_until': status_until,
-                        'created_on': employee_created_on  # Tie record to the snapshot date
-                    }
-
-                    # Always create a new Employee record every time the script runs
-                    Employee.objects.create(
-                        employee_id=employee_id,
-                        company=company,
-                        **employee_defaults
-                    )
-
-                    # Create or update DailyEmployeeSnapshot record
-                    snapshot_defaults = {
-                        'name': employee_data['name'],
-                        'position': employee_data['position'],
-                        'wage': wage,
-                        'manual_labour': employee_data.get('manual_labor', 0),
-                        'intelligence': employee_data.get('intelligence', 0),
-                        'endurance': employee_data.get('endurance', 0),
-                        'effectiveness_working_stats': employee_data.get('effectiveness', {}).get('working_stats', 0),
-                        'effectiveness_settled_in': employee_data.get('effectiveness', {}).get('settled_in', 0),
-                        'effectiveness_merits': employee_data.get('effectiveness', {}).get('merits', 0),
-                        'effectiveness_director_education': employee_data.get('effectiveness', {}).get('director_education', 0),
-                        'effectiveness_management': employee_data.get('effectiveness', {}).get('management', 0),
-                        'effectiveness_inactivity': employee_data.get('effectiveness', {}).get('inactivity', 0),
-                        'effectiveness_addiction': employee_data.get('effectiveness', {}).get('addiction', 0),
-                        'effectiveness_total': employee_data.get('effectiveness', {}).get('total', 0),
-                        'last_action_status': employee_data['last_action']['status'],
-                        'last_action_timestamp': datetime.fromtimestamp(employee_data['last_action']['timestamp']),
-                        'last_action_relative': employee_data['last_action']['relative'],
-                        'status_description': employee_data['status']['description'],
-                        'status_state': employee_data['status']['state'],
-                        'status_until': status_until,
-                    }
-                    
-                    # Get latest snapshot to preserve Switzerland travel tracking across days
-                    existing_snapshot = DailyEmployeeSnapshot.objects.filter(
-                        company=company,
-                        employee_id=employee_id
-                    ).order_by('-snapshot_date').first()
-                    
-                    # Track Switzerland travel status
-                    status_desc = employee_data['status']['description']
-                    
-                    # Check if person has any Switzerland-related status
-                    has_switzerland_status = ('Switzerland' in status_desc)
-                    
-                    # Initialize Switzerland fields - copy from previous snapshot based on status
-                    last_travelled_to_switzerland = None
-                    in_switzerland = None
-                    returning_from_switzerland = None
-                    
-                    if existing_snapshot and has_switzerland_status:
-                        # Person is on a Switzerland trip - preserve all existing timestamps from the ongoing trip
-                        # Copy from previous snapshot regardless of date (to track trips that span multiple days)
-                        last_travelled_to_switzerland = existing_snapshot.last_travelled_to_switzerland
-                        in_switzerland = existing_snapshot.in_switzerland
-                        returning_from_switzerland = existing_snapshot.returning_from_switzerland
-                    elif existing_snapshot and existing_snapshot.snapshot_date == snapshot_date:
-                        # Same day snapshot update but no Switzerland status - preserve today's timestamps
-                        # This handles cases where status changes within the same day after trip completes
-                        last_travelled_to_switzerland = existing_snapshot.last_travelled_to_switzerland
-                        in_switzerland = existing_snapshot.in_switzerland
-                        returning_from_switzerland = existing_snapshot.returning_from_switzerland
-                    # else: New day and no Switzerland status - start fresh with None values
-                    
-                    # Update based on current status - accumulate timestamps throughout the trip
-                    if 'Traveling to Switzerland' in status_desc:
-                        # Starting to travel to Switzerland
-                        if not last_travelled_to_switzerland:
-                            last_travelled_to_switzerland = normalized_time
-                        # Keep all other fields as they are
-                    elif 'In Switzerland' in status_desc:
-                        # Employee has arrived in Switzerland
-                        if not in_switzerland:
-                            in_switzerland = normalized_time
-                        # Keep all other fields (including last_travelled_to_switzerland)
-                    elif 'Returning' in status_desc and 'Switzerland' in status_desc:
-                        # Employee is returning from Switzerland
-                        if not returning_from_switzerland:
-                            returning_from_switzerland = normalized_time
-                        # Keep all other fields (full trip history)
-                    # If status doesn't mention Switzerland, existing values are preserved only if same day
-                    
-                    # Add Switzerland fields to defaults
-                    snapshot_defaults['last_travelled_to_switzerland'] = last_travelled_to_switzerland
-                    snapshot_defaults['in_switzerland'] = in_switzerland
-                    snapshot_defaults['returning_from_switzerland'] = returning_from_switzerland
-                    
-                    DailyEmployeeSnapshot.objects.update_or_create(
-                        company=company,
-                        employee_id=employee_id,
-                        snapshot_date=snapshot_date,
-                        defaults=snapshot_defaults
-                    )
+                employees = data['company_employees']
+                total_employees = len(employees)
+                wage_count = self._ingest_employees(
+                    company, company_data, employees, snapshot_date, employee_created_on, normalized_time
+                )
 
-                    # Create or update CurrentEmployee record
-                    CurrentEmployee.objects.update_or_create(
-                        user_id=employee_id,
-                        company_id=company_data['ID'],
-                        defaults={
-                            'username': employee_data['name'],
-                            'company_name': company_data['name']
-                        }
-                    )
-                
-                # Delete CurrentEmployee records not in the current fetch (only after successful processing)
-                current_employee_ids = set(int(eid) for eid in data['company_employees'].keys())
-                deleted_count = CurrentEmployee.objects.filter(
-                    company_id=company_data['ID']
-                ).exclude(user_id__in=current_employee_ids).delete()[0]
-                if deleted_count > 0:
-                    self.stdout.write(f'Removed {deleted_count} outdated current employee records for company {company_data["ID"]}')
-                
                 self.stdout.write(f'Processed {total_employees} employees')
                 self.stdout.write(self.style.SUCCESS(f'Updated {total_employees} current employee records'))
                 if wage_count > 0:
@@ -347,7 +215,168 @@ class Command(BaseCommand):
                 self.stdout.write(self.style.WARNING('No employees data found in the response; aborting fetch for this key'))
                 continue
 
+            # Keep the materialized P&L tables in step with the rows just written
+            touched_dates = {snapshot_date, stock_snapshot_date}
+            refresh_financials([company.company_id], min(touched_dates), max(touched_dates))
+
             self.stdout.write(self.style.SUCCESS(f'Successfully fetched and inserted company data for {company_data["name"]} (key: {key_type})'))
 
+        if ingested_company_ids:
+            bump_dataset_version(COMPANY)
+
         if not ran_any:
-            self.stdout.write(self.style.ERROR('No usable API keys found (PC_KEY and API_KEY are both missing).'))
\ No newline at end of file
+            self.stdout.write(self.style.ERROR('No usable API keys found (no PC_KEY, SPAG_KEY, API_KEY or active profile keys).'))
+
+    def _keys_to_use(self):
+        """
+        Keys to ingest with, as ``(label, key)`` pairs: the PC_KEY/SPAG_KEY/API_KEY
+        environment keys first, then every active TornUserProfile key.
+        """
+        keys_to_use = [
+            ("PC_KEY", env('PC_KEY', default=None)),
+            ("SPAG_KEY", env('SPAG_KEY', default=None)),
+            ("API_KEY", API_KEY),
+        ]
+        keys_to_use += [
+            (f'profile key for {tornuser}', tornapi)
+            for tornuser, tornapi in TornUserProfile.objects.filter(is_active=True)
+            .order_by('created_at').values_list('tornuser', 'tornapi')
+        ]
+
+        seen_keys = set()
+        unique_keys = []
+        for key_type, api_key in keys_to_use:
+            if api_key and api_key not in seen_keys:
+                seen_keys.add(api_key)
+                unique_keys.append((key_type, api_key))
+        return unique_keys
+
+    def _fetch_company(self, api_key):
+        """
+        Fetch the company tied to the key owner (no hardcoded company ID).
+        Tries with stock data first and falls back to without stock if that
+        fails. Runs on a worker thread, so it only talks to the API and
+        returns ``(data, stock_error, error)`` for the main thread to report.
+        """
+        client = get_client(api_key)
+        try:
+            return client.get('company/', selections='profile,employees,stock,detailed', comment='FetchCompany'), None, None
+        except TornAPIError as stock_error:
+            try:
+                return client.get('company/', selections='profile,employees', comment='FetchCompany'), stock_error, None
+            except TornAPIError as e:
+                return None, stock_error, e
+
+    def _ingest_employees(self, company, company_data, employees, snapshot_date, employee_created_on, normalized_time):
+        """
+        Write Employee, DailyEmployeeSnapshot and CurrentEmployee rows for every
+        employee in one transaction using a fixed number of queries.
+        Returns how many employees came back with wage data.
+        """
+        employee_ids = [int(employee_id) for employee_id in employees]
+
+        # Switzerland trip per employee, advanced below and copied onto today's snapshot
+        trips = current_trips(company, employee_ids, snapshot_date)
+
+        employee_rows = []
+        snapshot_rows = []
+        current_employee_rows = []
+        new_trips = []
+        changed_trips = []
+        wage_count = 0
+
+        for employee_id, employee_data in employees.items():
+            employee_id = int(employee_id)
+            status_until = employee_data['status']['until']
+            if status_until == 0:
+                status_until = None
+            else:
+                status_until = datetime.fromtimestamp(status_until)
+
+            wage = employee_data.get('wage')
+            if wage is not None:
+                wage_count += 1
+
+            effectiveness = employee_data.get('effectiveness', {})
+            employee_fields = {
+                'name': employee_data['name'],
+                'position': employee_data['position'],
+                'wage': wage,  # Will be None if not available
+                'manual_labour': employee_data.get('manual_labor', 0),
+                'intelligence': employee_data.get('intelligence', 0),
+                'endurance': employee_data.get('endurance', 0),
+                'effectiveness_working_stats': effectiveness.get('working_stats', 0),
+                'effectiveness_settled_in': effectiveness.get('settled_in', 0),
+                'effectiveness_merits': effectiveness.get('merits', 0),
+                'effectiveness_director_education': effectiveness.get('director_education', 0),
+                'effectiveness_management': effectiveness.get('management', 0),
+                'effectiveness_inactivity': effectiveness.get('inactivity', 0),
+                'effectiveness_addiction': effectiveness.get('addiction', 0),
+                'effectiveness_total': effectiveness.get('total', 0),
+                'last_action_status': employee_data['last_action']['status'],
+                'last_action_timestamp': datetime.fromtimestamp(employee_data['last_action']['timestamp']),
+                'last_action_relative': employee_data['last_action']['relative'],
+                'status_description': employee_data['status']['description'],
+                'status_state': employee_data['status']['state'],
+                'status_until': status_until,
+            }
+
+            # Always create a new Employee record every time the script runs
+            employee_rows.append(Employee(
+                employee_id=employee_id,
+                company=company,
+                created_on=employee_created_on,  # Tie record to the snapshot date
+                **employee_fields
+            ))
+
+            trip = trips.get(employee_id)
+            before = trip_key(trip)
+            trip = advance_trip(
+                trip, company, employee_id, employee_data['status']['description'], snapshot_date, normalized_time
+            )
+            if trip is not None and trip.pk is None:
+                new_trips.append(trip)
+            elif trip_key(trip) != before:
+                trip.updated_on = timezone.now()  # bulk_update skips auto_now
+                changed_trips.append(trip)
+
+            snapshot_rows.append(DailyEmployeeSnapshot(
+                company=company,
+                employee_id=employee_id,
+                snapshot_date=snapshot_date,
+                **employee_fields,
+                **snapshot_travel_fields(trip, snapshot_date)
+            ))
+
+            current_employee_rows.append(CurrentEmployee(
+                user_id=employee_id,
+                company_id=company_data['ID'],
+                username=employee_data['name'],
+                company_name=company_data['name'],
+            ))
+
+        with transaction.atomic():
+            Employee.objects.bulk_create(employee_rows)
+            DailyEmployeeSnapshot.objects.bulk_create(
+                snapshot_rows,
+                update_conflicts=True,
+                unique_fields=['company', 'employee_id', 'snapshot_date'],
+                update_fields=SNAPSHOT_UPDATE_FIELDS,
+            )
+            EmployeeTrip.objects.bulk_create(new_trips)
+            EmployeeTrip.objects.bulk_update(changed_trips, TRIP_UPDATE_FIELDS)
+            CurrentEmployee.objects.bulk_create(
+                current_employee_rows,
+                update_conflicts=True,
+                unique_fields=['user_id', 'company_id'],
+                update_fields=['username', 'company_name', 'updated_on'],
+            )
+
+            # Delete CurrentEmployee records not in the current fetch (only after successful processing)
+            deleted_count = CurrentEmployee.objects.filter(
+                company_id=company_data['ID']
+            ).exclude(user_id__in=employee_ids).delete()[0]
+        if deleted_count > 0:
+            self.stdout.write(f'Removed {deleted_count} outdated current employee records for company {company_data["ID"]}')
+
+        return wage_count
@@ -1,7 +1,9 @@
 import csv
 from datetime import datetime
 from django.core.management.base import BaseCommand
+from company.financials import refresh_financials
 from company.models import Company, Sale
+from Torn.page_cache import COMPANY, bump_dataset_version
 
 
 class Command(BaseCommand):
@@ -36,6 +38,7 @@ class Command(BaseCommand):
 
         imported_count = 0
         skipped_count = 0
+        imported_dates = []
 
         try:
             with open(csv_file, 'r', encoding='utf-8') as f:
@@ -101,6 +104,7 @@ class Command(BaseCommand):
                             }
                         )
 
+                        imported_dates.append(snapshot_date)
                         if created_sale:
                             imported_count += 1
                         else:
@@ -119,6 +123,10 @@ class Command(BaseCommand):
             self.stdout.write(self.style.ERROR(f'File not found: {csv_file}'))
             return
 
+        # The sales page reads the P&L tables built from Sale, not Sale itself
+        if imported_dates:
+            refresh_financials([company.company_id], min(imported_dates), max(imported_dates))
+        bump_dataset_version(COMPANY)
         self.stdout.write(self.style.SUCCESS(
             f'Import complete! Imported: {imported_count}, Skipped: {skipped_count}'
         ))
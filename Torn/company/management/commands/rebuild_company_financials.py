@@ -0,0 +1,23 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from company.financials import refresh_financials
+from Torn.page_cache import COMPANY, bump_dataset_version
+
+
+class Command(BaseCommand):
+    help = 'Rebuild CompanyDailyFinancials and CompanyWeeklyFinancials from Sale and DailyEmployeeSnapshot'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help='Only rebuild the last N days (default: all history)')
+        parser.add_argument('--company', type=int, action='append', dest='companies',
+                            help='Restrict to a company id (may be repeated)')
+
+    def handle(self, *args, **kwargs):
+        start_date = None
+        if kwargs.get('days'):
+            start_date = timezone.now().date() - timedelta(days=kwargs['days'])
+
+        daily, weekly = refresh_financials(company_ids=kwargs.get('companies'), start_date=start_date)
+        bump_dataset_version(COMPANY)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {daily} daily and {weekly} weekly financial row(s).'))
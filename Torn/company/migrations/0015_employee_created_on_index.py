@@ -0,0 +1,17 @@
+# Generated by Django 5.1.6 on 2026-10-18 03:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('company', '0014_remove_sale_wages'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='employee',
+            index=models.Index(fields=['created_on'], name='company_emp_created_d05124_idx'),
+        ),
+    ]
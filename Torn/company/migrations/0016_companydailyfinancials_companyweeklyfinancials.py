@@ -0,0 +1,67 @@
+# Generated by Django 5.1.6 on 2026-10-18 03:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('company', '0015_employee_created_on_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompanyDailyFinancials',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('snapshot_date', models.DateField()),
+                ('iso_year', models.IntegerField()),
+                ('iso_week', models.IntegerField()),
+                ('income', models.BigIntegerField(default=0)),
+                ('wages', models.BigIntegerField(default=0)),
+                ('advertising', models.BigIntegerField(default=0)),
+                ('profit', models.BigIntegerField(default=0)),
+                ('margin', models.FloatField(default=0)),
+                ('price', models.BigIntegerField(default=0)),
+                ('in_stock', models.BigIntegerField(default=0)),
+                ('sold_amount', models.BigIntegerField(default=0)),
+                ('created_amount', models.BigIntegerField(default=0)),
+                ('popularity', models.IntegerField(default=0)),
+                ('efficiency', models.IntegerField(default=0)),
+                ('environment', models.IntegerField(default=0)),
+                ('updated_on', models.DateTimeField(auto_now=True)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='company.company')),
+            ],
+            options={
+                'ordering': ['-snapshot_date'],
+                'indexes': [models.Index(fields=['snapshot_date'], name='company_com_snapsho_8385cc_idx'), models.Index(fields=['company', 'iso_year', 'iso_week'], name='company_com_company_ca706d_idx')],
+                'unique_together': {('company', 'snapshot_date')},
+            },
+        ),
+        migrations.CreateModel(
+            name='CompanyWeeklyFinancials',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('iso_year', models.IntegerField()),
+                ('iso_week', models.IntegerField()),
+                ('week_start', models.DateField()),
+                ('week_end', models.DateField()),
+                ('income', models.BigIntegerField(default=0)),
+                ('wages', models.BigIntegerField(default=0)),
+                ('advertising', models.BigIntegerField(default=0)),
+                ('profit', models.BigIntegerField(default=0)),
+                ('margin', models.FloatField(default=0)),
+                ('in_stock', models.BigIntegerField(default=0)),
+                ('sold_amount', models.BigIntegerField(default=0)),
+                ('created_amount', models.BigIntegerField(default=0)),
+                ('updated_on', models.DateTimeField(auto_now=True)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='company.company')),
+            ],
+            options={
+                'ordering': ['-week_end'],
+                'indexes': [models.Index(fields=['week_end'], name='company_com_week_en_2c4646_idx')],
+                'unique_together': {('company', 'iso_year', 'iso_week')},
+            },
+        ),
+    ]
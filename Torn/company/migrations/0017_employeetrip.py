@@ -0,0 +1,35 @@
+# Generated by Django 5.1.6 on 2026-10-18 03:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('company', '0016_companydailyfinancials_companyweeklyfinancials'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmployeeTrip',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('employee_id', models.IntegerField()),
+                ('state', models.CharField(choices=[('outbound', 'Traveling to Switzerland'), ('abroad', 'In Switzerland'), ('returning', 'Returning from Switzerland'), ('complete', 'Complete')], default='outbound', max_length=16)),
+                ('departed_at', models.DateTimeField(blank=True, null=True)),
+                ('arrived_at', models.DateTimeField(blank=True, null=True)),
+                ('returning_at', models.DateTimeField(blank=True, null=True)),
+                ('ended_at', models.DateTimeField(blank=True, null=True)),
+                ('last_seen_on', models.DateField()),
+                ('created_on', models.DateTimeField(auto_now_add=True)),
+                ('updated_on', models.DateTimeField(auto_now=True)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='company.company')),
+            ],
+            options={
+                'ordering': ['-last_seen_on', '-id'],
+                'indexes': [models.Index(fields=['company', 'last_seen_on'], name='company_emp_company_d74794_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('ended_at__isnull', True)), fields=('company', 'employee_id'), name='one_open_trip_per_employee')],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations
+
+from company.financials import refresh_financials
+
+
+def build_financials(apps, schema_editor):
+    """Fill the summary tables from the existing Sale and snapshot history."""
+    refresh_financials(apps=apps)
+
+
+class Migration(migrations.Migration):
+    # Separate from 0016: the upsert needs the unique constraints, which are
+    # only created once the migration that adds the tables has finished
+
+    dependencies = [
+        ('company', '0017_employeetrip'),
+    ]
+
+    operations = [
+        migrations.RunPython(build_financials, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,14 @@
 from django.db import models
 
+# Columns shared by Employee and DailyEmployeeSnapshot (copied from one to the other)
+EMPLOYEE_SNAPSHOT_FIELDS = [
+    'name', 'position', 'wage', 'manual_labour', 'intelligence', 'endurance',
+    'effectiveness_working_stats', 'effectiveness_settled_in', 'effectiveness_merits',
+    'effectiveness_director_education', 'effectiveness_management', 'effectiveness_inactivity',
+    'effectiveness_addiction', 'effectiveness_total', 'last_action_status', 'last_action_timestamp',
+    'last_action_relative', 'status_description', 'status_state', 'status_until',
+]
+
 
 class Company(models.Model):
     company_id = models.IntegerField(primary_key=True)
@@ -33,7 +42,9 @@ class Employee(models.Model):
     created_on = models.DateTimeField()  # Remove auto_now_add to allow manual setting
 
     class Meta:
-        pass
+        indexes = [
+            models.Index(fields=['created_on']),
+        ]
 
 
 class CurrentEmployee(models.Model):
@@ -144,3 +155,118 @@ class Sale(models.Model):
 
     def __str__(self):
         return f"{self.company.name} - {self.snapshot_date}"
+
+
+class CompanyDailyFinancials(models.Model):
+    """
+    Precomputed daily P&L per company, derived from Sale and DailyEmployeeSnapshot.
+    Refreshed by fetch_company_data after each ingest and rebuilt by
+    rebuild_company_financials; read by daily_sales_comparison.
+    """
+    company = models.ForeignKey(Company, on_delete=models.CASCADE)
+    snapshot_date = models.DateField()
+    iso_year = models.IntegerField()
+    iso_week = models.IntegerField()
+
+    income = models.BigIntegerField(default=0)  # Sale.sold_worth
+    wages = models.BigIntegerField(default=0)  # Sum of snapshot wages for the day
+    advertising = models.BigIntegerField(default=0)
+    profit = models.BigIntegerField(default=0)  # income - wages - advertising
+    margin = models.FloatField(default=0)  # profit as a percentage of income
+
+    # Copied from Sale so the page needs no other table
+    price = models.BigIntegerField(default=0)
+    in_stock = models.BigIntegerField(default=0)
+    sold_amount = models.BigIntegerField(default=0)
+    created_amount = models.BigIntegerField(default=0)
+    popularity = models.IntegerField(default=0)
+    efficiency = models.IntegerField(default=0)
+    environment = models.IntegerField(default=0)
+
+    updated_on = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['company', 'snapshot_date']
+        indexes = [
+            models.Index(fields=['snapshot_date']),
+            models.Index(fields=['company', 'iso_year', 'iso_week']),
+        ]
+        ordering = ['-snapshot_date']
+
+    def __str__(self):
+        return f"{self.company.name} - {self.snapshot_date}"
+
+
+class CompanyWeeklyFinancials(models.Model):
+    """ISO-week (Monday to Sunday) rollup of CompanyDailyFinancials per company"""
+    company = models.ForeignKey(Company, on_delete=models.CASCADE)
+    iso_year = models.IntegerField()
+    iso_week = models.IntegerField()
+    week_start = models.DateField()  # Monday
+    week_end = models.DateField()  # Sunday
+
+    income = models.BigIntegerField(default=0)
+    wages = models.BigIntegerField(default=0)
+    advertising = models.BigIntegerField(default=0)
+    profit = models.BigIntegerField(default=0)
+    margin = models.FloatField(default=0)
+    in_stock = models.BigIntegerField(default=0)
+    sold_amount = models.BigIntegerField(default=0)
+    created_amount = models.BigIntegerField(default=0)
+
+    updated_on = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['company', 'iso_year', 'iso_week']
+        indexes = [
+            models.Index(fields=['week_end']),
+        ]
+        ordering = ['-week_end']
+
+    def __str__(self):
+        return f"{self.company.name} - {self.iso_year}-W{self.iso_week:02d}"
+
+
+class EmployeeTrip(models.Model):
+    """
+    One Switzerland trip per row, advanced by fetch_company_data as the employee's
+    status moves from traveling to in Switzerland to returning. A trip closes
+    (ended_at set) on the first ingest that no longer shows a Switzerland status.
+    """
+    OUTBOUND = 'outbound'
+    ABROAD = 'abroad'
+    RETURNING = 'returning'
+    COMPLETE = 'complete'
+    STATE_CHOICES = [
+        (OUTBOUND, 'Traveling to Switzerland'),
+        (ABROAD, 'In Switzerland'),
+        (RETURNING, 'Returning from Switzerland'),
+        (COMPLETE, 'Complete'),
+    ]
+
+    company = models.ForeignKey(Company, on_delete=models.CASCADE)
+    employee_id = models.IntegerField()
+    state = models.CharField(max_length=16, choices=STATE_CHOICES, default=OUTBOUND)
+    departed_at = models.DateTimeField(null=True, blank=True)  # First seen traveling to Switzerland
+    arrived_at = models.DateTimeField(null=True, blank=True)  # First seen in Switzerland
+    returning_at = models.DateTimeField(null=True, blank=True)  # First seen returning from Switzerland
+    ended_at = models.DateTimeField(null=True, blank=True)  # First seen without a Switzerland status
+    last_seen_on = models.DateField()  # Snapshot date of the last Switzerland status
+    created_on = models.DateTimeField(auto_now_add=True)
+    updated_on = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['company', 'employee_id'],
+                condition=models.Q(ended_at__isnull=True),
+                name='one_open_trip_per_employee',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['company', 'last_seen_on']),
+        ]
+        ordering = ['-last_seen_on', '-id']
+
+    def __str__(self):
+        return f"{self.employee_id} - {self.get_state_display()} ({self.last_seen_on})"
@@ -0,0 +1,19 @@
+from celery import shared_task
+from django.core.management import call_command
+from Torn.locks import single_instance
+
+# acks_late: a run lost with its worker is redelivered. fetch_company_data
+# upserts sales, snapshots and trips (a repeat only adds one more Employee fetch
+# row for compaction to fold away) and compact_employee_history only deletes
+# rows it has already snapshotted, so a repeated run is harmless.
+
+@shared_task(acks_late=True, soft_time_limit=900, time_limit=960)
+@single_instance('fetch_company_data', lease_seconds=960)
+def fetch_company_data_task():
+    call_command('fetch_company_data')
+
+
+@shared_task(acks_late=True, soft_time_limit=1800, time_limit=1900)
+@single_instance('compact_employee_history', lease_seconds=1900)
+def compact_employee_history_task():
+    call_command('compact_employee_history')
@@ -1,3 +1,394 @@
-from django.test import TestCase
+import os
+import tempfile
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from Torn.page_cache import COMPANY, bump_dataset_version
+from users.models import TornUserProfile
+
+from .downsampling import lttb, min_max
+from .financials import refresh_financials
+from .management.commands.fetch_company_data import Command as FetchCompanyDataCommand
+from .models import (
+    Company, CompanyDailyFinancials, CompanyWeeklyFinancials, CurrentEmployee, DailyEmployeeSnapshot, Employee,
+    EmployeeTrip, Sale,
+)
+
+
+def employee_payload(name, status='Okay', addiction=0):
+    return {
+        'name': name,
+        'position': 'Driller',
+        'wage': 1000,
+        'manual_labor': 100,
+        'intelligence': 200,
+        'endurance': 300,
+        'effectiveness': {'working_stats': 50, 'addiction': addiction, 'total': 60},
+        'last_action': {'status': 'Online', 'timestamp': 1700000000, 'relative': '1 minute ago'},
+        'status': {'description': status, 'state': 'Okay', 'until': 0},
+    }
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class FetchCompanyEmployeesTests(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(company_id=110380, name='Polar Caps')
+        self.company_data = {'ID': 110380, 'name': 'Polar Caps'}
+        self.command = FetchCompanyDataCommand(stdout=StringIO())
+
+    def ingest(self, employees, snapshot_date, fetched_at):
+        return self.command._ingest_employees(
+            self.company, self.company_data, employees, snapshot_date, fetched_at, fetched_at
+        )
+
+    def test_employee_ingest_uses_constant_queries(self):
+        employees = {str(i): employee_payload(f'Employee{i}') for i in range(1, 21)}
+        CurrentEmployee.objects.create(user_id=999, username='Gone', company_id=110380, company_name='Polar Caps')
+
+        # open EmployeeTrip rows, then inside the transaction (savepoint + release):
+        # employees, snapshots, current employees and the stale current employee
+        # delete; nobody is travelling, so no trip is written
+        with self.assertNumQueries(7):
+            self.ingest(employees, date(2026, 1, 1), datetime(2026, 1, 1, 18, 30))
+
+        self.assertEqual(Employee.objects.count(), 20)
+        self.assertEqual(DailyEmployeeSnapshot.objects.count(), 20)
+        self.assertEqual(set(CurrentEmployee.objects.values_list('user_id', flat=True)), set(range(1, 21)))
+
+    def test_same_day_fetch_updates_snapshot_and_keeps_travel_history(self):
+        employees = {'1': employee_payload('Alice', status='Traveling to Switzerland')}
+        self.ingest(employees, date(2026, 1, 1), datetime(2026, 1, 1, 18, 15))
+
+        employees = {'1': employee_payload('Alice', status='Okay', addiction=-2)}
+        self.ingest(employees, date(2026, 1, 1), datetime(2026, 1, 1, 19, 15))
+
+        snapshot = DailyEmployeeSnapshot.objects.get()
+        self.assertEqual(snapshot.effectiveness_addiction, -2)
+        self.assertEqual(snapshot.last_travelled_to_switzerland.hour, 18)
+        self.assertEqual(Employee.objects.count(), 2)
+
+    def test_trip_advances_across_days_and_closes(self):
+        fetched = datetime(2026, 1, 1, 18, 30, tzinfo=dt_timezone.utc)
+        for offset, status in enumerate(('Traveling to Switzerland', 'In Switzerland',
+                                         'Returning to Torn from Switzerland', 'Okay')):
+            day = date(2026, 1, 1) + timedelta(days=offset)
+            self.ingest({'1': employee_payload('Alice', status=status)}, day, fetched + timedelta(days=offset))
+
+        trip = EmployeeTrip.objects.get()
+        self.assertEqual(trip.state, EmployeeTrip.COMPLETE)
+        self.assertEqual((trip.departed_at.day, trip.arrived_at.day, trip.returning_at.day, trip.ended_at.day),
+                         (1, 2, 3, 4))
+        self.assertEqual(trip.last_seen_on, date(2026, 1, 3))
+
+        returning = DailyEmployeeSnapshot.objects.get(snapshot_date=date(2026, 1, 3))
+        self.assertEqual(returning.last_travelled_to_switzerland, trip.departed_at)
+        self.assertEqual(returning.in_switzerland, trip.arrived_at)
+        back_home = DailyEmployeeSnapshot.objects.get(snapshot_date=date(2026, 1, 4))
+        self.assertIsNone(back_home.last_travelled_to_switzerland)
+
+        # A new departure opens a second trip
+        self.ingest({'1': employee_payload('Alice', status='Traveling to Switzerland')},
+                    date(2026, 1, 5), fetched + timedelta(days=4))
+        self.assertEqual(EmployeeTrip.objects.filter(ended_at__isnull=True).count(), 1)
+        self.assertEqual(EmployeeTrip.objects.count(), 2)
+
+        # The snapshot columns are enough to rebuild the same trips
+        call_command('backfill_employee_trips', stdout=StringIO())
+        self.assertEqual(
+            list(EmployeeTrip.objects.order_by('id').values_list('state', 'last_seen_on')),
+            [(EmployeeTrip.COMPLETE, date(2026, 1, 3)), (EmployeeTrip.OUTBOUND, date(2026, 1, 5))],
+        )
+
+
+class FetchCompanyKeysTests(TestCase):
+    def test_keys_include_active_profiles_without_duplicates(self):
+        user = User.objects.create(username='owner')
+        TornUserProfile.objects.create(user=user, tornuser='Alice', tornapi='alice-key')
+        TornUserProfile.objects.create(user=user, tornuser='Bob', tornapi='bob-key', is_active=False)
+        TornUserProfile.objects.create(user=user, tornuser='Env', tornapi='env-key')
+
+        command = FetchCompanyDataCommand(stdout=StringIO())
+        with mock.patch('company.management.commands.fetch_company_data.API_KEY', 'env-key'), \
+                mock.patch('company.management.commands.fetch_company_data.env', return_value=None):
+            keys = [api_key for _, api_key in command._keys_to_use()]
+
+        self.assertEqual(keys, ['env-key', 'alice-key'])
+
+
+def add_employee_row(company, employee_id, created_on, manual_labour):
+    Employee.objects.create(
+        company=company, employee_id=employee_id, name=f'Employee{employee_id}', position='Driller',
+        manual_labour=manual_labour, intelligence=1, endurance=1, effectiveness_working_stats=1,
+        effectiveness_settled_in=0, effectiveness_director_education=0, effectiveness_management=0,
+        effectiveness_inactivity=0, effectiveness_total=1, last_action_status='Online',
+        last_action_timestamp=created_on, last_action_relative='now', status_description='Okay',
+        status_state='Okay', created_on=created_on,
+    )
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class BackfillDailySnapshotsTests(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(company_id=110380, name='Polar Caps')
+        self.checkpoint = os.path.join(tempfile.mkdtemp(), 'checkpoint')
+
+    def test_backfill_keeps_last_row_per_day_and_resumes(self):
+        for hour, manual_labour in ((10, 1), (20, 2)):
+            add_employee_row(self.company, 1, datetime(2026, 1, 1, hour, tzinfo=dt_timezone.utc), manual_labour)
+        add_employee_row(self.company, 1, datetime(2026, 1, 2, 9, tzinfo=dt_timezone.utc), 3)
+        add_employee_row(self.company, 2, datetime(2026, 1, 2, 9, tzinfo=dt_timezone.utc), 4)
+
+        call_command('backfill_daily_snapshots', end_date='2026-01-01',
+                     checkpoint_file=self.checkpoint, stdout=StringIO())
+        self.assertEqual(
+            list(DailyEmployeeSnapshot.objects.values_list('employee_id', 'snapshot_date', 'manual_labour')),
+            [(1, date(2026, 1, 1), 2)],
+        )
+
+        # bounds, then one window read + one upsert (inside a savepoint) for the
+        # remaining day, then the financials refresh reads sales and wages
+        with self.assertNumQueries(7):
+            call_command('backfill_daily_snapshots', resume=True,
+                         checkpoint_file=self.checkpoint, stdout=StringIO())
+        self.assertEqual(DailyEmployeeSnapshot.objects.count(), 3)
+        self.assertEqual(DailyEmployeeSnapshot.objects.get(employee_id=2).manual_labour, 4)
+
+    def test_backfilled_wages_reach_the_financials(self):
+        Sale.objects.create(company=self.company, snapshot_date=date(2026, 1, 1), sold_worth=5000)
+        add_employee_row(self.company, 1, datetime(2026, 1, 1, 10, tzinfo=dt_timezone.utc), 1)
+        Employee.objects.update(wage=1000)
+
+        call_command('backfill_daily_snapshots', checkpoint_file=self.checkpoint, stdout=StringIO())
+
+        day = CompanyDailyFinancials.objects.get()
+        self.assertEqual((day.snapshot_date, day.wages, day.profit), (date(2026, 1, 1), 1000, 4000))
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ImportHistoricSalesTests(TestCase):
+    def test_imported_days_reach_the_financials(self):
+        path = os.path.join(tempfile.mkdtemp(), 'sales.csv')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('Polar Caps sales\n')
+            f.write('Date,daily_income,ad_budget,barrel price,in_stock,sold_amount\n')
+            f.write('03/01/2026,"10,000",100,50,20,200\n')
+            f.write('Week 1,,,,,\n')
+            f.write('05/01/2026,0,100,50,20,0\n')
+
+        call_command('import_historic_sales', path, stdout=StringIO())
+
+        self.assertEqual(
+            list(CompanyDailyFinancials.objects.order_by('snapshot_date').values_list('snapshot_date', 'sold_amount')),
+            [(date(2026, 1, 3), 200), (date(2026, 1, 5), 0)],
+        )
+        self.assertEqual(CompanyWeeklyFinancials.objects.count(), 2)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class CompactEmployeeHistoryTests(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(company_id=110380, name='Polar Caps')
+
+    def test_old_days_keep_last_row_per_employee(self):
+        old_day = timezone.now() - timedelta(days=40)
+        for hour, manual_labour in ((8, 1), (12, 2), (20, 3)):
+            add_employee_row(self.company, 1, old_day.replace(hour=hour), manual_labour)
+        add_employee_row(self.company, 1, timezone.now(), 4)
+        add_employee_row(self.company, 1, timezone.now() - timedelta(minutes=5), 5)
+
+        call_command('compact_employee_history', dry_run=True, stdout=StringIO())
+        self.assertEqual(Employee.objects.count(), 5)
+        self.assertFalse(DailyEmployeeSnapshot.objects.exists())
+
+        call_command('compact_employee_history', keep_days=30, batch_size=1, stdout=StringIO())
+        self.assertEqual(
+            sorted(Employee.objects.values_list('manual_labour', flat=True)), [3, 4, 5]
+        )
+        self.assertEqual(DailyEmployeeSnapshot.objects.get().manual_labour, 3)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class DailySalesComparisonTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        today = timezone.now().date()
+        for company_id, name in ((110380, 'Polar Caps'), (104351, 'Cornettow Caps')):
+            company = Company.objects.create(company_id=company_id, name=name)
+            for offset in range(90):
+                day = today - timedelta(days=offset)
+                Sale.objects.create(company=company, snapshot_date=day, sold_worth=10000, advertising_budget=100)
+                for employee_id in (1, 2):
+                    DailyEmployeeSnapshot.objects.create(
+                        company=company, employee_id=employee_id, name='x', position='x', wage=1000,
+                        manual_labour=1, intelligence=1, endurance=1, effectiveness_working_stats=1,
+                        effectiveness_settled_in=0, effectiveness_director_education=0,
+                        effectiveness_management=0, effectiveness_inactivity=0, effectiveness_total=1,
+                        last_action_status='Online', last_action_timestamp=timezone.now(),
+                        last_action_relative='now', status_description='Okay', status_state='Okay',
+                        snapshot_date=day,
+                    )
+        refresh_financials()
+
+    def query_count(self, days):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('daily_sales_comparison'), {'days': days})
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def test_query_count_is_independent_of_days(self):
+        short_count, _ = self.query_count(7)
+        long_count, response = self.query_count(90)
+        self.assertEqual(short_count, long_count)
+
+        day = response.context['combined_data'][-1]
+        self.assertEqual(day['companies'][110380]['wages'], 2000)
+        self.assertEqual(day['companies'][110380]['daily_profit'], 10000 - 2000 - 100)
+
+    def test_page_data_is_cached_until_next_ingest(self):
+        self.query_count(30)
+        cached_count, _ = self.query_count(30)
+        self.assertEqual(cached_count, 0)
+
+        Sale.objects.filter(company_id=110380).update(sold_worth=20000)
+        refresh_financials()
+        bump_dataset_version(COMPANY)
+        refreshed_count, response = self.query_count(30)
+        self.assertGreater(refreshed_count, 0)
+        self.assertEqual(response.context['combined_data'][-1]['companies'][110380]['daily_income'], 20000)
+
+
+class CompanyFinancialsTests(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(company_id=110380, name='Polar Caps')
+
+    def add_day(self, day, sold_worth, wage):
+        Sale.objects.create(company=self.company, snapshot_date=day, sold_worth=sold_worth, advertising_budget=100)
+        DailyEmployeeSnapshot.objects.create(
+            company=self.company, employee_id=1, name='x', position='x', wage=wage,
+            manual_labour=1, intelligence=1, endurance=1, effectiveness_working_stats=1,
+            effectiveness_settled_in=0, effectiveness_director_education=0,
+            effectiveness_management=0, effectiveness_inactivity=0, effectiveness_total=1,
+            last_action_status='Online', last_action_timestamp=timezone.now(),
+            last_action_relative='now', status_description='Okay', status_state='Okay',
+            snapshot_date=day,
+        )
+
+    def test_refresh_materializes_days_and_iso_weeks(self):
+        # 2026-01-04 is a Sunday closing ISO week 1; 2026-01-05 opens week 2
+        self.add_day(date(2026, 1, 3), 10000, 1000)
+        self.add_day(date(2026, 1, 4), 5000, 1000)
+        self.add_day(date(2026, 1, 5), 0, 1000)
+
+        self.assertEqual(refresh_financials(), (3, 2))
+
+        day = CompanyDailyFinancials.objects.get(snapshot_date=date(2026, 1, 3))
+        self.assertEqual((day.iso_year, day.iso_week, day.profit), (2026, 1, 8900))
+        self.assertAlmostEqual(day.margin, 89.0)
+        self.assertEqual(CompanyDailyFinancials.objects.get(snapshot_date=date(2026, 1, 5)).margin, 0)
+
+        week = CompanyWeeklyFinancials.objects.get(iso_week=1)
+        self.assertEqual((week.week_start, week.week_end), (date(2025, 12, 29), date(2026, 1, 4)))
+        self.assertEqual((week.income, week.profit), (15000, 12800))
+
+        # A later same-day fetch only recomputes the touched day and its week
+        Sale.objects.filter(snapshot_date=date(2026, 1, 4)).update(sold_worth=6000)
+        self.assertEqual(refresh_financials([110380], date(2026, 1, 4), date(2026, 1, 4)), (1, 1))
+        self.assertEqual(CompanyWeeklyFinancials.objects.get(iso_week=1).income, 16000)
+
+
+class WorkstatsSeriesTests(TestCase):
+    def test_downsampling_keeps_endpoints_and_spikes(self):
+        x = np.arange(1000, dtype=float)
+        y = np.sin(x / 50)
+        y[500] = 10
+
+        kept = lttb(x, y, 50)
+        self.assertEqual(len(kept), 50)
+        self.assertEqual((kept[0], kept[-1]), (0, 999))
+        self.assertIn(500, kept)
+        self.assertTrue((np.diff(kept) > 0).all())
+
+        kept = min_max(x, y, 50)
+        self.assertLessEqual(len(kept), 50)
+        self.assertIn(500, kept)
+        self.assertEqual(list(lttb(x[:10], y[:10], 50)), list(range(10)))
+
+    def test_endpoint_returns_bounded_series(self):
+        company = Company.objects.create(company_id=110380, name='Polar Caps')
+        start = date(2025, 1, 1)
+        for offset in range(400):
+            DailyEmployeeSnapshot.objects.create(
+                company=company, employee_id=1, name='Alice', position='x', wage=1000,
+                manual_labour=offset, intelligence=1, endurance=1, effectiveness_working_stats=1,
+                effectiveness_settled_in=0, effectiveness_director_education=0,
+                effectiveness_management=0, effectiveness_inactivity=0, effectiveness_total=1,
+                last_action_status='Online', last_action_timestamp=timezone.now(),
+                last_action_relative='now', status_description='Okay', status_state='Okay',
+                snapshot_date=start + timedelta(days=offset),
+            )
+
+        response = self.client.get(reverse('workstats_series'), {
+            'employee_id': '1', 'metrics': 'manual_labour,endurance', 'points': 40, 'end': '2025-12-31',
+        })
+        self.assertEqual(response.status_code, 200)
+        series = response.json()['series']
+        self.assertEqual([s['metric'] for s in series], ['manual_labour', 'endurance'])
+        self.assertEqual(series[0]['raw_count'], 365)
+        self.assertEqual(len(series[0]['x']), 40)
+        self.assertEqual((series[0]['x'][0], series[0]['x'][-1]), ('2025-01-01', '2025-12-31'))
+
+        response = self.client.get(reverse('workstats_series'), {'metrics': 'wage'})
+        self.assertEqual(response.status_code, 400)
+
+
+class EmployeeHistoryApiTests(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(company_id=110380, name='Polar Caps')
+        for offset in range(3):
+            for employee_id in (1, 2):
+                DailyEmployeeSnapshot.objects.create(
+                    company=self.company, employee_id=employee_id, name=f'Employee{employee_id}', position='x',
+                    wage=1000, manual_labour=offset, intelligence=1, endurance=1, effectiveness_working_stats=1,
+                    effectiveness_settled_in=0, effectiveness_director_education=0,
+                    effectiveness_management=0, effectiveness_inactivity=0, effectiveness_total=1,
+                    last_action_status='Online', last_action_timestamp=timezone.now(),
+                    last_action_relative='now', status_description='Okay', status_state='Okay',
+                    snapshot_date=date(2026, 1, 1) + timedelta(days=offset),
+                )
+        self.url = reverse('employee_history', args=[110380])
+
+    def test_keyset_pages_cover_every_row_once(self):
+        seen = []
+        params = {'limit': 4, 'since': '2026-01-01'}
+        while True:
+            body = self.client.get(self.url, params).json()
+            seen.extend((row[0], row[1]) for row in body['rows'])
+            if not body['next_cursor']:
+                break
+            params['cursor'] = body['next_cursor']
+
+        self.assertEqual(body['columns'][:3], ['snapshot_date', 'employee_id', 'name'])
+        self.assertEqual(len(seen), 6)
+        self.assertEqual(seen, sorted(set(seen)))
+
+    def test_revalidation_uses_etag_until_next_ingest(self):
+        response = self.client.get(self.url)
+        self.assertIn('Last-Modified', response)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        DailyEmployeeSnapshot.objects.filter(employee_id=1).first().save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,82 @@
+from django.db.models import Q
+
+from .models import EmployeeTrip
+
+# Trip timestamp set the first time each state is observed
+STATE_FIELDS = {
+    EmployeeTrip.OUTBOUND: 'departed_at',
+    EmployeeTrip.ABROAD: 'arrived_at',
+    EmployeeTrip.RETURNING: 'returning_at',
+}
+TRIP_STATE_FIELDS = ['state', 'departed_at', 'arrived_at', 'returning_at', 'ended_at', 'last_seen_on']
+TRIP_UPDATE_FIELDS = TRIP_STATE_FIELDS + ['updated_on']
+
+
+def switzerland_state(status_desc):
+    """Map a Torn status description to a trip state (None for other Switzerland statuses)."""
+    if 'Traveling to Switzerland' in status_desc:
+        return EmployeeTrip.OUTBOUND
+    if 'In Switzerland' in status_desc:
+        return EmployeeTrip.ABROAD
+    if 'Returning' in status_desc and 'Switzerland' in status_desc:
+        return EmployeeTrip.RETURNING
+    return None
+
+
+def current_trips(company, employee_ids, snapshot_date):
+    """
+    The trip each employee is on (or finished on ``snapshot_date``), keyed by
+    employee id, in a single query.
+    """
+    trips = EmployeeTrip.objects.filter(
+        company=company, employee_id__in=employee_ids
+    ).filter(
+        Q(ended_at__isnull=True) | Q(last_seen_on__gte=snapshot_date)
+    ).order_by('id')
+    # The open trip is always the newest, so it wins over one closed earlier in the day
+    return {trip.employee_id: trip for trip in trips}
+
+
+def advance_trip(trip, company, employee_id, status_desc, snapshot_date, observed_at):
+    """
+    Apply one observed status to the employee's trip and return the trip to keep
+    (new, updated, or None when the employee is not travelling).
+    """
+    if 'Switzerland' not in status_desc:
+        if trip and trip.ended_at is None:
+            trip.state = EmployeeTrip.COMPLETE
+            trip.ended_at = observed_at
+        return trip
+
+    if trip is None or trip.ended_at is not None:
+        trip = EmployeeTrip(company=company, employee_id=employee_id, last_seen_on=snapshot_date)
+
+    state = switzerland_state(status_desc)
+    if state:
+        trip.state = state
+        if getattr(trip, STATE_FIELDS[state]) is None:
+            setattr(trip, STATE_FIELDS[state], observed_at)
+    trip.last_seen_on = snapshot_date
+    return trip
+
+
+def snapshot_travel_fields(trip, snapshot_date):
+    """DailyEmployeeSnapshot Switzerland columns for an ongoing trip or one seen on ``snapshot_date``."""
+    if trip and (trip.ended_at is None or trip.last_seen_on == snapshot_date):
+        return {
+            'last_travelled_to_switzerland': trip.departed_at,
+            'in_switzerland': trip.arrived_at,
+            'returning_from_switzerland': trip.returning_at,
+        }
+    return {
+        'last_travelled_to_switzerland': None,
+        'in_switzerland': None,
+        'returning_from_switzerland': None,
+    }
+
+
+def trip_key(trip):
+    """Comparable state of a trip, used to skip writing unchanged rows."""
+    if trip is None:
+        return None
+    return tuple(getattr(trip, field) for field in TRIP_STATE_FIELDS)
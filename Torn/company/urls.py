@@ -4,6 +4,8 @@ from . import views
 urlpatterns = [
     path('eg', views.eternal_workstats, name='eternal_workstats'),
     path('pc', views.employees, name='employees'),
+    path('api/employees/<int:company_id>/history', views.employee_history, name='employee_history'),
+    path('api/workstats', views.workstats_series, name='workstats_series'),
     path('sales', views.daily_sales_comparison, name='daily_sales_comparison'),
     path('', views.company_list, name='company_list'),
 ]
@@ -1,40 +1,65 @@
 from django.shortcuts import render
-from .models import Company, Employee, DailyEmployeeSnapshot, CurrentEmployee, Sale
+from .models import (
+    Company, CompanyDailyFinancials, CompanyWeeklyFinancials, CurrentEmployee, DailyEmployeeSnapshot, Employee,
+)
+from .downsampling import METHODS as DOWNSAMPLING_METHODS
+from .travel import current_trips
+import base64
+import hashlib
 import json
+import numpy as np
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition
 from django.utils.safestring import mark_safe
 from datetime import datetime, timedelta
 from django.utils import timezone
-from django.db.models import Q, Sum
+from django.db.models import Max, Q, Sum
+from Torn.page_cache import COMPANY, cached_page_data
 
 def company_list(request):
     companies = Company.objects.all()
     return render(request, 'company/company_list.html', {'companies': companies})
 
 def eternal_workstats(request):
-    # Filter employees to only show those from company ID 104351, exclude total effectiveness of 0, ordered by created_on
-    employees = Employee.objects.filter(company__company_id=104351, effectiveness_total__gt=0).order_by('created_on')
+    context = cached_page_data('eternal_workstats', {}, [COMPANY], _eternal_workstats_context)
+    return render(request, 'company/eternal_workstats.html', context)
+
+def _eternal_workstats_context():
+    # One snapshot per employee per day for company ID 104351 (raw Employee rows are compacted
+    # by compact_employee_history), excluding total effectiveness of 0, ordered by date
+    snapshots = DailyEmployeeSnapshot.objects.filter(
+        company__company_id=104351, effectiveness_total__gt=0
+    ).order_by('snapshot_date', 'employee_id')
     # Prepare data for chart: include manual_labour, intelligence, endurance, and addiction
-    employee_data = list(employees.values(
-        'employee_id', 'name', 'created_on', 'effectiveness_working_stats',
+    employee_data = list(snapshots.values(
+        'employee_id', 'name', 'snapshot_date', 'effectiveness_working_stats',
         'manual_labour', 'intelligence', 'endurance', 'effectiveness_addiction'))
+    # Rename 'snapshot_date' to 'created_on' for compatibility with frontend
+    for record in employee_data:
+        record['created_on'] = record.pop('snapshot_date')
     employee_data_json = mark_safe(json.dumps(employee_data, default=str))
-    return render(request, 'company/eternal_workstats.html', {
-        'employees': employees,
+    return {
         'employee_data_json': employee_data_json
-    })
+    }
 
 def employees(request):
-    # Get employee data from DailyEmployeeSnapshot model
-    from django.db.models import Max
-    from datetime import timedelta
+    requested_company_id = request.GET.get('company_id')
+    context = cached_page_data(
+        'employees', {'company_id': requested_company_id, 'today': timezone.now().date()}, [COMPANY],
+        lambda: _employees_context(requested_company_id),
+    )
+    return render(request, 'company/employees.html', context)
 
+def _employees_context(requested_company_id):
+    # Get employee data from DailyEmployeeSnapshot model
     # Determine target company (default to 110380) and list companies with data in last 7 days
     last_week = timezone.now().date() - timedelta(days=7)
     available_companies = Company.objects.filter(
         dailyemployeesnapshot__snapshot_date__gte=last_week
     ).distinct().order_by('name')
 
-    requested_company_id = request.GET.get('company_id')
     default_company_id = 110380
     if requested_company_id and requested_company_id.isdigit():
         target_company_id = int(requested_company_id)
@@ -64,12 +89,11 @@ def employees(request):
 
     # If no current members, short-circuit with empty data
     if not current_member_ids or not all_snapshots.exists():
-        return render(request, 'company/employees.html', {
-            'employees': [],
+        return {
             'employee_data_json': mark_safe(json.dumps([], default=str)),
-            'available_companies': available_companies,
+            'available_companies': list(available_companies),
             'selected_company_id': target_company_id
-        })
+        }
     
     # Find the most recent snapshot date
     most_recent_date = all_snapshots.aggregate(Max('snapshot_date'))['snapshot_date__max']
@@ -90,30 +114,18 @@ def employees(request):
         employee_id__in=current_member_ids
     ).order_by('snapshot_date')
     
-    # Get Switzerland-related snapshot data for current addicted members
+    # Switzerland trips for current addicted members: ongoing, or seen on the latest snapshot date
+    trips_by_employee = current_trips(target_company_id, current_addicted_member_ids, most_recent_date)
+
     switzerland_data = {}
     for emp_id in current_addicted_member_ids:
-        # Get the latest Switzerland status info from the snapshot model fields
-        latest_snapshot = all_snapshots.filter(
-            employee_id=emp_id
-        ).order_by('-snapshot_date').first()
-        
-        if latest_snapshot:
-            switzerland_data[emp_id] = {
-                'has_switzerland_status': latest_snapshot.in_switzerland is not None or 
-                                         latest_snapshot.last_travelled_to_switzerland is not None or
-                                         latest_snapshot.returning_from_switzerland is not None,
-                'to_switzerland': latest_snapshot.last_travelled_to_switzerland,
-                'in_switzerland': latest_snapshot.in_switzerland,
-                'from_switzerland': latest_snapshot.returning_from_switzerland
-            }
-        else:
-            switzerland_data[emp_id] = {
-                'has_switzerland_status': False,
-                'to_switzerland': None,
-                'in_switzerland': None,
-                'from_switzerland': None
-            }
+        trip = trips_by_employee.get(emp_id)
+        switzerland_data[emp_id] = {
+            'has_switzerland_status': trip is not None and any((trip.departed_at, trip.arrived_at, trip.returning_at)),
+            'to_switzerland': trip.departed_at if trip else None,
+            'in_switzerland': trip.arrived_at if trip else None,
+            'from_switzerland': trip.returning_at if trip else None,
+        }
     
     # Prepare data for chart from snapshots
     employee_data = list(snapshots.values(
@@ -169,12 +181,11 @@ def employees(request):
             record['switzerland_from'] = None
     
     employee_data_json = mark_safe(json.dumps(combined_employee_data, default=str))
-    return render(request, 'company/employees.html', {
-        'employees': snapshots,
+    return {
         'employee_data_json': employee_data_json,
-        'available_companies': available_companies,
+        'available_companies': list(available_companies),
         'selected_company_id': target_company_id
-    })
+    }
 
 
 def daily_sales_comparison(request):
@@ -182,82 +193,80 @@ def daily_sales_comparison(request):
     Display daily sales metrics for both companies side-by-side (Polar Caps and Cornettow Caps)
     with both individual and combined values for each day
     """
-    
+    # Get date range from request
+    days_back = request.GET.get('days', 30)
+    try:
+        days_back = int(days_back)
+    except (ValueError, TypeError):
+        days_back = 30
+
+    context = cached_page_data(
+        'daily_sales_comparison', {'days': days_back, 'today': timezone.now().date()}, [COMPANY],
+        lambda: _daily_sales_context(days_back),
+    )
+    return render(request, 'company/daily_sales_comparison.html', context)
+
+def _daily_sales_context(days_back):
     # Get all companies with sales data
     companies = Company.objects.filter(sale__isnull=False).distinct().order_by('name')
     
     if not companies.exists():
-        return render(request, 'company/daily_sales_comparison.html', {
+        return {
             'error': 'No sales data available',
             'companies': [],
             'sales_data': []
-        })
-    
-    # Get date range from request
-    days_back = request.GET.get('days', 30)
-    try:
-        days_back = int(days_back)
-    except (ValueError, TypeError):
-        days_back = 30
+        }
     
     start_date = timezone.now().date() - timedelta(days=days_back)
     
-    # Get sales data for all companies
-    sales = Sale.objects.filter(
+    # Daily P&L rows are materialized by fetch_company_data / rebuild_company_financials
+    daily_rows = CompanyDailyFinancials.objects.filter(
         snapshot_date__gte=start_date
-    ).order_by('-snapshot_date')
-    
-    # Group sales by date and organize by company
+    ).select_related('company').order_by('-snapshot_date')
+
     sales_by_date = {}
-    company_ids = set()
-    
-    for sale in sales:
-        date_key = sale.snapshot_date
-        company_ids.add(sale.company_id)
-        
-        if date_key not in sales_by_date:
-            sales_by_date[date_key] = {}
-        
-        # Calculate derived metrics
-        daily_income = sale.sold_worth or 0
-        sold_amount = sale.sold_amount or 0
-        created_amount = sale.created_amount or 0
-        advertising_budget = sale.advertising_budget or 0
-        
-        # Calculate total wages for this company on this date from employee snapshots
-        from django.db.models import Sum
-        employee_wages = DailyEmployeeSnapshot.objects.filter(
-            company=sale.company,
-            snapshot_date=sale.snapshot_date
-        ).aggregate(total_wages=Sum('wage'))['total_wages'] or 0
-        
-        # Calculate daily profit (revenue - wages - advertising)
-        daily_profit = daily_income - employee_wages - advertising_budget
-        
-        # Calculate profit margin percentage
-        profit_margin = ((daily_profit / daily_income) * 100) if daily_income > 0 else 0
-        
-        # Calculate value generated (using sold_worth as proxy)
-        value_generated = daily_income
-        
-        sales_by_date[date_key][sale.company_id] = {
-            'company_name': sale.company.name,
-            'daily_income': daily_income,
-            'price': sale.price or 0,
-            'in_stock': sale.in_stock or 0,
-            'sold_amount': sold_amount,
-            'created_amount': created_amount,
-            'popularity': sale.popularity or 0,
-            'efficiency': sale.efficiency or 0,
-            'environment': sale.environment or 0,
-            'advertising_budget': sale.advertising_budget or 0,            'wages': employee_wages,            'daily_profit': daily_profit,
-            'profit_margin': profit_margin,
-            'value_generated': value_generated,
+    for row in daily_rows:
+        sales_by_date.setdefault(row.snapshot_date, {})[row.company_id] = {
+            'company_name': row.company.name,
+            'daily_income': row.income,
+            'price': row.price,
+            'in_stock': row.in_stock,
+            'sold_amount': row.sold_amount,
+            'created_amount': row.created_amount,
+            'popularity': row.popularity,
+            'efficiency': row.efficiency,
+            'environment': row.environment,
+            'advertising_budget': row.advertising,
+            'wages': row.wages,
+            'daily_profit': row.profit,
+            'profit_margin': row.margin,
+            'value_generated': row.income,
         }
-    
+
+    # Weekly totals across all companies, keyed by the Sunday that closes each ISO week
+    week_totals_by_end = {
+        row['week_end']: {
+            'daily_income': row['income'] or 0,
+            'sold_amount': row['sold_amount'] or 0,
+            'created_amount': row['created_amount'] or 0,
+            'in_stock': row['in_stock'] or 0,
+            'advertising_budget': row['advertising'] or 0,
+            'wages': row['wages'] or 0,
+            'daily_profit': row['profit'] or 0,
+            'value_generated': row['income'] or 0,
+        }
+        for row in CompanyWeeklyFinancials.objects.filter(week_end__gte=start_date)
+        .values('week_end')
+        .annotate(
+            income=Sum('income'), sold_amount=Sum('sold_amount'), created_amount=Sum('created_amount'),
+            in_stock=Sum('in_stock'), advertising=Sum('advertising'), wages=Sum('wages'), profit=Sum('profit'),
+        )
+        .order_by()
+    }
+
     # Build combined data structure with both individual and totals
     combined_data = []
-    
+
     for date_key in sorted(sales_by_date.keys(), reverse=True):
         date_entry = {
             'date': date_key,
@@ -273,65 +282,26 @@ def daily_sales_comparison(request):
                 'value_generated': 0,
             }
         }
-        
+
         # Add individual company data and calculate totals (sorted by company ID for consistent ordering)
         for company_id in sorted(sales_by_date[date_key].keys()):
             company_data = sales_by_date[date_key][company_id]
             date_entry['companies'][company_id] = company_data
-            date_entry['totals']['daily_income'] += company_data['daily_income']
-            date_entry['totals']['sold_amount'] += company_data['sold_amount']
-            date_entry['totals']['created_amount'] += company_data['created_amount']
-            date_entry['totals']['in_stock'] += company_data['in_stock']
-            date_entry['totals']['advertising_budget'] += company_data['advertising_budget']
-            date_entry['totals']['wages'] += company_data['wages']
-            date_entry['totals']['daily_profit'] += company_data['daily_profit']
-            date_entry['totals']['value_generated'] += company_data['value_generated']
-        
-        # Check if this is a Sunday (weekday() returns 6 for Sunday)
-        is_sunday = date_key.weekday() == 6
-        
-        # If it's Sunday, calculate weekly summary for the past 7 days (this Sunday plus previous 6 days)
-        if is_sunday:
-            week_totals = {
-                'daily_income': 0,
-                'sold_amount': 0,
-                'created_amount': 0,
-                'in_stock': 0,
-                'advertising_budget': 0,
-                'wages': 0,
-                'daily_profit': 0,
-                'value_generated': 0,
-            }
-            
-            # Sum up the current day and previous 6 days (Monday to Sunday)
-            for day_offset in range(7):
-                check_date = date_key - timedelta(days=day_offset)
-                if check_date in sales_by_date:
-                    for company_id in sales_by_date[check_date]:
-                        day_data = sales_by_date[check_date][company_id]
-                        week_totals['daily_income'] += day_data['daily_income']
-                        week_totals['sold_amount'] += day_data['sold_amount']
-                        week_totals['created_amount'] += day_data['created_amount']
-                        week_totals['in_stock'] += day_data['in_stock']
-                        week_totals['advertising_budget'] += day_data['advertising_budget']
-                        week_totals['wages'] += day_data['wages']
-                        week_totals['daily_profit'] += day_data['daily_profit']
-                        week_totals['value_generated'] += day_data['value_generated']
-            
-            # Add weekly summary if we have data
-            if any(v > 0 for v in week_totals.values()):
-                week_start = date_key - timedelta(days=6)  # Monday
-                week_end = date_key  # Sunday
-                
-                combined_data.append({
-                    'is_weekly_summary': True,
-                    'week_start': week_start,
-                    'week_end': week_end,
-                    'totals': week_totals
-                })
-        
+            for key in date_entry['totals']:
+                date_entry['totals'][key] += company_data[key]
+
+        # Insert the weekly summary (Monday to Sunday) ahead of each Sunday
+        week_totals = week_totals_by_end.get(date_key)
+        if week_totals and any(v > 0 for v in week_totals.values()):
+            combined_data.append({
+                'is_weekly_summary': True,
+                'week_start': date_key - timedelta(days=6),
+                'week_end': date_key,
+                'totals': week_totals
+            })
+
         combined_data.append(date_entry)
-    
+
     # Get all unique company IDs from database for complete list
     all_companies = list(companies)
     company_map = {c.company_id: c.name for c in all_companies}
@@ -343,7 +313,7 @@ def daily_sales_comparison(request):
         'days': days_back
     }, default=str))
     
-    return render(request, 'company/daily_sales_comparison.html', {
+    return {
         'companies': all_companies,
         'combined_data': combined_data,
         'company_map': company_map,
@@ -351,4 +321,185 @@ def daily_sales_comparison(request):
         'days_back': days_back,
         'start_date': start_date,
         'end_date': timezone.now().date(),
-    })
\ No newline at end of file
+    }
+
+# Series the workstats endpoint may return, as on the employees/eternal_workstats charts
+WORKSTAT_METRICS = [
+    'effectiveness_working_stats', 'manual_labour', 'intelligence', 'endurance',
+    'effectiveness_addiction', 'effectiveness_inactivity', 'effectiveness_total',
+]
+MAX_SERIES_POINTS = 5000
+
+
+def workstats_series(request):
+    """
+    Downsampled per-employee workstat series as JSON.
+
+    Query parameters: company_id, employee_id (repeatable or comma separated;
+    default every employee with data), start/end (YYYY-MM-DD), metrics (comma
+    separated), points (target points per series), method (lttb or minmax) and
+    source (snapshot for DailyEmployeeSnapshot, raw for every Employee fetch).
+    """
+    source = request.GET.get('source', 'snapshot')
+    if source == 'raw':
+        queryset, time_field, default_company_id = Employee.objects.all(), 'created_on', 104351
+    elif source == 'snapshot':
+        queryset, time_field, default_company_id = DailyEmployeeSnapshot.objects.all(), 'snapshot_date', 110380
+    else:
+        return JsonResponse({'error': 'source must be snapshot or raw'}, status=400)
+
+    method = request.GET.get('method', 'lttb')
+    if method not in DOWNSAMPLING_METHODS:
+        return JsonResponse({'error': f'method must be one of {", ".join(DOWNSAMPLING_METHODS)}'}, status=400)
+
+    metrics = [m for m in request.GET.get('metrics', ','.join(WORKSTAT_METRICS)).split(',') if m]
+    unknown = [m for m in metrics if m not in WORKSTAT_METRICS]
+    if unknown or not metrics:
+        return JsonResponse({'error': f'unknown metrics: {", ".join(unknown) or "none given"}'}, status=400)
+
+    try:
+        company_id = int(request.GET.get('company_id', default_company_id))
+        points = min(max(int(request.GET.get('points', 500)), 3), MAX_SERIES_POINTS)
+        employee_ids = [
+            int(value) for raw in request.GET.getlist('employee_id') for value in raw.split(',') if value
+        ]
+        start = datetime.strptime(request.GET['start'], '%Y-%m-%d').date() if request.GET.get('start') else None
+        end = datetime.strptime(request.GET['end'], '%Y-%m-%d').date() if request.GET.get('end') else None
+    except ValueError:
+        return JsonResponse({'error': 'company_id, employee_id and points must be integers; dates YYYY-MM-DD'}, status=400)
+
+    queryset = queryset.filter(company_id=company_id, effectiveness_total__gt=0)
+    if employee_ids:
+        queryset = queryset.filter(employee_id__in=employee_ids)
+    if source == 'raw':
+        # Compare created_on against datetimes so the index on it is usable
+        start = start and timezone.make_aware(datetime.combine(start, datetime.min.time()))
+        end = end and timezone.make_aware(datetime.combine(end + timedelta(days=1), datetime.min.time()))
+        if start:
+            queryset = queryset.filter(created_on__gte=start)
+        if end:
+            queryset = queryset.filter(created_on__lt=end)
+    else:
+        if start:
+            queryset = queryset.filter(snapshot_date__gte=start)
+        if end:
+            queryset = queryset.filter(snapshot_date__lte=end)
+
+    # One ordered read; rows are grouped per employee as they stream in
+    rows_by_employee = {}
+    names = {}
+    for employee_id, name, when, *values in queryset.order_by('employee_id', time_field).values_list(
+        'employee_id', 'name', time_field, *metrics
+    ).iterator(chunk_size=5000):
+        rows_by_employee.setdefault(employee_id, []).append((when, values))
+        names[employee_id] = name
+
+    downsample = DOWNSAMPLING_METHODS[method]
+    series = []
+    for employee_id, rows in rows_by_employee.items():
+        times = [when for when, _ in rows]
+        x = np.array([
+            when.timestamp() if isinstance(when, datetime) else datetime(when.year, when.month, when.day).timestamp()
+            for when in times
+        ])
+        values = np.array([row_values for _, row_values in rows], dtype=float)
+        for column, metric in enumerate(metrics):
+            kept = downsample(x, values[:, column], points)
+            series.append({
+                'employee_id': employee_id,
+                'name': names[employee_id],
+                'metric': metric,
+                'raw_count': len(rows),
+                'x': [times[i].isoformat() for i in kept],
+                'y': values[kept, column].tolist(),
+            })
+
+    return JsonResponse({
+        'company_id': company_id,
+        'source': source,
+        'method': method,
+        'points': points,
+        'series': series,
+    })
+
+
+# Columns of each row returned by employee_history, in order
+EMPLOYEE_HISTORY_COLUMNS = [
+    'snapshot_date', 'employee_id', 'name', 'effectiveness_working_stats', 'manual_labour', 'intelligence',
+    'endurance', 'effectiveness_addiction', 'effectiveness_inactivity', 'last_action_timestamp',
+]
+EMPLOYEE_HISTORY_PAGE_SIZE = 1000
+EMPLOYEE_HISTORY_MAX_PAGE_SIZE = 5000
+
+
+def _employee_history_last_modified(request, company_id):
+    """Time of the company's last snapshot write, looked up once per request."""
+    if not hasattr(request, 'employee_history_last_modified'):
+        request.employee_history_last_modified = DailyEmployeeSnapshot.objects.filter(
+            company_id=company_id
+        ).aggregate(last=Max('modified_on'))['last']
+    return request.employee_history_last_modified
+
+
+def _employee_history_etag(request, company_id):
+    last_modified = _employee_history_last_modified(request, company_id)
+    if last_modified is None:
+        return None
+    key = f"{company_id}:{last_modified.isoformat()}:{request.GET.urlencode()}"
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+def _encode_cursor(snapshot_date, employee_id):
+    return base64.urlsafe_b64encode(f"{snapshot_date.isoformat()}:{employee_id}".encode()).decode()
+
+
+def _decode_cursor(cursor):
+    snapshot_date, employee_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(':')
+    return datetime.strptime(snapshot_date, '%Y-%m-%d').date(), int(employee_id)
+
+
+@gzip_page
+@condition(etag_func=_employee_history_etag, last_modified_func=_employee_history_last_modified)
+def employee_history(request, company_id):
+    """
+    Read-only DailyEmployeeSnapshot history for one company as compact rows.
+
+    Query parameters: since/until (YYYY-MM-DD, inclusive), limit (rows per page)
+    and cursor (the next_cursor of the previous page). Pages are keyed on
+    (snapshot_date, employee_id) so they stay stable while new days are ingested.
+    """
+    company = get_object_or_404(Company, company_id=company_id)
+
+    try:
+        limit = min(max(int(request.GET.get('limit', EMPLOYEE_HISTORY_PAGE_SIZE)), 1), EMPLOYEE_HISTORY_MAX_PAGE_SIZE)
+        since = datetime.strptime(request.GET['since'], '%Y-%m-%d').date() if request.GET.get('since') else None
+        until = datetime.strptime(request.GET['until'], '%Y-%m-%d').date() if request.GET.get('until') else None
+        cursor = _decode_cursor(request.GET['cursor']) if request.GET.get('cursor') else None
+    except (ValueError, UnicodeDecodeError):
+        return JsonResponse({'error': 'limit must be an integer, dates YYYY-MM-DD and cursor a next_cursor value'}, status=400)
+
+    snapshots = DailyEmployeeSnapshot.objects.filter(company=company)
+    if since:
+        snapshots = snapshots.filter(snapshot_date__gte=since)
+    if until:
+        snapshots = snapshots.filter(snapshot_date__lte=until)
+    if cursor:
+        cursor_date, cursor_employee_id = cursor
+        snapshots = snapshots.filter(
+            Q(snapshot_date__gt=cursor_date) | Q(snapshot_date=cursor_date, employee_id__gt=cursor_employee_id)
+        )
+
+    rows = list(
+        snapshots.order_by('snapshot_date', 'employee_id').values_list(*EMPLOYEE_HISTORY_COLUMNS)[:limit + 1]
+    )
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(rows[-1][0], rows[-1][1])
+
+    return JsonResponse({
+        'company_id': company.company_id,
+        'columns': EMPLOYEE_HISTORY_COLUMNS,
+        'rows': rows,
+        'next_cursor': next_cursor,
+    }, json_dumps_params={'separators': (',', ':')})
@@ -0,0 +1,108 @@
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db.models import Count, F, IntegerField, Min
+from django.db.models.functions import Cast
+
+from users.models import UserRecord
+from .models import FactionActivityHour
+
+
+def hour_start(timestamp):
+    """UTC start of the hour containing a Unix ``timestamp``."""
+    return datetime.fromtimestamp(timestamp - timestamp % 3600, tz=dt_timezone.utc)
+
+
+def record_activity(entries, replace=False):
+    """
+    Fold ``(faction_id, user_id, last_action_timestamp)`` entries into
+    FactionActivityHour rows.
+
+    Existing rows for the touched (faction, hour) pairs are loaded in one
+    query and merged with the new user ids, then everything is upserted in
+    bulk. With ``replace=True`` existing rows are overwritten instead of
+    merged (used when rebuilding from history).
+
+    Returns the number of rows written.
+    """
+    buckets = defaultdict(set)
+    for faction_id, user_id, timestamp in entries:
+        if timestamp:
+            buckets[(faction_id, hour_start(timestamp))].add(user_id)
+
+    if not buckets:
+        return 0
+
+    if not replace:
+        faction_ids = {faction_id for faction_id, _ in buckets}
+        hours = {hour for _, hour in buckets}
+        existing = FactionActivityHour.objects.filter(
+            faction_id__in=faction_ids, hour__in=hours
+        ).values_list('faction_id', 'hour', 'user_ids')
+        for faction_id, hour, user_ids in existing:
+            if (faction_id, hour) in buckets:
+                buckets[(faction_id, hour)].update(user_ids)
+
+    rows = [
+        FactionActivityHour(
+            faction_id=faction_id,
+            hour=hour,
+            active_user_count=len(user_ids),
+            user_ids=sorted(user_ids),
+        )
+        for (faction_id, hour), user_ids in buckets.items()
+    ]
+    FactionActivityHour.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=['faction', 'hour'],
+        update_fields=['active_user_count', 'user_ids'],
+        batch_size=1000,
+    )
+    return len(rows)
+
+
+def rollup_hourly_activity(faction_ids, since):
+    """
+    ``(faction_id, hour, active_user_count, user_ids)`` rows for
+    ``faction_ids`` from the FactionActivityHour rollup, covering every hour
+    that overlaps the window starting at ``since``.
+    """
+    return list(
+        FactionActivityHour.objects.filter(
+            faction_id__in=faction_ids,
+            hour__gt=since - timedelta(hours=1),
+        ).values_list('faction_id', 'hour', 'active_user_count', 'user_ids')
+    )
+
+
+def live_hourly_activity(faction_ids, since):
+    """
+    Same rows as ``rollup_hourly_activity`` computed straight from UserRecord
+    with one grouped query.
+
+    The hour bucket is the Unix timestamp floored to a multiple of 3600 with
+    integer division, which matches ``TruncHour`` in UTC but works directly
+    on the integer ``last_action_timestamp`` column on every backend. Only
+    one user id per hour is returned (via ``Min``), and only for hours with a
+    single active member, since that is the only case the page displays.
+    """
+    hour_bucket = Cast(F('last_action_timestamp') / 3600, IntegerField()) * 3600
+    rows = (
+        UserRecord.objects.filter(
+            current_faction_id__in=faction_ids,
+            last_action_timestamp__gte=int(since.timestamp()),
+        )
+        .annotate(hour_bucket=hour_bucket)
+        .values('current_faction_id', 'hour_bucket')
+        .annotate(
+            active_user_count=Count('user_id', distinct=True),
+            first_user_id=Min('user_id'),
+        )
+        .order_by()
+        .values_list('current_faction_id', 'hour_bucket', 'active_user_count', 'first_user_id')
+    )
+    return [
+        (faction_id, hour_start(bucket), count, [first_user_id] if count == 1 else [])
+        for faction_id, bucket, count, first_user_id in rows
+    ]
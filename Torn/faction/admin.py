@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Faction, FactionList, OrganisedCrimeRole
+from .models import Faction, FactionActivityHour, FactionList, FactionPollState, OrganisedCrimeRole
 
 
 @admin.register(Faction)
@@ -25,6 +25,18 @@ class FactionListAdmin(admin.ModelAdmin):
     list_display = ('faction_id', 'name', 'tag')
     search_fields = ('name', 'tag')
 
+@admin.register(FactionActivityHour)
+class FactionActivityHourAdmin(admin.ModelAdmin):
+    list_display = ('faction', 'hour', 'active_user_count')
+    list_filter = ('faction',)
+    date_hierarchy = 'hour'
+
+@admin.register(FactionPollState)
+class FactionPollStateAdmin(admin.ModelAdmin):
+    list_display = ('faction', 'interval_seconds', 'next_poll_at', 'member_count',
+                    'active_member_count', 'changed_member_count', 'last_polled_at')
+    ordering = ('next_poll_at',)
+
 @admin.register(OrganisedCrimeRole)
 class OrganisedCrimeRoleAdmin(admin.ModelAdmin):
     list_display = ('id', 'level', 'crime_name', 'role', 'required_cpr', 'timestamp')
@@ -0,0 +1,104 @@
+import random
+import time
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from faction.activity import live_hourly_activity, record_activity, rollup_hourly_activity
+from faction.models import FactionList
+from users.models import UserList, UserRecord
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark faction_comparison data paths (Python bucketing, grouped SQL, rollup) '
+        'against a synthetic UserRecord table. All synthetic rows are rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help='Synthetic UserRecord rows (default: 1,000,000)')
+        parser.add_argument('--factions', type=int, default=20, help='Synthetic factions (default: 20)')
+        parser.add_argument('--members', type=int, default=100, help='Members per faction (default: 100)')
+        parser.add_argument('--days', type=int, default=30, help='Days of history to spread rows over (default: 30)')
+        parser.add_argument('--batch-size', type=int, default=10000, help='bulk_create batch size')
+
+    def handle(self, *args, **kwargs):
+        with transaction.atomic():
+            faction_ids = self._populate(**kwargs)
+            self._run(faction_ids[:2])
+            transaction.set_rollback(True)
+        self.stdout.write(self.style.SUCCESS('Synthetic data rolled back.'))
+
+    def _populate(self, rows, factions, members, days, batch_size, **kwargs):
+        # Ids far above real Torn ids so nothing collides before the rollback
+        base_id = 900_000_000
+        faction_ids = [base_id + i for i in range(factions)]
+        FactionList.objects.bulk_create(
+            FactionList(faction_id=faction_id, name=f'Benchmark {faction_id}', tag='BM')
+            for faction_id in faction_ids
+        )
+        users = [
+            (base_id + f * members + m, faction_ids[f])
+            for f in range(factions) for m in range(members)
+        ]
+        UserList.objects.bulk_create(
+            (UserList(user_id=user_id, game_name=f'bench{user_id}') for user_id, _ in users),
+            batch_size=batch_size,
+        )
+
+        now = int(timezone.now().timestamp())
+        span = days * 86400
+        start = time.perf_counter()
+        for offset in range(0, rows, batch_size):
+            batch = []
+            for _ in range(min(batch_size, rows - offset)):
+                user_id, faction_id = random.choice(users)
+                batch.append(UserRecord(
+                    user_id_id=user_id, name='bench', level=1, days_in_faction=1,
+                    last_action_status='Offline', last_action_timestamp=now - random.randrange(span),
+                    last_action_relative='', status_description='Okay', status_state='Okay',
+                    status_color='green', status_until=0, position='Member',
+                    current_faction_id=faction_id,
+                ))
+            UserRecord.objects.bulk_create(batch)
+        self.stdout.write(f'Inserted {rows:,} UserRecord rows in {time.perf_counter() - start:.1f}s')
+
+        record_activity(
+            UserRecord.objects.filter(current_faction_id__in=faction_ids)
+            .values_list('current_faction_id', 'user_id', 'last_action_timestamp')
+            .iterator(chunk_size=batch_size),
+            replace=True,
+        )
+        return faction_ids
+
+    def _run(self, faction_ids):
+        since = timezone.now() - timedelta(days=7)
+        results = [
+            ('python (model instances)', *self._measure(lambda: self._python_bucketing(faction_ids, since))),
+            ('grouped SQL (live)', *self._measure(lambda: live_hourly_activity(faction_ids, since))),
+            ('rollup table', *self._measure(lambda: rollup_hourly_activity(faction_ids, since))),
+        ]
+        self.stdout.write(f'{"path":<28}{"rows transferred":>18}{"latency (ms)":>16}')
+        for name, row_count, elapsed in results:
+            self.stdout.write(f'{name:<28}{row_count:>18,}{elapsed * 1000:>16.1f}')
+
+    def _measure(self, fn):
+        start = time.perf_counter()
+        row_count = fn()
+        if not isinstance(row_count, int):
+            row_count = len(row_count)
+        return row_count, time.perf_counter() - start
+
+    def _python_bucketing(self, faction_ids, since):
+        """The pre-rollup implementation: load every record and bucket in Python."""
+        transferred = 0
+        for faction_id in faction_ids:
+            seen = set()
+            records = UserRecord.objects.filter(
+                current_faction_id=faction_id, last_action_timestamp__gte=since.timestamp()
+            )
+            for record in records:
+                transferred += 1
+                date_hour = datetime.fromtimestamp(record.last_action_timestamp).strftime('%Y-%m-%d %a %H:00')
+                seen.add((date_hour, record.user_id_id))
+        return transferred
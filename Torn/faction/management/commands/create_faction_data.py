@@ -1,7 +1,8 @@
-import requests
 import environ
 from django.core.management.base import BaseCommand
 from faction.models import FactionList
+from Torn.page_cache import FACTION, bump_dataset_version
+from Torn.torn_api import TornAPIError, get_key_pool
 
 # Initialize environment variables
 env = environ.Env()
@@ -14,26 +15,20 @@ class Command(BaseCommand):
     help = 'Fetch faction data from the Torn API and insert factions ranked Platinum II or higher into the database'
 
     def handle(self, *args, **kwargs):
-        base_url = 'https://api.torn.com/v2/torn/factionhof'
-        headers = {
-            'accept': 'application/json',
-            'Authorization': f'ApiKey {API_KEY}'
-        }
+        client = get_key_pool(fallback_key=API_KEY)
         offset = 0
         limit = 100
         all_factions = []
 
         while True:
-            url = f'{base_url}?limit={limit}&offset={offset}&cat=rank'
-            self.stdout.write(self.style.NOTICE(f'Fetching data from {url}'))
-            response = requests.get(url, headers=headers)
-
-            if response.status_code != 200:
-                self.stdout.write(self.style.ERROR(
-                    f'Failed to fetch data. Status code: {response.status_code}'))
+            self.stdout.write(self.style.NOTICE(
+                f'Fetching faction hall of fame (offset {offset}, limit {limit})'))
+            try:
+                data = client.get('v2/torn/factionhof', limit=limit, offset=offset, cat='rank')
+            except TornAPIError as e:
+                self.stdout.write(self.style.ERROR(f'Failed to fetch data: {e}'))
                 break
 
-            data = response.json()
             factions = [
                 faction for faction in data.get('factionhof', [])
                 if faction.get('rank') in ['Platinum II', 'Platinum III'] or 'Diamond' in faction.get('rank', '')
@@ -69,6 +64,7 @@ class Command(BaseCommand):
         # Bulk insert new factions
         if new_factions:
             FactionList.objects.bulk_create(new_factions)
+            bump_dataset_version(FACTION)
             self.stdout.write(self.style.SUCCESS(
                 f'Successfully added {len(new_factions)} new factions to the database.'
             ))
@@ -0,0 +1,46 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from faction.activity import record_activity
+from faction.models import FactionActivityHour
+from users.models import UserRecord
+from Torn.page_cache import FACTION, bump_dataset_version
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the FactionActivityHour rollup from UserRecord history'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=7,
+            help='How many days of history to rebuild (default: 7)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Chunk size for iterating UserRecord rows'
+        )
+
+    def handle(self, *args, **kwargs):
+        cutoff = timezone.now() - timedelta(days=kwargs['days'])
+        cutoff_hour = cutoff.replace(minute=0, second=0, microsecond=0)
+        cutoff_timestamp = int(cutoff_hour.timestamp())
+
+        entries = (
+            UserRecord.objects.filter(last_action_timestamp__gte=cutoff_timestamp)
+            .values_list('current_faction_id', 'user_id', 'last_action_timestamp')
+            .iterator(chunk_size=kwargs['batch_size'])
+        )
+
+        with transaction.atomic():
+            deleted = FactionActivityHour.objects.filter(hour__gte=cutoff_hour).delete()[0]
+            written = record_activity(entries, replace=True)
+        bump_dataset_version(FACTION)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt faction activity since {cutoff_hour}: removed {deleted}, wrote {written} hourly rows'
+        ))
@@ -1,10 +1,9 @@
-import time
-from collections import deque
-import requests
 import environ
 from django.core.management.base import BaseCommand
 from faction.models import FactionList
 from django.db import transaction
+from Torn.page_cache import FACTION, bump_dataset_version
+from Torn.torn_api import TornAPIError, get_key_pool
 
 # Initialize environment variables
 env = environ.Env()
@@ -21,34 +20,18 @@ class Command(BaseCommand):
             'faction_id', flat=True).distinct()
 
         factions_to_update = []
-        call_timestamps = deque()  # Track timestamps of API calls
+        client = get_key_pool(fallback_key=API_KEY)
 
         for faction_id in faction_ids:
-            # Check if we need to delay to respect the rate limit
-            current_time = time.time()
-            while call_timestamps and current_time - call_timestamps[0] > 60:
-                call_timestamps.popleft()  # Remove timestamps older than 60 seconds
-
-            if len(call_timestamps) >= 10:
-                delay = 60 - (current_time - call_timestamps[0])
-                self.stdout.write(self.style.NOTICE(
-                    f'Rate limit reached. Waiting for {delay:.2f} seconds...'))
-                time.sleep(delay)
-                call_timestamps.popleft()
-
-            # Make the API call
-            url = f'https://api.torn.com/faction/{faction_id}?selections=basic&key={API_KEY}'
-            self.stdout.write(self.style.NOTICE(f'Fetching data from {url}'))
-            response = requests.get(url)
-            # Record the timestamp of the API call
-            call_timestamps.append(time.time())
-
-            if response.status_code != 200:
+            # The pool picks the key with the most rate budget left for each call
+            self.stdout.write(self.style.NOTICE(f'Fetching data for faction ID {faction_id}'))
+            try:
+                data = client.get(f'faction/{faction_id}', selections='basic')
+            except TornAPIError as e:
                 self.stdout.write(self.style.ERROR(
-                    f'Failed to fetch data for faction ID {faction_id}. Status code: {response.status_code}'))
+                    f'Failed to fetch data for faction ID {faction_id}: {e}'))
                 continue
 
-            data = response.json()
             self.stdout.write(self.style.NOTICE(
                 f'Response data for faction ID {faction_id}: {data}'))
 
@@ -74,6 +57,7 @@ class Command(BaseCommand):
                 FactionList.objects.bulk_update(
                     factions_to_update, ['name', 'tag', 'rank']
                 )
+            bump_dataset_version(FACTION)
             self.stdout.write(self.style.SUCCESS(
                 f'Successfully updated {len(factions_to_update)} factions in bulk.'
             ))
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.6 on 2026-10-18 03:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('faction', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FactionActivityHour',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('active_user_count', models.IntegerField(default=0)),
+                ('user_ids', models.JSONField(default=list)),
+                ('faction', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='faction.factionlist', to_field='faction_id')),
+            ],
+            options={
+                'ordering': ['-hour'],
+                'unique_together': {('faction', 'hour')},
+            },
+        ),
+    ]
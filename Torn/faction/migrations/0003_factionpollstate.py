@@ -0,0 +1,26 @@
+# Generated by Django 5.1.6 on 2026-10-18 03:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('faction', '0002_factionactivityhour'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FactionPollState',
+            fields=[
+                ('faction', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='faction.factionlist', to_field='faction_id')),
+                ('last_polled_at', models.DateTimeField()),
+                ('next_poll_at', models.DateTimeField(db_index=True)),
+                ('interval_seconds', models.IntegerField()),
+                ('member_count', models.IntegerField(default=0)),
+                ('active_member_count', models.IntegerField(default=0)),
+                ('changed_member_count', models.IntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 03:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('faction', '0003_factionpollstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='factionpollstate',
+            name='error_count',
+            field=models.IntegerField(default=0),
+        ),
+    ]
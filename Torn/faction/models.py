@@ -22,6 +22,47 @@ class Faction(models.Model):
         return self.faction_id.name
 
 
+class FactionActivityHour(models.Model):
+    """
+    Distinct members of a faction whose last action fell in a given hour.
+    Maintained incrementally by update_user_data so faction_comparison can
+    read a small indexed range instead of scanning UserRecord history.
+    """
+    faction = models.ForeignKey(
+        FactionList, on_delete=models.CASCADE, to_field='faction_id'
+    )
+    hour = models.DateTimeField()  # Start of the hour (UTC)
+    active_user_count = models.IntegerField(default=0)
+    user_ids = models.JSONField(default=list)
+
+    class Meta:
+        unique_together = ['faction', 'hour']
+        ordering = ['-hour']
+
+    def __str__(self):
+        return f"{self.faction_id} - {self.hour:%Y-%m-%d %H:00} ({self.active_user_count})"
+
+
+
+class FactionPollState(models.Model):
+    """
+    When update_user_data --due-only should next fetch a faction, derived from
+    how active its members were at the last fetch (see faction/polling.py).
+    """
+    faction = models.OneToOneField(
+        FactionList, on_delete=models.CASCADE, to_field='faction_id', primary_key=True
+    )
+    last_polled_at = models.DateTimeField()  # Last fetch attempt, failed or not
+    next_poll_at = models.DateTimeField(db_index=True)
+    interval_seconds = models.IntegerField()
+    member_count = models.IntegerField(default=0)
+    active_member_count = models.IntegerField(default=0)  # Acted within the activity window
+    changed_member_count = models.IntegerField(default=0)  # Tracked fields changed since their last record
+    error_count = models.IntegerField(default=0)  # Consecutive failed fetches; drives the retry backoff
+
+    def __str__(self):
+        return f"{self.faction_id} - every {self.interval_seconds}s, next {self.next_poll_at:%Y-%m-%d %H:%M}"
+
 class OrganisedCrimeRole(models.Model):
     crime_name = models.CharField(max_length=255)
     level = models.CharField(max_length=50)
@@ -0,0 +1,120 @@
+"""
+Adaptive poll intervals for the update_user_data faction ingest.
+
+After each fetch a faction gets a "heat" from the share of members who acted
+within ``ACTIVE_WINDOW`` seconds and the share whose tracked fields changed
+since their last record. Heat 1 polls every ``FACTION_POLL_MIN_SECONDS``,
+heat 0 every ``FACTION_POLL_MAX_SECONDS``, linearly in between, so a faction
+at war is refreshed every few minutes while a sleeping one is fetched hourly.
+A faction whose fetch fails is retried after ``FACTION_POLL_MIN_SECONDS``,
+doubling with each consecutive failure up to ``FACTION_POLL_MAX_SECONDS``.
+"""
+
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+
+from .models import FactionList, FactionPollState
+
+# Members whose last action is at most this many seconds old count as active
+ACTIVE_WINDOW = 900
+# A faction is due when its next poll falls before the next scheduler tick
+DUE_SLACK = timedelta(seconds=30)
+
+
+def poll_interval(member_count, active_count, changed_count):
+    """Seconds until the next fetch of a faction with these member counts."""
+    shortest, longest = settings.FACTION_POLL_MIN_SECONDS, settings.FACTION_POLL_MAX_SECONDS
+    if not member_count:
+        return longest
+    # Status changes are rarer than activity, so each one weighs more
+    heat = min(1.0, (active_count + 2 * changed_count) / member_count)
+    return round(longest - (longest - shortest) * heat)
+
+
+def error_backoff(error_count):
+    """Seconds until the next fetch of a faction whose last ``error_count`` fetches failed."""
+    shortest, longest = settings.FACTION_POLL_MIN_SECONDS, settings.FACTION_POLL_MAX_SECONDS
+    return min(longest, shortest * 2 ** (error_count - 1))
+
+
+def due_faction_ids(now):
+    """Ids of tracked factions never polled or whose next poll is due."""
+    return set(
+        FactionList.objects.filter(
+            Q(factionpollstate__isnull=True) | Q(factionpollstate__next_poll_at__lte=now + DUE_SLACK)
+        ).values_list('faction_id', flat=True)
+    )
+
+
+def record_polls(faction_ids, fetched_records, changed_records, now):
+    """
+    Reschedule every fetched faction in ``faction_ids``, with or without
+    members. ``fetched_records`` are their members' UserRecords and
+    ``changed_records`` those whose tracked fields changed. Returns the number
+    of factions rescheduled.
+    """
+    active_since = now.timestamp() - ACTIVE_WINDOW
+    members = Counter(record.current_faction_id for record in fetched_records)
+    active = Counter(
+        record.current_faction_id for record in fetched_records
+        if record.last_action_timestamp >= active_since
+    )
+    changed = Counter(record.current_faction_id for record in changed_records)
+
+    states = []
+    for faction_id in faction_ids:
+        interval = poll_interval(members[faction_id], active[faction_id], changed[faction_id])
+        states.append(FactionPollState(
+            faction_id=faction_id,
+            last_polled_at=now,
+            next_poll_at=now + timedelta(seconds=interval),
+            interval_seconds=interval,
+            member_count=members[faction_id],
+            active_member_count=active[faction_id],
+            changed_member_count=changed[faction_id],
+            error_count=0,
+        ))
+    FactionPollState.objects.bulk_create(
+        states,
+        update_conflicts=True,
+        unique_fields=['faction'],
+        update_fields=[
+            'last_polled_at', 'next_poll_at', 'interval_seconds',
+            'member_count', 'active_member_count', 'changed_member_count', 'error_count',
+        ],
+        batch_size=1000,
+    )
+    return len(states)
+
+
+def record_failed_polls(faction_ids, now):
+    """
+    Back off every faction in ``faction_ids`` whose fetch failed, keeping its
+    member counts from the last successful fetch. Returns the number of
+    factions rescheduled.
+    """
+    error_counts = dict(
+        FactionPollState.objects.filter(faction_id__in=faction_ids).values_list('faction_id', 'error_count')
+    )
+    states = []
+    for faction_id in faction_ids:
+        error_count = error_counts.get(faction_id, 0) + 1
+        interval = error_backoff(error_count)
+        states.append(FactionPollState(
+            faction_id=faction_id,
+            last_polled_at=now,
+            next_poll_at=now + timedelta(seconds=interval),
+            interval_seconds=interval,
+            error_count=error_count,
+        ))
+    FactionPollState.objects.bulk_create(
+        states,
+        update_conflicts=True,
+        unique_fields=['faction'],
+        update_fields=['last_polled_at', 'next_poll_at', 'interval_seconds', 'error_count'],
+        batch_size=1000,
+    )
+    return len(states)
@@ -0,0 +1,9 @@
+from celery import shared_task
+from django.core.management import call_command
+from Torn.locks import single_instance
+
+
+@shared_task(acks_late=True, soft_time_limit=600, time_limit=660)
+@single_instance('update_faction_data', lease_seconds=660)
+def update_faction_data_task():
+    call_command('update_faction_data')
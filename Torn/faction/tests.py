@@ -1,3 +1,109 @@
-from django.test import TestCase
+from datetime import timedelta
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from users.models import UserList, UserRecord
+
+from .activity import hour_start, live_hourly_activity, record_activity, rollup_hourly_activity
+from .models import FactionActivityHour, FactionList, FactionPollState
+from .polling import due_faction_ids, error_backoff, poll_interval, record_failed_polls, record_polls
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class FactionActivityRollupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.faction1 = FactionList.objects.create(faction_id=1, name='Alpha', tag='A')
+        self.faction2 = FactionList.objects.create(faction_id=2, name='Bravo', tag='B')
+
+    def test_record_activity_merges_users_into_existing_hours(self):
+        timestamp = 1700000000
+        record_activity([(1, 10, timestamp), (1, 11, timestamp + 60)])
+        record_activity([(1, 11, timestamp + 120), (1, 12, timestamp + 180), (2, 20, timestamp)])
+
+        row = FactionActivityHour.objects.get(faction_id=1, hour=hour_start(timestamp))
+        self.assertEqual(row.active_user_count, 3)
+        self.assertEqual(row.user_ids, [10, 11, 12])
+        self.assertEqual(FactionActivityHour.objects.filter(faction_id=2).count(), 1)
+
+    def test_comparison_reads_rollup(self):
+        timestamp = int((timezone.now() - timedelta(hours=2)).timestamp())
+        record_activity([(1, 10, timestamp), (1, 11, timestamp), (2, 20, timestamp)])
+
+        response = self.client.post(reverse('faction_comparison'), {'faction1': 1, 'faction2': 2})
+
+        date_hour = hour_start(timestamp).strftime('%Y-%m-%d %a %H:00')
+        self.assertEqual(response.context['faction1_data'], {date_hour: 2})
+        self.assertEqual(response.context['faction2_data'], {date_hour: 1})
+        self.assertEqual(response.context['max_delta'], 1)
+
+    def test_live_path_matches_rollup_counts(self):
+        timestamp = int((timezone.now() - timedelta(hours=3)).timestamp())
+        for user_id in (10, 11):
+            UserList.objects.create(user_id=user_id, game_name=f'user{user_id}')
+        entries = [(1, 10, timestamp), (1, 10, timestamp + 1), (1, 11, timestamp), (2, 10, timestamp)]
+        for faction_id, user_id, last_action in entries:
+            UserRecord.objects.create(
+                user_id_id=user_id, name='x', level=1, days_in_faction=1,
+                last_action_status='Offline', last_action_timestamp=last_action,
+                last_action_relative='', status_description='Okay', status_state='Okay',
+                status_color='green', status_until=0, position='Member', current_faction_id=faction_id,
+            )
+        record_activity(entries)
+        since = timezone.now() - timedelta(days=7)
+
+        with self.assertNumQueries(1):
+            live = live_hourly_activity([1, 2], since)
+
+        counts = lambda rows: sorted((f, h, c) for f, h, c, _ in rows)
+        self.assertEqual(counts(live), counts(rollup_hourly_activity([1, 2], since)))
+        self.assertIn((2, hour_start(timestamp), 1, [10]), live)
+
+
+@override_settings(FACTION_POLL_MIN_SECONDS=180, FACTION_POLL_MAX_SECONDS=3600)
+class FactionPollingTests(TestCase):
+    def setUp(self):
+        self.hot = FactionList.objects.create(faction_id=1, name='Hot', tag='H')
+        self.dormant = FactionList.objects.create(faction_id=2, name='Dormant', tag='D')
+        self.now = timezone.now()
+
+    def record(self, faction, minutes_idle):
+        return UserRecord(
+            current_faction_id=faction.faction_id,
+            last_action_timestamp=int(self.now.timestamp()) - minutes_idle * 60,
+        )
+
+    def test_interval_shrinks_with_activity_and_changes(self):
+        self.assertEqual(poll_interval(0, 0, 0), 3600)
+        self.assertEqual(poll_interval(10, 0, 0), 3600)
+        self.assertEqual(poll_interval(10, 10, 0), 180)
+        self.assertEqual(poll_interval(10, 5, 0), 1890)
+        self.assertEqual(poll_interval(10, 0, 5), 180)
+
+    def test_only_due_factions_are_polled(self):
+        self.assertEqual(due_faction_ids(self.now), {1, 2})
+
+        hot_records = [self.record(self.hot, minutes_idle=1) for _ in range(4)]
+        dormant_records = [self.record(self.dormant, minutes_idle=600) for _ in range(4)]
+        self.assertEqual(record_polls([1, 2], hot_records + dormant_records, hot_records[:1], self.now), 2)
+
+        self.assertEqual(FactionPollState.objects.get(faction=self.hot).interval_seconds, 180)
+        self.assertEqual(FactionPollState.objects.get(faction=self.dormant).interval_seconds, 3600)
+        self.assertEqual(due_faction_ids(self.now + timedelta(minutes=3)), {1})
+        self.assertEqual(due_faction_ids(self.now + timedelta(hours=1)), {1, 2})
+
+    def test_failed_polls_back_off_until_a_fetch_succeeds(self):
+        self.assertEqual([error_backoff(count) for count in (1, 2, 3, 10)], [180, 360, 720, 3600])
+
+        record_polls([1], [self.record(self.hot, minutes_idle=1)], [], self.now)
+        for _ in range(3):
+            record_failed_polls([1], self.now)
+        state = FactionPollState.objects.get(faction=self.hot)
+        self.assertEqual((state.error_count, state.interval_seconds, state.member_count), (3, 720, 1))
+
+        record_polls([1], [self.record(self.hot, minutes_idle=1)], [], self.now)
+        state.refresh_from_db()
+        self.assertEqual((state.error_count, state.interval_seconds), (0, 180))
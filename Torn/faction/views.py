@@ -1,13 +1,39 @@
 from django.shortcuts import render
-from django.db.models import Count
+from django.utils import timezone
 from users.models import UserRecord
+from .activity import live_hourly_activity, rollup_hourly_activity
 from .models import FactionList
-from datetime import datetime, timedelta
+from datetime import timedelta
+from Torn.page_cache import FACTION, cached_page_data
 
 
 def faction_comparison(request):
-    factions = FactionList.objects.all().order_by(
-        'name')  # Sort factions alphabetically
+    faction1_id = faction2_id = None
+    if request.method == 'POST':
+        faction1_id = request.POST.get('faction1')
+        faction2_id = request.POST.get('faction2')
+    source = request.GET.get('source')
+
+    # The 7 day window slides every hour, so the hour is part of the key
+    params = {
+        'faction1': faction1_id, 'faction2': faction2_id, 'source': source,
+        'hour': timezone.now().replace(minute=0, second=0, microsecond=0),
+    }
+    context = cached_page_data(
+        'faction_comparison', params, [FACTION],
+        lambda: _faction_comparison_context(faction1_id, faction2_id, source),
+    )
+    # Choose template based on URL name
+    if request.resolver_match and request.resolver_match.url_name == 'faction_comparison_graph':
+        template = 'faction/comparison_graph.html'
+    else:
+        template = 'faction/faction_comparison.html'
+    return render(request, template, context)
+
+
+def _faction_comparison_context(faction1_id, faction2_id, source):
+    factions = list(FactionList.objects.all().order_by(
+        'name'))  # Sort factions alphabetically
     default_faction1 = None
     default_faction2 = None
 
@@ -23,10 +49,8 @@ def faction_comparison(request):
         if war_faction and hasattr(war_faction, 'at_war_with'):
             default_faction2 = war_faction.at_war_with.faction_id
 
-    # Calculate the timestamp for 7 days ago
-    now = datetime.now()
-    seven_days_ago = now - timedelta(days=7)
-    seven_days_ago_timestamp = seven_days_ago.timestamp()
+    # Calculate the start of the 7 day window
+    seven_days_ago = timezone.now() - timedelta(days=7)
 
     faction1_data = {}
     faction2_data = {}
@@ -37,64 +61,45 @@ def faction_comparison(request):
     max_value = 0
     max_delta = 0  # Initialize max_delta
 
-    if request.method == 'POST':
-        faction1_id = request.POST.get('faction1')
-        faction2_id = request.POST.get('faction2')
-
-        if faction1_id and faction2_id:
-            faction1_name = FactionList.objects.get(
-                faction_id=faction1_id).name
-            faction2_name = FactionList.objects.get(
-                faction_id=faction2_id).name
-
-            # Filter records for the last 7 days
-            faction1_records = UserRecord.objects.filter(
-                current_faction_id=faction1_id, last_action_timestamp__gte=seven_days_ago_timestamp)
-            faction2_records = UserRecord.objects.filter(
-                current_faction_id=faction2_id, last_action_timestamp__gte=seven_days_ago_timestamp)
-
-            faction1_seen = set()
-            faction2_seen = set()
+    if faction1_id and faction2_id:
+        faction1_name = FactionList.objects.get(
+            faction_id=faction1_id).name
+        faction2_name = FactionList.objects.get(
+            faction_id=faction2_id).name
 
-            for record in faction1_records:
-                date_hour = datetime.fromtimestamp(
-                    record.last_action_timestamp).strftime('%Y-%m-%d %a %H:00')
-                if (date_hour, record.user_id_id) not in faction1_seen:
-                    faction1_seen.add((date_hour, record.user_id_id))
-                    if date_hour in faction1_data:
-                        faction1_data[date_hour] += 1
-                        faction1_users[date_hour].append(record.user_id_id)
-                    else:
-                        faction1_data[date_hour] = 1
-                        faction1_users[date_hour] = [record.user_id_id]
-                    max_value = max(max_value, faction1_data[date_hour])
+        # Read the precomputed hourly rollup for both factions in one range query,
+        # falling back to grouping UserRecord in the database when the rollup is
+        # empty (or ?source=live is requested)
+        faction_ids = [faction1_id, faction2_id]
+        activity = None
+        if source != 'live':
+            activity = rollup_hourly_activity(faction_ids, seven_days_ago)
+        if not activity:
+            activity = live_hourly_activity(faction_ids, seven_days_ago)
 
-            for record in faction2_records:
-                date_hour = datetime.fromtimestamp(
-                    record.last_action_timestamp).strftime('%Y-%m-%d %a %H:00')
-                if (date_hour, record.user_id_id) not in faction2_seen:
-                    faction2_seen.add((date_hour, record.user_id_id))
-                    if date_hour in faction2_data:
-                        faction2_data[date_hour] += 1
-                        faction2_users[date_hour].append(record.user_id_id)
-                    else:
-                        faction2_data[date_hour] = 1
-                        faction2_users[date_hour] = [record.user_id_id]
-                    max_value = max(max_value, faction2_data[date_hour])
+        for faction_id, hour, active_user_count, user_ids in activity:
+            date_hour = hour.strftime('%Y-%m-%d %a %H:00')
+            if str(faction_id) == str(faction1_id):
+                faction1_data[date_hour] = active_user_count
+                faction1_users[date_hour] = user_ids
+            if str(faction_id) == str(faction2_id):
+                faction2_data[date_hour] = active_user_count
+                faction2_users[date_hour] = user_ids
+            max_value = max(max_value, active_user_count)
 
-            # Calculate max_delta
-            all_date_hours = sorted(set(faction1_data.keys()).union(
-                set(faction2_data.keys())), reverse=True)
-            for date_hour in all_date_hours:
-                faction1_count = faction1_data.get(date_hour, 0)
-                faction2_count = faction2_data.get(date_hour, 0)
-                max_delta = max(max_delta, abs(
-                    faction1_count - faction2_count))
+        # Calculate max_delta
+        all_date_hours = sorted(set(faction1_data.keys()).union(
+            set(faction2_data.keys())), reverse=True)
+        for date_hour in all_date_hours:
+            faction1_count = faction1_data.get(date_hour, 0)
+            faction2_count = faction2_data.get(date_hour, 0)
+            max_delta = max(max_delta, abs(
+                faction1_count - faction2_count))
 
-            print("Faction 1 Data:", faction1_data)
-            print("Faction 2 Data:", faction2_data)
-            print("Date Hours:", all_date_hours)
-            print("Max Delta:", max_delta)
+        print("Faction 1 Data:", faction1_data)
+        print("Faction 2 Data:", faction2_data)
+        print("Date Hours:", all_date_hours)
+        print("Max Delta:", max_delta)
 
     context = {
         'factions': factions,
@@ -110,9 +115,4 @@ def faction_comparison(request):
         'max_delta': max_delta,  # Add max_delta to the context
         'date_hours': sorted(set(faction1_data.keys()).union(set(faction2_data.keys())), reverse=True),
     }
-    # Choose template based on URL name
-    if request.resolver_match and request.resolver_match.url_name == 'faction_comparison_graph':
-        template = 'faction/comparison_graph.html'
-    else:
-        template = 'faction/faction_comparison.html'
-    return render(request, template, context)
+    return context
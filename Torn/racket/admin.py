@@ -1,11 +1,16 @@
 from django.contrib import admin
-from .models import Racket, Territory  # Import Territory model
+from .models import CurrentRacket, Racket, Territory  # Import Territory model
 
 @admin.register(Racket)
 class RacketAdmin(admin.ModelAdmin):
-    list_display = ('territory', 'name', 'level', 'reward', 'created', 'changed', 'faction', 'timestamp')
+    list_display = ('territory', 'name', 'level', 'reward', 'created', 'changed', 'faction', 'removed', 'timestamp')
     search_fields = ('territory', 'name', 'faction')
-    list_filter = ('level', 'faction')
+    list_filter = ('level', 'faction', 'removed')
+
+@admin.register(CurrentRacket)
+class CurrentRacketAdmin(admin.ModelAdmin):
+    list_display = ('territory', 'name', 'level', 'reward', 'changed', 'faction', 'updated_on')
+    search_fields = ('territory__code', 'name', 'faction')
 
 @admin.register(Territory)  # Register Territory model
 class TerritoryAdmin(admin.ModelAdmin):
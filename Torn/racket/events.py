@@ -0,0 +1,116 @@
+"""
+In-process fan-out of racket changes for the server-sent events feed.
+
+fetch_rackets only inserts a Racket row when a territory's racket changed or
+disappeared (a ``removed`` tombstone), so every new row is an event. One ``RacketBroadcaster`` per process polls for rows
+newer than the last one it saw and hands each event to every connected
+viewer's queue, so N open feeds cost one query per poll instead of N.
+The feed needs an ASGI server; under WSGI a streaming async response is
+buffered in full and never reaches the browser.
+"""
+
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Max, OuterRef, Subquery
+
+from .models import Racket
+
+# Events queued per viewer before further events are dropped for that viewer
+SUBSCRIBER_QUEUE_SIZE = 100
+# Rows replayed to a reconnecting viewer that sent Last-Event-ID
+REPLAY_LIMIT = 100
+
+
+def racket_events_after(last_id, limit=None):
+    """Racket rows with a pk above ``last_id`` as event dicts, with the territory's previous state."""
+    previous = Racket.objects.filter(
+        territory_id=OuterRef('territory_id'), pk__lt=OuterRef('pk')
+    ).order_by('-pk')
+    rows = (
+        Racket.objects.filter(pk__gt=last_id)
+        .annotate(
+            previous_faction=Subquery(previous.values('faction')[:1]),
+            previous_level=Subquery(previous.values('level')[:1]),
+        )
+        .order_by('pk')
+        .values(
+            'pk', 'territory_id', 'name', 'level', 'reward', 'faction', 'changed', 'removed',
+            'previous_faction', 'previous_level',
+        )
+    )
+    if limit:
+        rows = rows[:limit]
+    return [
+        {
+            'id': row['pk'],
+            'territory': row['territory_id'],
+            'name': row['name'],
+            'level': row['level'],
+            'reward': row['reward'],
+            'faction': row['faction'],
+            'changed': row['changed'].isoformat(),
+            'previous_faction': row['previous_faction'],
+            'previous_level': row['previous_level'],
+            'removed': row['removed'],
+            'ownership_changed': row['previous_faction'] is not None and row['previous_faction'] != row['faction'],
+        }
+        for row in rows
+    ]
+
+
+def latest_racket_id():
+    return Racket.objects.aggregate(last=Max('pk'))['last'] or 0
+
+
+def format_event(event):
+    """Serialize one event in the text/event-stream format."""
+    return f"id: {event['id']}\nevent: racket\ndata: {json.dumps(event)}\n\n"
+
+
+class RacketBroadcaster:
+    """Polls for new Racket rows while at least one viewer is subscribed."""
+
+    def __init__(self, poll_interval=None):
+        self.poll_interval = poll_interval or settings.RACKET_EVENTS_POLL_SECONDS
+        self._subscribers = set()
+        self._task = None
+        self._loop = None
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # A new event loop (e.g. a server reload) cannot reuse the old task
+            self._subscribers = set()
+            self._task = None
+            self._loop = loop
+        self._subscribers.add(queue)
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._run())
+        return queue
+
+    def unsubscribe(self, queue):
+        self._subscribers.discard(queue)
+
+    def publish(self, events):
+        for queue in list(self._subscribers):
+            for event in events:
+                try:
+                    queue.put_nowait(event)
+                except asyncio.QueueFull:
+                    break  # Slow viewer: it misses these events and can reconnect with Last-Event-ID
+
+    async def _run(self):
+        last_id = await sync_to_async(latest_racket_id)()
+        while self._subscribers:
+            await asyncio.sleep(self.poll_interval)
+            events = await sync_to_async(racket_events_after)(last_id)
+            if events:
+                last_id = events[-1]['id']
+                self.publish(events)
+
+
+broadcaster = RacketBroadcaster()
@@ -1,7 +1,9 @@
-import requests
 import environ
 from django.core.management.base import BaseCommand
-from racket.models import Racket, Territory
+from django.db import transaction
+from racket.models import CurrentRacket, Racket, Territory
+from Torn.page_cache import RACKET, bump_dataset_version
+from Torn.torn_api import get_key_pool
 from datetime import datetime
 from django.utils import timezone
 
@@ -12,30 +14,68 @@ environ.Env.read_env('/media/michael/HDD/torn/.env')  # Explicitly load the .env
 # env = environ.Env()
 API_KEY = env('API_KEY')
 
+# Fields whose change makes a new Racket row; anything else is the same racket state
+TRACKED_FIELDS = ['changed', 'faction', 'level', 'reward']
+# Racket fields copied into CurrentRacket
+CURRENT_FIELDS = ['territory_id', 'name', 'level', 'reward', 'created', 'changed', 'faction']
+
+
 class Command(BaseCommand):
-    help = 'Fetch rackets data from the API and populate the Racket model'
+    help = 'Fetch rackets data from the API and record the rackets that changed or disappeared since the last fetch'
 
     def handle(self, *args, **kwargs):
-        url = f'https://api.torn.com/torn/?selections=rackets&key={API_KEY}&comment=FetchRackets'
-        response = requests.get(url)
-        data = response.json()
-
-        for code, item in data['rackets'].items():
-            created = timezone.make_aware(datetime.fromtimestamp(item['created']))
-            changed = timezone.make_aware(datetime.fromtimestamp(item['changed']))
-            territory, _ = Territory.objects.get_or_create(
-                code=code,
-                defaults={'name': item['name']}  # Use name field
-            )
-            Racket.objects.create(
-                territory=territory,
+        data = get_key_pool(fallback_key=API_KEY).get('torn/', selections='rackets', comment='FetchRackets')
+        rackets = data['rackets']
+
+        Territory.objects.bulk_create(
+            [Territory(code=code, name=item['name']) for code, item in rackets.items()],
+            ignore_conflicts=True,
+        )
+        current = CurrentRacket.objects.in_bulk()
+
+        changed = []
+        for code, item in rackets.items():
+            racket = Racket(
+                territory_id=code,
                 name=item['name'],
                 level=item['level'],
                 reward=item['reward'],
-                created=created,
-                changed=changed,
-                faction=item['faction'],
+                created=timezone.make_aware(datetime.fromtimestamp(item['created'])),
+                changed=timezone.make_aware(datetime.fromtimestamp(item['changed'])),
+                faction=str(item['faction']),  # CharField; the API sends a faction id
+            )
+            previous = current.get(code)
+            if previous is None or any(getattr(previous, f) != getattr(racket, f) for f in TRACKED_FIELDS):
+                changed.append(racket)
+
+        # Rackets that are no longer in the API: keep a tombstone in the history
+        removed = [
+            Racket(
+                territory_id=code, name=previous.name, level=previous.level, reward=previous.reward,
+                created=previous.created, changed=previous.changed, faction=previous.faction, removed=True,
             )
+            for code, previous in current.items() if code not in rackets
+        ]
+
+        if changed or removed:
+            with transaction.atomic():
+                Racket.objects.bulk_create(changed + removed)
+                if changed:
+                    CurrentRacket.objects.bulk_create(
+                        [
+                            CurrentRacket(**{field: getattr(racket, field) for field in CURRENT_FIELDS})
+                            for racket in changed
+                        ],
+                        update_conflicts=True,
+                        unique_fields=['territory'],
+                        update_fields=[field for field in CURRENT_FIELDS if field != 'territory_id'] + ['updated_on'],
+                    )
+                if removed:
+                    CurrentRacket.objects.filter(pk__in=[racket.territory_id for racket in removed]).delete()
+            bump_dataset_version(RACKET)
 
         timestamp = timezone.now().strftime('%Y-%m-%d %H:%M:%S')
-        self.stdout.write(self.style.SUCCESS(f'Successfully fetched and populated Racket data at {timestamp}'))
\ No newline at end of file
+        self.stdout.write(self.style.SUCCESS(
+            f'Fetched {len(rackets)} rackets at {timestamp}; recorded {len(changed)} change(s) '
+            f'and {len(removed)} removal(s)'
+        ))
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.6 on 2026-10-18 03:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('racket', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='racket',
+            index=models.Index(fields=['territory', '-timestamp'], name='racket_rack_territo_a1c222_idx'),
+        ),
+    ]
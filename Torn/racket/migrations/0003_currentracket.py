@@ -0,0 +1,51 @@
+# Generated by Django 5.1.6 on 2026-10-18 03:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def seed_current_rackets(apps, schema_editor):
+    """Start from the newest row per territory; the next fetch removes rackets that are gone."""
+    Racket = apps.get_model('racket', 'Racket')
+    CurrentRacket = apps.get_model('racket', 'CurrentRacket')
+    latest_ids = Racket.objects.values('territory_id').annotate(latest_id=Max('id')).values('latest_id')
+    CurrentRacket.objects.bulk_create(
+        [
+            CurrentRacket(
+                territory_id=racket.territory_id, name=racket.name, level=racket.level, reward=racket.reward,
+                created=racket.created, changed=racket.changed, faction=racket.faction,
+            )
+            for racket in Racket.objects.filter(id__in=latest_ids)
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('racket', '0002_racket_territory_timestamp_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CurrentRacket',
+            fields=[
+                ('territory', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='racket.territory', to_field='code')),
+                ('name', models.CharField(max_length=100)),
+                ('level', models.IntegerField()),
+                ('reward', models.CharField(max_length=100)),
+                ('created', models.DateTimeField()),
+                ('changed', models.DateTimeField()),
+                ('faction', models.CharField(max_length=100)),
+                ('updated_on', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='racket',
+            name='removed',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(seed_current_rackets, migrations.RunPython.noop),
+    ]
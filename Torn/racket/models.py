@@ -10,6 +10,10 @@ class Territory(models.Model):
 
 
 class Racket(models.Model):
+    """
+    History of racket states: fetch_rackets adds a row whenever a territory's
+    racket changes, and a ``removed`` tombstone when it disappears.
+    """
     territory = models.ForeignKey(Territory, to_field='code', on_delete=models.CASCADE)  # Link to territory.code
     name = models.CharField(max_length=100)
     level = models.IntegerField()
@@ -17,7 +21,31 @@ class Racket(models.Model):
     created = models.DateTimeField()
     changed = models.DateTimeField()
     faction = models.CharField(max_length=100)
+    removed = models.BooleanField(default=False)  # Tombstone: the racket left this territory
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['territory', '-timestamp']),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class CurrentRacket(models.Model):
+    """
+    The racket each territory has right now. fetch_rackets upserts a row when
+    the racket changes and deletes it when the racket disappears.
+    """
+    territory = models.OneToOneField(Territory, to_field='code', on_delete=models.CASCADE, primary_key=True)
+    name = models.CharField(max_length=100)
+    level = models.IntegerField()
+    reward = models.CharField(max_length=100)
+    created = models.DateTimeField()
+    changed = models.DateTimeField()
+    faction = models.CharField(max_length=100)
+    updated_on = models.DateTimeField(auto_now=True)
+
     def __str__(self):
         return self.name
@@ -1,6 +1,9 @@
 from celery import shared_task
 from django.core.management import call_command
+from Torn.locks import single_instance
 
-@shared_task
+# Runs every minute: give up before the next beat tick queues another run
+@shared_task(acks_late=True, soft_time_limit=50, time_limit=55)
+@single_instance('fetch_rackets', lease_seconds=55)
 def fetch_rackets_task():
-    call_command('fetch_rackets')
\ No newline at end of file
+    call_command('fetch_rackets')
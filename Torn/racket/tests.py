@@ -1,3 +1,136 @@
-from django.test import TestCase
+import asyncio
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .events import RacketBroadcaster, racket_events_after
+from .models import CurrentRacket, Racket, Territory
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class RacketsListTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_lists_current_rackets_in_one_query(self):
+        now = timezone.now()
+        for index, code in enumerate(('AB1', 'CD2', 'EF3')):
+            territory = Territory.objects.create(code=code, name=f'Territory {code}')
+            CurrentRacket.objects.create(
+                territory=territory, name=f'{code} racket', level=index + 1, reward='Cash',
+                created=now, changed=now - timedelta(hours=3 - index), faction='Faction',
+            )
+        # History alone does not make a racket current
+        Racket.objects.create(
+            territory=Territory.objects.create(code='GH4', name='Territory GH4'), name='Gone', level=1,
+            reward='Cash', created=now, changed=now, faction='Faction',
+        )
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('rackets_list'))
+
+        rackets = [item['racket'] for item in response.context['rackets']]
+        self.assertEqual([racket.territory.code for racket in rackets], ['EF3', 'CD2', 'AB1'])
+
+
+def racket_payload(level=1, faction=1000, changed=1700000000):
+    return {
+        'name': 'Cash Cow', 'level': level, 'reward': '$1,000,000 daily',
+        'created': 1690000000, 'changed': changed, 'faction': faction,
+    }
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class FetchRacketsTests(TestCase):
+    def fetch(self, rackets):
+        client = mock.Mock()
+        client.get.return_value = {'rackets': rackets}
+        with mock.patch('racket.management.commands.fetch_rackets.get_key_pool', return_value=client):
+            call_command('fetch_rackets', stdout=StringIO())
+
+    def test_only_changed_rackets_are_recorded(self):
+        rackets = {'AB1': racket_payload(), 'CD2': racket_payload(faction=2000)}
+        self.fetch(rackets)
+        self.fetch(rackets)
+        self.assertEqual(Racket.objects.count(), 2)
+        self.assertEqual(Territory.objects.count(), 2)
+
+        rackets['AB1'] = racket_payload(level=2, changed=1700003600)
+        # territories, current rackets, then in a savepoint: history insert, current upsert
+        with self.assertNumQueries(6):
+            self.fetch(rackets)
+        self.assertEqual(Racket.objects.count(), 3)
+        self.assertEqual(Racket.objects.filter(territory_id='AB1').latest('pk').level, 2)
+        self.assertEqual(CurrentRacket.objects.get(pk='AB1').level, 2)
+
+    def test_disappeared_racket_is_tombstoned_and_no_longer_current(self):
+        self.fetch({'AB1': racket_payload(), 'CD2': racket_payload(faction=2000)})
+        self.fetch({'AB1': racket_payload()})
+
+        self.assertEqual(list(CurrentRacket.objects.values_list('pk', flat=True)), ['AB1'])
+        tombstone = Racket.objects.filter(territory_id='CD2').latest('pk')
+        self.assertTrue(tombstone.removed)
+        self.assertEqual(tombstone.faction, '2000')
+
+        # Still gone on the next fetch: nothing more is recorded
+        self.fetch({'AB1': racket_payload()})
+        self.assertEqual(Racket.objects.count(), 3)
+
+
+class RacketEventsTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        self.territory = Territory.objects.create(code='AB1', name='Cash Cow')
+        self.first = Racket.objects.create(
+            territory=self.territory, name='Cash Cow', level=1, reward='Cash', created=now, changed=now, faction='1000'
+        )
+        self.second = Racket.objects.create(
+            territory=self.territory, name='Cash Cow', level=2, reward='Cash', created=now, changed=now, faction='2000'
+        )
+
+    def test_events_carry_previous_state(self):
+        first, second = racket_events_after(0)
+        self.assertIsNone(first['previous_faction'])
+        self.assertFalse(first['ownership_changed'])
+        self.assertEqual((second['previous_faction'], second['previous_level']), ('1000', 1))
+        self.assertTrue(second['ownership_changed'])
+        self.assertEqual(racket_events_after(self.second.pk), [])
+
+    def test_broadcaster_fans_out_one_poll_to_every_viewer(self):
+        async def scenario():
+            broadcaster = RacketBroadcaster(poll_interval=60)
+            viewers = [broadcaster.subscribe() for _ in range(3)]
+            broadcaster._task.cancel()
+            broadcaster.publish([{'id': 1}, {'id': 2}])
+            return [[queue.get_nowait()['id'] for _ in range(queue.qsize())] for queue in viewers]
+
+        self.assertEqual(asyncio.run(scenario()), [[1, 2]] * 3)
+
+    def test_feed_is_off_by_default_and_the_page_reloads_instead(self):
+        self.assertEqual(self.client.get(reverse('racket_events')).status_code, 404)
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            page = self.client.get(reverse('rackets_list')).content.decode()
+        self.assertNotIn('EventSource(', page)
+        self.assertIn('window.location.reload()', page)
+
+    @override_settings(RACKET_EVENTS_ENABLED=True)
+    async def test_stream_replays_events_after_last_event_id(self):
+        broadcaster = RacketBroadcaster(poll_interval=60)
+        with mock.patch('racket.views.broadcaster', broadcaster):
+            response = await self.async_client.get(
+                reverse('racket_events'), headers={'Last-Event-ID': str(self.first.pk)}
+            )
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            stream = aiter(response.streaming_content)
+            self.assertEqual(await anext(stream), b'retry: 5000\n\n')
+            event = (await anext(stream)).decode()
+            await stream.aclose()
+            broadcaster._task.cancel()
+
+        self.assertTrue(event.startswith(f'id: {self.second.pk}\nevent: racket\n'))
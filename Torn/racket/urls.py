@@ -3,5 +3,6 @@ from . import views
 
 urlpatterns = [
     # path('rackets/', views.rackets_list, name='rackets_list'),
-    path('', views.rackets_list, name='rackets_list')
+    path('', views.rackets_list, name='rackets_list'),
+    path('events', views.racket_events, name='racket_events'),
 ]
@@ -1,24 +1,65 @@
+import asyncio
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import render
-from .models import Racket, Territory
+from .events import REPLAY_LIMIT, broadcaster, format_event, racket_events_after
+from .models import CurrentRacket
 from datetime import datetime
+from Torn.page_cache import RACKET, cached_page_data
 
 def rackets_list(request):
-    rackets_data = []
-    seen_territory_codes = set()  # Keep track of territory codes we've seen
-    max_records = 25
-    record_count = 0
+    rackets = cached_page_data('rackets_list', {}, [RACKET], _latest_rackets)
+    rackets_data = [
+        {
+            'racket': racket,
+            'timestamp': datetime.now()
+        }
+        for racket in rackets
+    ]
 
-    for racket in Racket.objects.all().order_by('-timestamp'): # Order by timestamp descending
-        if record_count >= max_records:
-            break  # Stop if we've reached the maximum number of records
+    print("rackets_data:", rackets_data)  # Keep this for debugging
+    return render(request, 'racket/racket.html', {
+        'rackets': rackets_data,
+        'events_enabled': settings.RACKET_EVENTS_ENABLED,
+        'refresh_seconds': settings.RACKET_PAGE_REFRESH_SECONDS,
+    })
 
-        if racket.territory.code not in seen_territory_codes:
-            rackets_data.append({
-                'racket': racket,
-                'timestamp': datetime.now()
-            })
-            seen_territory_codes.add(racket.territory.code)
-            record_count += 1
+def _latest_rackets():
+    # The 25 most recently changed rackets that exist now
+    return list(CurrentRacket.objects.select_related('territory').order_by('-changed', 'territory_id')[:25])
 
-    print("rackets_data:", rackets_data)  # Keep this for debugging
-    return render(request, 'racket/racket.html', {'rackets': rackets_data})
+# Seconds between comment lines that keep idle proxies from closing the feed
+KEEPALIVE_SECONDS = 15
+
+async def racket_events(request):
+    """Server-sent events feed of racket changes as fetch_rackets records them."""
+    # Off unless served by an ASGI server; see RACKET_EVENTS_ENABLED
+    if not settings.RACKET_EVENTS_ENABLED:
+        raise Http404('Racket events are not enabled')
+    last_event_id = request.headers.get('Last-Event-ID')
+    response = StreamingHttpResponse(_event_stream(last_event_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Stop nginx from buffering the stream
+    return response
+
+async def _event_stream(last_event_id):
+    queue = broadcaster.subscribe()
+    try:
+        yield 'retry: 5000\n\n'
+        # A reconnecting browser sends the last id it saw; send what it missed
+        sent_id = 0
+        if last_event_id and last_event_id.isdigit():
+            for event in await sync_to_async(racket_events_after)(int(last_event_id), REPLAY_LIMIT):
+                sent_id = event['id']
+                yield format_event(event)
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            if event['id'] > sent_id:
+                yield format_event(event)
+    finally:
+        broadcaster.unsubscribe(queue)
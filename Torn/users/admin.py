@@ -2,8 +2,10 @@ from django.contrib import admin
 from .models import (
     UserList,
     UserRecord,
+    UserLastSeen,
     UserOrganisedCrimeCPR,
-    TornUserProfile
+    TornUserProfile,
+    InstanceLock
 )
 
 class UserListAdmin(admin.ModelAdmin):
@@ -13,6 +15,10 @@ class UserRecordAdmin(admin.ModelAdmin):
     list_display = ('user_id', 'name', 'level', 'current_faction', 'days_in_faction', 'created_on')
     list_filter = ('current_faction', 'user_id')
 
+class UserLastSeenAdmin(admin.ModelAdmin):
+    list_display = ('user', 'current_faction', 'last_action_status', 'last_action_relative', 'updated_on')
+    list_filter = ('current_faction', 'last_action_status')
+
 class UserOrganisedCrimeCPRAdmin(admin.ModelAdmin):
     list_display = ('user', 'organised_crime_role', 'user_cpr')
     list_filter = ('organised_crime_role',)
@@ -25,8 +31,14 @@ class TornUserProfileAdmin(admin.ModelAdmin):
     readonly_fields = ('created_at', 'updated_at')
 
 
+class InstanceLockAdmin(admin.ModelAdmin):
+    list_display = ('name', 'owner', 'acquired_at', 'expires_at')
+
+
 admin.site.register(UserList, UserListAdmin)
 admin.site.register(UserRecord, UserRecordAdmin)
+admin.site.register(UserLastSeen, UserLastSeenAdmin)
 admin.site.register(UserOrganisedCrimeCPR, UserOrganisedCrimeCPRAdmin)
 admin.site.register(TornUserProfile, TornUserProfileAdmin)
+admin.site.register(InstanceLock, InstanceLockAdmin)
 # Register your models here.
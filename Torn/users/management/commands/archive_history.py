@@ -0,0 +1,92 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from Torn.archive import (
+    ARCHIVE_TABLES, FORMATS, archive_columns, day_start, default_format, table_model, write_partition,
+)
+from Torn.page_cache import COMPANY, FACTION, bump_dataset_version
+
+# Page cache datasets that read each archivable table
+TABLE_DATASETS = {
+    'userrecord': FACTION,
+    'employee': COMPANY,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Export UserRecord and Employee rows older than N days to date-partitioned columnar "
+        "files under HISTORY_ARCHIVE_DIR, then delete them from the database"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=180,
+            help="Rows created more than this many days ago are archived (default: 180)"
+        )
+        parser.add_argument(
+            "--table",
+            choices=sorted(ARCHIVE_TABLES),
+            action="append",
+            dest="tables",
+            help="Table to archive (may be repeated; default: all)"
+        )
+        parser.add_argument(
+            "--format",
+            choices=FORMATS,
+            default=None,
+            help="File format (default: parquet when pyarrow is installed, else npz)"
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Rows exported and deleted per step"
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report what would be archived without writing or deleting anything"
+        )
+
+    def handle(self, *args, **options):
+        cutoff = day_start(timezone.localdate() - timedelta(days=options["days"]))
+        file_format = options["format"] or default_format()
+        verb = "Would archive" if options["dry_run"] else "Archived"
+
+        for table in options["tables"] or sorted(ARCHIVE_TABLES):
+            archived = self._archive_table(table, cutoff, file_format, options["batch_size"], options["dry_run"])
+            if archived and not options["dry_run"]:
+                bump_dataset_version(TABLE_DATASETS[table])
+            self.stdout.write(self.style.SUCCESS(f"{verb} {archived} {table} row(s) created before {cutoff.date()}"))
+
+    def _archive_table(self, table, cutoff, file_format, batch_size, dry_run):
+        """Walk ``table`` in pk order, writing each batch before deleting it; return the number of rows archived."""
+        model = table_model(table)
+        time_field = ARCHIVE_TABLES[table][1]
+        columns = archive_columns(table)
+        old_rows = model.objects.filter(**{f"{time_field}__lt": cutoff}).order_by("pk")
+
+        archived = 0
+        last_pk = 0
+        while True:
+            rows = list(old_rows.filter(pk__gt=last_pk).values(*columns)[:batch_size])
+            if not rows:
+                return archived
+
+            by_day = {}
+            for row in rows:
+                by_day.setdefault(timezone.localdate(row[time_field]), []).append(row)
+            if not dry_run:
+                for day, day_rows in by_day.items():
+                    write_partition(table, day, day_rows, file_format)
+                # The pk range holds exactly this batch: ids only grow and newer rows are past the cutoff
+                old_rows.filter(pk__gte=rows[0]["id"], pk__lte=rows[-1]["id"]).delete()
+
+            archived += len(rows)
+            last_pk = rows[-1]["id"]
+            self.stdout.write(f"{table}: {archived} row(s) up to {max(by_day)}")
+            if len(rows) < batch_size:
+                return archived
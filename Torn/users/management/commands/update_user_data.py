@@ -1,22 +1,18 @@
-import requests
+import contextlib
 import environ
 import time
-import os
-import sys
-import signal
-import tempfile
-import platform
-from collections import deque
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from faction.activity import record_activity
+from django.utils import timezone
 from faction.models import Faction, FactionList
-from users.models import UserList, UserRecord
-
-# Try to import fcntl for Unix systems, handle gracefully if not available
-try:
-    import fcntl
-    HAS_FCNTL = True
-except ImportError:
-    HAS_FCNTL = False
+from faction.polling import due_faction_ids, record_failed_polls, record_polls
+from users.models import UserList, UserLastSeen, UserRecord
+from users.sharding import parse_shard, shard_api_key, shard_faction_ids
+from Torn.locks import AlreadyRunning, single_instance
+from Torn.page_cache import FACTION, bump_dataset_version
+from Torn.torn_api import TornAPIError, get_client, get_key_pool
 
 # Initialize environment variables
 env = environ.Env()
@@ -24,6 +20,25 @@ environ.Env.read_env()
 
 API_KEY = env('API_KEY')
 
+# Factions fetched before their rows and poll schedule are written; a run
+# stopped early keeps every full batch
+WRITE_BATCH_FACTIONS = 25
+
+# UserRecord fields that count as a change, compared with the state kept in
+# UserLastSeen. In --delta mode only a change stores a new row; last action
+# changes only refresh the UserLastSeen heartbeat
+TRACKED_FIELDS = (
+    'name',
+    'level',
+    'status_description',
+    'status_details',
+    'status_state',
+    'status_color',
+    'status_until',
+    'position',
+    'current_faction_id',
+)
+
 
 class Command(BaseCommand):
     help = 'Fetch faction data from the Torn API and add a new record for each unique faction ID'
@@ -34,146 +49,67 @@ class Command(BaseCommand):
             action='store_true',
             help='Force execution even if another instance is running (bypass lock)',
         )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=1,
+            help='Number of faction requests to keep in flight (values above 1 use the async fetcher)',
+        )
+        parser.add_argument(
+            '--delta',
+            action='store_true',
+            help='Only store a UserRecord when a tracked field changed; activity goes to UserLastSeen',
+        )
+        parser.add_argument(
+            '--due-only',
+            action='store_true',
+            help='Only fetch factions whose adaptive poll interval has elapsed (see faction/polling.py)',
+        )
+        parser.add_argument(
+            '--shard',
+            type=parse_shard,
+            default=None,
+            metavar='I/N',
+            help='Only fetch factions whose id is I modulo N, with the Ith active profile API key',
+        )
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.lock_file = None
-        
-        # Use platform-appropriate temp directory and file name
-        if platform.system() == 'Windows':
-            # On Windows, use the user's temp directory
-            temp_dir = tempfile.gettempdir()
-            self.pid_file_path = os.path.join(temp_dir, 'update_user_data.pid')
-        else:
-            # On Unix-like systems, use /tmp
-            self.pid_file_path = '/tmp/update_user_data.pid'
-        
-        # Register signal handlers for graceful cleanup
-        signal.signal(signal.SIGINT, self._signal_handler)
-        
-        # SIGTERM is not available on Windows
-        if platform.system() != 'Windows':
-            signal.signal(signal.SIGTERM, self._signal_handler)
-
-    def _signal_handler(self, signum, frame):
-        """Handle signals for graceful cleanup."""
-        self.stdout.write(
-            self.style.WARNING(
-                f'Received signal {signum}. Cleaning up and exiting...'
-            )
-        )
-        self.release_lock()
-        sys.exit(0)
+        # Counts of the last run, read by the Celery shard tasks
+        self.summary = None
 
-    def __del__(self):
-        """Destructor to ensure lock is always released."""
-        self.release_lock()
+    def handle(self, *args, **kwargs):
+        if kwargs.get('force', False):
+            self.stdout.write(self.style.WARNING('Force execution enabled. Running without taking the lock.'))
+            self._run(**kwargs)
+            return
 
-    def acquire_lock(self):
-        """
-        Acquire a file lock to prevent multiple instances from running.
-        Returns True if lock is acquired, False if another instance is running.
-        """
-        try:
-            # Check if PID file exists and if the process is still running
-            if os.path.exists(self.pid_file_path):
-                with open(self.pid_file_path, 'r') as f:
-                    try:
-                        existing_pid = int(f.read().strip())
-                        # Check if process is still running
-                        if self._is_process_running(existing_pid):
-                            return False  # Process is still running
-                        else:
-                            # PID file is stale, remove it
-                            os.remove(self.pid_file_path)
-                    except (ValueError, OSError):
-                        # Invalid PID file, remove it
-                        os.remove(self.pid_file_path)
-            
-            # Create or open the PID file
-            self.lock_file = open(self.pid_file_path, 'w')
-            
-            # Try to acquire an exclusive lock (only on Unix-like systems)
-            if HAS_FCNTL:
-                try:
-                    fcntl.flock(self.lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
-                except (IOError, OSError):
-                    # Lock could not be acquired
-                    self.lock_file.close()
-                    return False
-            
-            # Write the current process ID to the file
-            self.lock_file.write(str(os.getpid()))
-            self.lock_file.flush()
-            
-            return True
-            
-        except (IOError, OSError):
-            # Lock could not be acquired (another instance is running)
-            if self.lock_file:
-                self.lock_file.close()
-            return False
+        shard = kwargs.get('shard')
+        if shard and shard[1] != settings.USER_DATA_SHARDS:
+            # Shards of another count cover overlapping factions, so they cannot share the lock
+            raise CommandError(
+                f'--shard {shard[0]}/{shard[1]} does not match USER_DATA_SHARDS={settings.USER_DATA_SHARDS}'
+            )
 
-    def _is_process_running(self, pid):
-        """Check if a process with given PID is running."""
+        # Database locks, so runs on other hosts and Celery workers are excluded too.
+        # Shards share the update_user_data lock (excluding an unsharded run) and
+        # each holds its own shard lock exclusively.
         try:
-            if platform.system() == 'Windows':
-                # On Windows, use tasklist command to check if process exists
-                import subprocess
-                result = subprocess.run(
-                    ['tasklist', '/FI', f'PID eq {pid}', '/FO', 'CSV'],
-                    capture_output=True,
-                    text=True
-                )
-                return str(pid) in result.stdout
-            else:
-                # On Unix-like systems, sending signal 0 checks if process exists
-                os.kill(pid, 0)
-                return True
-        except (OSError, subprocess.SubprocessError, ImportError):
-            return False
-
-    def release_lock(self):
-        """Release the file lock and clean up."""
-        if self.lock_file:
-            try:
-                # Try to release flock if it was used (Unix only)
-                if HAS_FCNTL:
-                    try:
-                        fcntl.flock(self.lock_file.fileno(), fcntl.LOCK_UN)
-                    except (IOError, OSError):
-                        pass
-                self.lock_file.close()
-                self.lock_file = None
-                # Remove the PID file
-                if os.path.exists(self.pid_file_path):
-                    os.remove(self.pid_file_path)
-            except (IOError, OSError):
-                pass
-
-    def handle(self, *args, **kwargs):
-        # Check if --force option was provided
-        force_execution = kwargs.get('force', False)
-        
-        # Check if another instance is already running (unless forced)
-        if not force_execution and not self.acquire_lock():
+            with single_instance('update_user_data', shared=bool(shard)):
+                if shard:
+                    with single_instance('update_user_data:{}/{}'.format(*shard)):
+                        self._run(**kwargs)
+                else:
+                    self._run(**kwargs)
+        except AlreadyRunning:
             self.stdout.write(
                 self.style.WARNING(
                     'Another instance of update_user_data is already running. Skipping execution.\n'
                     'Use --force to override this check.'
                 )
             )
-            return
-        elif force_execution:
-            # If forced, still try to acquire lock but don't fail if we can't
-            if not self.acquire_lock():
-                self.stdout.write(
-                    self.style.WARNING(
-                        'Force execution enabled. Running despite existing instance.'
-                    )
-                )
 
-        # Log start of execution
+    def _run(self, **kwargs):
         self.stdout.write(
             self.style.SUCCESS(
                 f'Starting update_user_data script at {time.strftime("%Y-%m-%d %H:%M:%S")}'
@@ -181,121 +117,272 @@ class Command(BaseCommand):
         )
 
         try:
-            self._execute_main_logic()
+            self.summary = self._execute_main_logic(
+                concurrency=kwargs.get('concurrency') or 1,
+                delta=kwargs.get('delta', False),
+                shard=kwargs.get('shard'),
+                due_only=kwargs.get('due_only', False),
+            )
         except Exception as e:
             self.stdout.write(
                 self.style.ERROR(f'An error occurred during execution: {str(e)}')
             )
             raise
         finally:
-            # Always release the lock when done
-            self.release_lock()
             self.stdout.write(
                 self.style.SUCCESS(
                     f'Completed update_user_data script at {time.strftime("%Y-%m-%d %H:%M:%S")}'
                 )
             )
 
-    def _execute_main_logic(self):
-        faction_ids = FactionList.objects.values_list(
-            'faction_id', flat=True).distinct()
-        call_timestamps = deque()  # Track timestamps of API calls
+    def _execute_main_logic(self, concurrency=1, delta=False, shard=None, due_only=False):
+        """Fetch and store every (or this shard's, or every due) faction; return the run's counts."""
+        started = time.monotonic()
+        faction_lists = FactionList.objects.in_bulk(field_name='faction_id')
+        if due_only:
+            due = due_faction_ids(timezone.now())
+            self.stdout.write(f'{len(due)} of {len(faction_lists)} factions are due a poll')
+            faction_lists = {faction_id: faction for faction_id, faction in faction_lists.items() if faction_id in due}
+        if shard:
+            faction_lists = {
+                faction_id: faction_lists[faction_id]
+                for faction_id in shard_faction_ids(faction_lists, *shard)
+            }
+            client = get_client(shard_api_key(shard[0], default=API_KEY))
+            self.stdout.write(f'Shard {shard[0]}/{shard[1]}: {len(faction_lists)} factions')
+        else:
+            # Unsharded runs rotate over every active profile key
+            client = get_key_pool(fallback_key=API_KEY)
+        errors = 0
+        stored_records = 0
 
         factions_to_create = []
         user_records_to_create = []
+        member_names = {}
+        failed_ids = []
 
-        for faction_id in faction_ids:
-            # Check if we need to delay to respect the rate limit
-            current_time = time.time()
-            while call_timestamps and current_time - call_timestamps[0] > 60:
-                call_timestamps.popleft()  # Remove timestamps older than 60 seconds
-
-            if len(call_timestamps) >= 40:
-                delay = 65 - (current_time - call_timestamps[0])
-                self.stdout.write(self.style.NOTICE(
-                    f'Rate limit reached. Waiting for {delay:.2f} seconds...'))
-                time.sleep(delay)
-                call_timestamps.popleft()
-
-            # Make the API call
-            url = f'https://api.torn.com/faction/{faction_id}?selections=basic&key={API_KEY}'
-            # self.stdout.write(self.style.NOTICE(f'Fetching data from {url}'))
-            response = requests.get(url)
-            # Record the timestamp of this call
-            call_timestamps.append(time.time())
-
-            if response.status_code != 200:
-                self.stdout.write(self.style.ERROR(
-                    f'Failed to fetch data for faction ID {faction_id}. Status code: {response.status_code}'))
-                continue
-
-            data = response.json()
-            # self.stdout.write(self.style.NOTICE(
-            #     f'Response data for faction ID {faction_id}: {data}'))
-
-            # Check if the faction data exists
-            if 'ID' in data:
-                faction_data = data
-                faction_list = FactionList.objects.get(
-                    faction_id=faction_data['ID']
-                )
-                
-                # Construct the rank string
-                rank_data = faction_data.get('rank', {})
-                rank_name = rank_data.get('name', '')
-                rank_division = rank_data.get('division', 0)
-                rank = rank_name + (' ' + 'I' * rank_division if rank_division > 0 else '')
-
-                # Collect faction data for bulk creation
-                factions_to_create.append(Faction(
-                    faction_id=faction_list,
-                    respect=faction_data['respect'],
-                    rank=rank
-                ))
+        # The client waits for the per-key rate budget before each call.
+        # With --concurrency > 1 requests overlap and each payload is handed
+        # back here as soon as it arrives.
+        if concurrency > 1:
+            jobs = [
+                (faction_id, f'faction/{faction_id}', {'selections': 'basic'})
+                for faction_id in faction_lists
+            ]
+            results = client.get_many(jobs, concurrency=concurrency)
+        else:
+            results = self._fetch_sequentially(client, faction_lists)
+
+        # Closing stops the fetcher if storing fails or the run is interrupted
+        with contextlib.closing(results):
+            for faction_id, data, error in results:
+                if error is not None:
+                    self.stdout.write(self.style.ERROR(
+                        f'Failed to fetch data for faction ID {faction_id}: {error}'))
+                    failed_ids.append(faction_id)
+                elif not self._process_faction(
+                    faction_id, data, faction_lists, factions_to_create, user_records_to_create, member_names
+                ):
+                    failed_ids.append(faction_id)
+                # Store as we go so a run cut short (e.g. by a task time limit) keeps what it fetched
+                if len(factions_to_create) + len(failed_ids) >= WRITE_BATCH_FACTIONS:
+                    errors += len(failed_ids)
+                    stored_records += self._store_batch(
+                        factions_to_create, user_records_to_create, member_names, failed_ids, delta
+                    )
+                    factions_to_create, user_records_to_create, member_names, failed_ids = [], [], {}, []
+
+        errors += len(failed_ids)
+        stored_records += self._store_batch(
+            factions_to_create, user_records_to_create, member_names, failed_ids, delta
+        )
+
+        summary = {
+            'shard': '{}/{}'.format(*shard) if shard else None,
+            'factions': len(faction_lists),
+            'errors': errors,
+            'records': stored_records,
+            'seconds': round(time.monotonic() - started, 2),
+        }
+        self.stdout.write(self.style.SUCCESS(
+            f"Fetched {summary['factions']} factions ({summary['errors']} failed) in {summary['seconds']}s."
+        ))
+        return summary
+
+    @transaction.atomic
+    def _store_batch(self, factions_to_create, user_records_to_create, member_names, failed_ids, delta):
+        """
+        Write one batch of fetched factions and reschedule them and the
+        factions that failed, together; return the number of UserRecords stored.
+        """
+        now = timezone.now()
+        if failed_ids:
+            record_failed_polls(failed_ids, now)
+        if not factions_to_create:
+            return 0
+
+        # Make sure every member has a UserList row before their records reference it
+        self._sync_user_list(member_names)
+
+        # Keep the hourly activity rollup read by faction_comparison up to date
+        activity_rows = record_activity(
+            (record.current_faction_id, record.user_id_id, record.last_action_timestamp)
+            for record in user_records_to_create
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Updated {activity_rows} faction activity hours.'
+        ))
 
-                # Process members data
-                if 'members' in faction_data:
-                    for member_id, member_data in faction_data['members'].items():
-                        # Use member_id as user_id if 'user_id' is missing
-                        user_id = member_data.get('user_id', member_id)
-
-                        # Ensure UserList exists
-                        user_list, created = UserList.objects.get_or_create(
-                            user_id=user_id,
-                            defaults={'game_name': member_data['name']}
-                        )
-
-                        # Collect user record data for bulk creation
-                        user_records_to_create.append(UserRecord(
-                            user_id=user_list,
-                            name=member_data['name'],
-                            level=member_data['level'],
-                            days_in_faction=member_data['days_in_faction'],
-                            last_action_status=member_data['last_action']['status'],
-                            last_action_timestamp=member_data['last_action']['timestamp'],
-                            last_action_relative=member_data['last_action']['relative'],
-                            status_description=member_data['status']['description'],
-                            status_details=member_data['status'].get(
-                                'details', ''),
-                            status_state=member_data['status']['state'],
-                            status_color=member_data['status']['color'],
-                            status_until=member_data['status']['until'],
-                            position=member_data['position'],
-                            current_faction=faction_list
-                        ))
-            else:
-                self.stdout.write(self.style.ERROR(
-                    f'Failed to fetch faction data for faction ID {faction_id}'))
-
-        # Bulk create factions and user records
-        if factions_to_create:
-            Faction.objects.bulk_create(factions_to_create)
+        # Compared before UserLastSeen is overwritten; feeds --delta and the poll schedule
+        changed_records = self._changed_records(user_records_to_create)
+        rescheduled = record_polls(
+            [faction.faction_id_id for faction in factions_to_create], user_records_to_create, changed_records, now
+        )
+        self.stdout.write(self.style.SUCCESS(f'Rescheduled {rescheduled} faction polls.'))
+        self._record_last_seen(user_records_to_create)
+
+        if delta:
+            fetched_count = len(user_records_to_create)
+            user_records_to_create = changed_records
             self.stdout.write(self.style.SUCCESS(
-                f'Successfully added {len(factions_to_create)} factions in bulk.'
+                f'{len(user_records_to_create)} of {fetched_count} members changed since their last record.'
             ))
 
+        Faction.objects.bulk_create(factions_to_create)
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully added {len(factions_to_create)} factions in bulk.'
+        ))
+
         if user_records_to_create:
             UserRecord.objects.bulk_create(user_records_to_create)
             self.stdout.write(self.style.SUCCESS(
                 f'Successfully added {len(user_records_to_create)} user records in bulk.'
             ))
+
+        bump_dataset_version(FACTION)
+        return len(user_records_to_create)
+
+    def _fetch_sequentially(self, client, faction_ids):
+        """Yield ``(faction_id, data, error)`` one request at a time."""
+        for faction_id in faction_ids:
+            try:
+                yield faction_id, client.get(f'faction/{faction_id}', selections='basic'), None
+            except TornAPIError as e:
+                yield faction_id, None, e
+
+    def _changed_records(self, records):
+        """Drop records whose tracked fields match the member's state in UserLastSeen."""
+        last_states = {
+            row[0]: row[1:]
+            for row in UserLastSeen.objects.filter(user_id__in=[record.user_id_id for record in records])
+            .values_list('user_id', *TRACKED_FIELDS)
+        }
+        return [
+            record for record in records
+            if last_states.get(record.user_id_id) != tuple(getattr(record, field) for field in TRACKED_FIELDS)
+        ]
+
+    def _record_last_seen(self, records):
+        """Upsert the latest activity and tracked state of every fetched member into UserLastSeen."""
+        fields = ('last_action_status', 'last_action_timestamp', 'last_action_relative') + TRACKED_FIELDS
+        # A member who moved between two factions of the batch appears twice; an
+        # upsert may touch each row only once, so the faction fetched last wins
+        latest = {record.user_id_id: record for record in records}
+        UserLastSeen.objects.bulk_create(
+            [
+                UserLastSeen(user_id=user_id, **{field: getattr(record, field) for field in fields})
+                for user_id, record in latest.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['user'],
+            update_fields=[field.removesuffix('_id') for field in fields] + ['updated_on'],
+            batch_size=1000,
+        )
+
+    def _sync_user_list(self, member_names):
+        """
+        Create missing UserList rows and refresh changed game names for
+        ``member_names`` ({user_id: name}) using a fixed number of queries.
+        """
+        if not member_names:
+            return
+
+        existing_names = dict(
+            UserList.objects.filter(user_id__in=member_names.keys())
+            .values_list('user_id', 'game_name')
+        )
+
+        users_to_create = [
+            UserList(user_id=user_id, game_name=name)
+            for user_id, name in member_names.items()
+            if user_id not in existing_names
+        ]
+        users_to_update = [
+            UserList(user_id=user_id, game_name=name)
+            for user_id, name in member_names.items()
+            if user_id in existing_names and existing_names[user_id] != name
+        ]
+
+        if users_to_create:
+            UserList.objects.bulk_create(users_to_create, ignore_conflicts=True)
+        if users_to_update:
+            UserList.objects.bulk_update(users_to_update, ['game_name'], batch_size=1000)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'User list: {len(users_to_create)} new, {len(users_to_update)} renamed.'
+        ))
+
+    def _process_faction(self, faction_id, faction_data, faction_lists, factions_to_create, user_records_to_create, member_names):
+        """
+        Turn one faction payload into Faction and UserRecord rows awaiting bulk
+        creation; return False if the payload holds no tracked faction.
+        """
+        # Check if the faction data exists
+        if 'ID' not in faction_data or faction_data['ID'] not in faction_lists:
+            self.stdout.write(self.style.ERROR(
+                f'Failed to fetch faction data for faction ID {faction_id}'))
+            return False
+
+        faction_list = faction_lists[faction_data['ID']]
+
+        # Construct the rank string
+        rank_data = faction_data.get('rank', {})
+        rank_name = rank_data.get('name', '')
+        rank_division = rank_data.get('division', 0)
+        rank = rank_name + (' ' + 'I' * rank_division if rank_division > 0 else '')
+
+        # Collect faction data for bulk creation
+        factions_to_create.append(Faction(
+            faction_id=faction_list,
+            respect=faction_data['respect'],
+            rank=rank
+        ))
+
+        # Process members data
+        if 'members' in faction_data:
+            for member_id, member_data in faction_data['members'].items():
+                # Use member_id as user_id if 'user_id' is missing
+                user_id = int(member_data.get('user_id', member_id))
+
+                # UserList rows are created in bulk when the batch is stored
+                member_names[user_id] = member_data['name']
+
+                # Collect user record data for bulk creation
+                user_records_to_create.append(UserRecord(
+                    user_id_id=user_id,
+                    name=member_data['name'],
+                    level=member_data['level'],
+                    days_in_faction=member_data['days_in_faction'],
+                    last_action_status=member_data['last_action']['status'],
+                    last_action_timestamp=member_data['last_action']['timestamp'],
+                    last_action_relative=member_data['last_action']['relative'],
+                    status_description=member_data['status']['description'],
+                    status_details=member_data['status'].get(
+                        'details', ''),
+                    status_state=member_data['status']['state'],
+                    status_color=member_data['status']['color'],
+                    status_until=member_data['status']['until'],
+                    position=member_data['position'],
+                    current_faction=faction_list
+                ))
+        return True
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.6 on 2026-10-18 03:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('faction', '0001_initial'),
+        ('users', '0002_tornuserprofile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserLastSeen',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='users.userlist')),
+                ('last_action_status', models.CharField(max_length=255)),
+                ('last_action_timestamp', models.IntegerField()),
+                ('last_action_relative', models.CharField(max_length=255)),
+                ('updated_on', models.DateTimeField(auto_now=True)),
+                ('current_faction', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='faction.factionlist', to_field='faction_id')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['current_faction', 'last_action_timestamp'], name='users_userl_current_3200fe_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.1.6 on 2026-10-18 03:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_instancelock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userlastseen',
+            name='level',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='userlastseen',
+            name='name',
+            field=models.CharField(max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='userlastseen',
+            name='position',
+            field=models.CharField(max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='userlastseen',
+            name='status_color',
+            field=models.CharField(max_length=50, null=True),
+        ),
+        migrations.AddField(
+            model_name='userlastseen',
+            name='status_description',
+            field=models.CharField(max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='userlastseen',
+            name='status_details',
+            field=models.CharField(max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='userlastseen',
+            name='status_state',
+            field=models.CharField(max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='userlastseen',
+            name='status_until',
+            field=models.IntegerField(null=True),
+        ),
+    ]
@@ -33,6 +33,38 @@ class UserRecord(models.Model):
     def __str__(self):
         return self.name
 
+class UserLastSeen(models.Model):
+    """
+    Latest activity heartbeat and tracked state per user, overwritten on every
+    ingest run. update_user_data compares fetched members against the tracked
+    state to find who changed, and --delta skips a full UserRecord row when
+    only the last action did. The tracked state is empty for users not seen
+    since it was added, which counts as a change.
+    """
+    user = models.OneToOneField(UserList, on_delete=models.CASCADE, to_field='user_id', primary_key=True)
+    current_faction = models.ForeignKey('faction.FactionList', on_delete=models.CASCADE, to_field='faction_id')
+    last_action_status = models.CharField(max_length=255)
+    last_action_timestamp = models.IntegerField()
+    last_action_relative = models.CharField(max_length=255)
+    # Tracked UserRecord fields (update_user_data.TRACKED_FIELDS) as last fetched
+    name = models.CharField(max_length=255, null=True)
+    level = models.IntegerField(null=True)
+    status_description = models.CharField(max_length=255, null=True)
+    status_details = models.CharField(max_length=255, null=True)
+    status_state = models.CharField(max_length=255, null=True)
+    status_color = models.CharField(max_length=50, null=True)
+    status_until = models.IntegerField(null=True)
+    position = models.CharField(max_length=255, null=True)
+    updated_on = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['current_faction', 'last_action_timestamp']),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.last_action_relative}"
+
 class UserOrganisedCrimeCPR(models.Model):
     user = models.ForeignKey(UserList, on_delete=models.CASCADE, to_field='user_id')
     organised_crime_role = models.ForeignKey(OrganisedCrimeRole, on_delete=models.CASCADE)
@@ -77,3 +109,18 @@ class TornUserProfile(models.Model):
         return f"{self.user.username} - {self.tornuser}"
 
 
+
+
+class InstanceLock(models.Model):
+    """
+    Lease row behind Torn.locks.single_instance on databases without advisory
+    locks. A lease past ``expires_at`` belongs to a run that died and may be
+    taken over.
+    """
+    name = models.CharField(max_length=100, primary_key=True)
+    owner = models.CharField(max_length=255)
+    acquired_at = models.DateTimeField()
+    expires_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name} held by {self.owner} until {self.expires_at}"
@@ -0,0 +1,54 @@
+"""
+Splitting the update_user_data faction ingest across worker processes.
+
+``--shard i/n`` keeps the factions whose id is ``i`` modulo ``n``, so every
+worker computes the same partition without coordinating, and each shard uses
+its own API key so the shards' rate budgets add up.
+"""
+
+import argparse
+
+from .models import TornUserProfile
+
+
+def parse_shard(value):
+    """argparse type for ``i/n`` with 0 <= i < n."""
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected i/n, got '{value}'")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"shard index must be in 0..n-1, got '{value}'")
+    return index, count
+
+
+def shard_faction_ids(faction_ids, index, count):
+    return [faction_id for faction_id in faction_ids if faction_id % count == index]
+
+
+def shard_api_key(index, default):
+    """The active profile key for shard ``index``; ``default`` when no profile key is active."""
+    keys = list(dict.fromkeys(
+        TornUserProfile.objects.filter(is_active=True)
+        .order_by('created_at', 'pk')
+        .values_list('tornapi', flat=True)
+    ))
+    return keys[index % len(keys)] if keys else default
+
+
+def merge_summaries(summaries):
+    """
+    Combine per-shard summaries. Shards run side by side, so throughput is the
+    total request count over the slowest shard's time.
+    """
+    merged = {
+        'shards': len(summaries),
+        'factions': sum(summary['factions'] for summary in summaries),
+        'errors': sum(summary['errors'] for summary in summaries),
+        'records': sum(summary['records'] for summary in summaries),
+        'seconds': max((summary['seconds'] for summary in summaries), default=0.0),
+    }
+    merged['requests_per_minute'] = (
+        round(merged['factions'] * 60 / merged['seconds'], 1) if merged['seconds'] else 0.0
+    )
+    return merged
@@ -0,0 +1,66 @@
+import logging
+
+from celery import chord, shared_task
+from django.conf import settings
+from django.core.management import call_command
+from Torn.locks import single_instance
+from users.management.commands.update_user_data import Command as UpdateUserDataCommand
+from users.sharding import merge_summaries
+
+logger = logging.getLogger(__name__)
+
+# acks_late: a run lost with its worker is redelivered. update_cpr_data upserts,
+# so a repeat changes nothing. update_user_data appends history, so a redelivered
+# run adds another Faction row for each faction it fetches again.
+#
+# The scheduled runs use --delta: hot factions are polled every few minutes, so
+# only members whose tracked fields changed get a new UserRecord.
+#
+# update_user_data stores every WRITE_BATCH_FACTIONS factions as it goes, so a run
+# stopped by the time limit keeps what it fetched; the next tick (skipped while
+# this one still holds the command's lock) carries on with the rest.
+
+@shared_task(acks_late=True, soft_time_limit=840, time_limit=900)
+def update_user_data_task():
+    """Run the ingest in one go, or fan it out over USER_DATA_SHARDS shard tasks."""
+    shards = settings.USER_DATA_SHARDS
+    if shards > 1:
+        chord(update_user_data_shard_task.s(index, shards) for index in range(shards))(
+            merge_user_data_shards.s()
+        )
+        return
+    # The command's own lock makes an overlapping run skip instead of double-fetching
+    call_command('update_user_data', delta=True, due_only=True, concurrency=settings.USER_DATA_CONCURRENCY)
+
+
+@shared_task(acks_late=True, soft_time_limit=840, time_limit=900)
+def update_user_data_shard_task(index, count):
+    """One shard of the ingest; returns its summary, or None when another run holds the shard."""
+    command = UpdateUserDataCommand()
+    call_command(
+        command, delta=True, due_only=True, concurrency=settings.USER_DATA_CONCURRENCY, shard=(index, count)
+    )
+    return command.summary
+
+
+@shared_task
+def merge_user_data_shards(summaries):
+    merged = merge_summaries([summary for summary in summaries if summary])
+    logger.info(
+        'update_user_data: %(shards)s shard(s), %(factions)s factions (%(errors)s failed), '
+        '%(records)s records in %(seconds)ss, %(requests_per_minute)s requests/min',
+        merged,
+    )
+    return merged
+
+
+@shared_task(acks_late=True, soft_time_limit=120, time_limit=150)
+@single_instance('update_cpr_data', lease_seconds=150)
+def update_cpr_data_task():
+    call_command('update_cpr_data')
+
+
+@shared_task(acks_late=True, soft_time_limit=3300, time_limit=3500)
+@single_instance('archive_history', lease_seconds=3500)
+def archive_history_task():
+    call_command('archive_history')
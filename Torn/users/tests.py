@@ -1,3 +1,332 @@
-from django.test import TestCase
+import argparse
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock, skipIf, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from faction.models import Faction, FactionList, FactionPollState
+from users.management.commands.update_user_data import Command as UpdateUserDataCommand
+from users.models import InstanceLock, TornUserProfile, UserLastSeen, UserList, UserRecord
+from users.sharding import merge_summaries, parse_shard
+from Torn.archive import history_values
+from Torn.locks import AlreadyRunning, advisory_key, single_instance
+from Torn.torn_api import TornAPIError
+
+
+def member_payload(name, timestamp=1700000000, state='Okay'):
+    return {
+        'name': name,
+        'level': 50,
+        'days_in_faction': 10,
+        'last_action': {'status': 'Offline', 'timestamp': timestamp, 'relative': '1 hour ago'},
+        'status': {'description': 'Okay', 'details': '', 'state': state, 'color': 'green', 'until': 0},
+        'position': 'Member',
+    }
+
+
+def faction_payload(faction_id, members):
+    return {
+        'ID': faction_id,
+        'name': f'Faction {faction_id}',
+        'respect': 1000,
+        'rank': {'name': 'Platinum', 'division': 2},
+        'members': members,
+    }
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class UpdateUserDataTests(TestCase):
+    def setUp(self):
+        self.faction = FactionList.objects.create(faction_id=1, name='Faction 1', tag='F1')
+
+    def run_command(self, payloads, **options):
+        """Run the ingest against ``payloads`` ({faction_id: payload, or an exception to raise})."""
+        def fake_get(path, **kwargs):
+            payload = payloads[int(path.rsplit('/', 1)[-1])]
+            if isinstance(payload, Exception):
+                raise payload
+            return payload
+
+        client = mock.Mock()
+        client.get.side_effect = fake_get
+        command = UpdateUserDataCommand(stdout=StringIO())
+        with mock.patch('users.management.commands.update_user_data.get_key_pool', return_value=client):
+            command._execute_main_logic(**options)
+        return command
+
+    def test_user_list_is_upserted_in_bulk(self):
+        UserList.objects.create(user_id=1, game_name='OldName')
+        members = {str(user_id): member_payload(f'Player{user_id}') for user_id in range(1, 51)}
+
+        # faction lookup, savepoint, existing users, bulk insert, bulk update,
+        # activity rollup read + upsert, last seen read, poll schedule upsert,
+        # last seen upsert, faction + record inserts, release
+        with self.assertNumQueries(13):
+            self.run_command({1: faction_payload(1, members)})
+
+        self.assertEqual(UserList.objects.count(), 50)
+        self.assertEqual(UserList.objects.get(user_id=1).game_name, 'Player1')
+        self.assertEqual(UserRecord.objects.count(), 50)
+        self.assertEqual(Faction.objects.get().rank, 'Platinum II')
+
+    def test_delta_mode_only_stores_changed_members(self):
+        members = {'1': member_payload('Alice'), '2': member_payload('Bob')}
+        self.run_command({1: faction_payload(1, members)}, delta=True)
+        self.assertEqual(UserRecord.objects.count(), 2)
+
+        # Only last action moved for Alice; Bob went to hospital
+        members = {
+            '1': member_payload('Alice', timestamp=1700003600),
+            '2': member_payload('Bob', timestamp=1700003600, state='Hospital'),
+        }
+        self.run_command({1: faction_payload(1, members)}, delta=True)
+
+        self.assertEqual(UserRecord.objects.filter(user_id=1).count(), 1)
+        self.assertEqual(UserRecord.objects.filter(user_id=2).count(), 2)
+        self.assertEqual(UserLastSeen.objects.get(user_id=1).last_action_timestamp, 1700003600)
+
+    def test_member_listed_under_two_factions_is_seen_once(self):
+        FactionList.objects.create(faction_id=2, name='Faction 2', tag='F2')
+        payloads = {
+            1: faction_payload(1, {'1': member_payload('Alice')}),
+            2: faction_payload(2, {'1': member_payload('Alice', timestamp=1700003600)}),
+        }
+        self.run_command(payloads, delta=True)
+
+        seen = UserLastSeen.objects.get(user_id=1)
+        self.assertEqual((seen.current_faction_id, seen.last_action_timestamp), (2, 1700003600))
+        self.assertEqual(UserRecord.objects.filter(user_id=1).count(), 2)
+
+    @mock.patch('users.management.commands.update_user_data.WRITE_BATCH_FACTIONS', 1)
+    def test_batches_are_stored_before_the_run_finishes(self):
+        FactionList.objects.create(faction_id=2, name='Faction 2', tag='F2')
+        payloads = {1: faction_payload(1, {'1': member_payload('Alice')})}
+
+        # Faction 2 is never fetched: the run is cut short after faction 1
+        with self.assertRaises(KeyError):
+            self.run_command(payloads)
+
+        self.assertEqual(Faction.objects.get().faction_id_id, 1)
+        self.assertEqual(UserRecord.objects.get().name, 'Alice')
+
+    def test_failed_and_empty_factions_are_rescheduled(self):
+        FactionList.objects.create(faction_id=2, name='Faction 2', tag='F2')
+        FactionList.objects.create(faction_id=3, name='Faction 3', tag='F3')
+        payloads = {1: faction_payload(1, {}), 2: {'unexpected': 'payload'}, 3: TornAPIError('Timeout')}
+
+        self.run_command(payloads)
+        self.run_command(payloads)
+
+        states = FactionPollState.objects.in_bulk()
+        self.assertEqual((states[1].member_count, states[1].error_count, states[1].interval_seconds), (0, 0, 3600))
+        self.assertEqual((states[2].error_count, states[2].interval_seconds), (2, 360))
+        self.assertEqual((states[3].error_count, states[3].interval_seconds), (2, 360))
+
+    def test_due_only_skips_factions_polled_recently(self):
+        FactionList.objects.create(faction_id=2, name='Faction 2', tag='F2')
+        FactionPollState.objects.create(
+            faction_id=2, last_polled_at=timezone.now(), next_poll_at=timezone.now() + timedelta(hours=1),
+            interval_seconds=3600,
+        )
+        payloads = {1: faction_payload(1, {'1': member_payload('Alice')}), 2: faction_payload(2, {})}
+        self.run_command(payloads, due_only=True)
+
+        self.assertEqual(Faction.objects.get().faction_id_id, 1)
+        self.assertTrue(FactionPollState.objects.filter(faction_id=1).exists())
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ShardedUpdateUserDataTests(TestCase):
+    def setUp(self):
+        for faction_id in range(1, 7):
+            FactionList.objects.create(faction_id=faction_id, name=f'Faction {faction_id}', tag=f'F{faction_id}')
+        django_user = User.objects.create(username='owner')
+        for key in ('key-a', 'key-b'):
+            TornUserProfile.objects.create(user=django_user, tornuser=key, tornapi=key)
+
+    def test_shards_partition_factions_and_use_their_own_key(self):
+        fetched = {}
+        for index in range(3):
+            client = mock.Mock()
+            client.get.side_effect = lambda path, **kwargs: faction_payload(int(path.rsplit('/', 1)[-1]), {})
+            command = UpdateUserDataCommand(stdout=StringIO())
+            with mock.patch('users.management.commands.update_user_data.get_client', return_value=client) as get_client:
+                summary = command._execute_main_logic(shard=(index, 3))
+            fetched[index] = sorted(int(call.args[0].rsplit('/', 1)[-1]) for call in client.get.call_args_list)
+            self.assertEqual(summary['factions'], 2)
+            self.assertEqual(get_client.call_args.args[0], ['key-a', 'key-b', 'key-a'][index])
+
+        self.assertEqual(fetched, {0: [3, 6], 1: [1, 4], 2: [2, 5]})
+
+    def test_parse_shard_rejects_out_of_range_index(self):
+        self.assertEqual(parse_shard('1/4'), (1, 4))
+        for value in ('4/4', '-1/2', 'x', '1/0'):
+            with self.assertRaises(argparse.ArgumentTypeError):
+                parse_shard(value)
+
+    def test_merge_summaries_reports_throughput_over_the_slowest_shard(self):
+        merged = merge_summaries([
+            {'shard': '0/2', 'factions': 30, 'errors': 1, 'records': 900, 'seconds': 30.0},
+            {'shard': '1/2', 'factions': 30, 'errors': 0, 'records': 800, 'seconds': 60.0},
+        ])
+        self.assertEqual(merged['factions'], 60)
+        self.assertEqual(merged['errors'], 1)
+        self.assertEqual(merged['requests_per_minute'], 60.0)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ArchiveHistoryTests(TestCase):
+    def setUp(self):
+        self.archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.archive_dir)
+        self.faction = FactionList.objects.create(faction_id=1, name='Faction 1', tag='F1')
+        UserList.objects.create(user_id=1, game_name='Member')
+
+    def add_record(self, days_ago, level=50):
+        record = UserRecord.objects.create(
+            user_id_id=1, name='Member', level=level, days_in_faction=10,
+            last_action_status='Offline', last_action_timestamp=1700000000, last_action_relative='1 hour ago',
+            status_description='Okay', status_details='', status_state='Okay', status_color='green',
+            status_until=0, position='Member', current_faction=self.faction,
+        )
+        # created_on is auto_now_add
+        UserRecord.objects.filter(pk=record.pk).update(created_on=timezone.now() - timedelta(days=days_ago))
+        return record
+
+    def test_old_rows_move_to_partitions_and_stay_readable(self):
+        self.add_record(days_ago=200, level=1)
+        self.add_record(days_ago=200, level=2)
+        self.add_record(days_ago=190, level=3)
+        self.add_record(days_ago=1, level=4)
+
+        with self.settings(HISTORY_ARCHIVE_DIR=self.archive_dir):
+            call_command('archive_history', '--days', '180', '--table', 'userrecord', '--format', 'npz',
+                         '--batch-size', '2', stdout=StringIO())
+            history = list(history_values('userrecord', ['level', 'user_id_id', 'created_on']))
+
+        self.assertEqual(list(UserRecord.objects.values_list('level', flat=True)), [4])
+        partitions = os.listdir(os.path.join(self.archive_dir, 'userrecord'))
+        self.assertEqual(len(partitions), 2)
+        self.assertEqual([row['level'] for row in history], [1, 2, 3, 4])
+        self.assertEqual({row['user_id_id'] for row in history}, {1})
+        self.assertTrue(all(timezone.is_aware(row['created_on']) for row in history))
+
+    def test_history_values_filters_archived_rows_by_date(self):
+        self.add_record(days_ago=200, level=1)
+        self.add_record(days_ago=190, level=2)
+        with self.settings(HISTORY_ARCHIVE_DIR=self.archive_dir):
+            call_command('archive_history', '--table', 'userrecord', '--format', 'npz', stdout=StringIO())
+            start = timezone.localdate() - timedelta(days=195)
+            history = list(history_values('userrecord', ['level'], start=start))
+
+        self.assertEqual(history, [{'level': 2}])
+
+    def test_dry_run_keeps_rows(self):
+        self.add_record(days_ago=200)
+        with self.settings(HISTORY_ARCHIVE_DIR=self.archive_dir):
+            call_command('archive_history', '--table', 'userrecord', '--dry-run', stdout=StringIO())
+
+        self.assertEqual(UserRecord.objects.count(), 1)
+        self.assertEqual(os.listdir(self.archive_dir), [])
+
+
+# A PostgreSQL session re-enters its own advisory locks, so holders in one test
+# only exclude each other through the lease table
+@skipIf(connection.vendor == 'postgresql', 'lease fallback for databases without advisory locks')
+class SingleInstanceTests(TestCase):
+    def test_second_holder_is_refused_until_release(self):
+        with single_instance('ingest'):
+            with self.assertRaises(AlreadyRunning):
+                with single_instance('ingest'):
+                    pass
+        self.assertFalse(InstanceLock.objects.exists())
+
+        with single_instance('ingest'):
+            self.assertEqual(InstanceLock.objects.get().name, 'ingest')
+
+    def test_expired_lease_is_taken_over(self):
+        stale = timezone.now() - timedelta(minutes=1)
+        InstanceLock.objects.create(name='ingest', owner='dead-host:1', acquired_at=stale, expires_at=stale)
+
+        with single_instance('ingest') as lock:
+            self.assertEqual(InstanceLock.objects.get().owner, lock.owner)
+
+    def test_decorated_call_is_skipped_while_held(self):
+        calls = []
+
+        @single_instance('ingest')
+        def ingest():
+            calls.append(1)
+            return 'ran'
+
+        with single_instance('ingest'):
+            self.assertIsNone(ingest())
+        self.assertEqual(ingest(), 'ran')
+        self.assertEqual(calls, [1])
+
+    def test_update_user_data_skips_while_another_run_holds_the_lock(self):
+        with mock.patch.object(UpdateUserDataCommand, '_execute_main_logic') as main_logic:
+            with single_instance('update_user_data'):
+                call_command('update_user_data', stdout=StringIO())
+            main_logic.assert_not_called()
+
+            call_command('update_user_data', stdout=StringIO())
+            main_logic.assert_called_once()
+
+    def test_shared_holders_exclude_the_exclusive_lock_only(self):
+        with single_instance('ingest', shared=True):
+            with single_instance('ingest', shared=True):
+                with self.assertRaises(AlreadyRunning):
+                    with single_instance('ingest'):
+                        pass
+        self.assertFalse(InstanceLock.objects.exists())
+
+        with single_instance('ingest'):
+            with self.assertRaises(AlreadyRunning):
+                with single_instance('ingest', shared=True):
+                    pass
+
+    @override_settings(USER_DATA_SHARDS=2)
+    def test_update_user_data_shards_exclude_an_unsharded_run(self):
+        with mock.patch.object(UpdateUserDataCommand, '_execute_main_logic') as main_logic:
+            with single_instance('update_user_data'):
+                call_command('update_user_data', shard=(0, 2), stdout=StringIO())
+            main_logic.assert_not_called()
+
+            with single_instance('update_user_data', shared=True):
+                call_command('update_user_data', shard=(1, 2), stdout=StringIO())
+            main_logic.assert_called_once()
+
+            with self.assertRaises(CommandError):
+                call_command('update_user_data', shard=(0, 3), stdout=StringIO())
+
+
+@skipUnless(connection.vendor == 'postgresql', 'advisory locks need PostgreSQL')
+class AdvisoryLockTests(TestCase):
+    def try_lock_elsewhere(self, name):
+        """Whether another session could take ``name`` now; releases it again if so."""
+        other = connections.create_connection('default')
+        try:
+            with other.cursor() as cursor:
+                cursor.execute('SELECT pg_try_advisory_lock(%s)', [advisory_key(name)])
+                acquired = cursor.fetchone()[0]
+                if acquired:
+                    cursor.execute('SELECT pg_advisory_unlock(%s)', [advisory_key(name)])
+            return acquired
+        finally:
+            other.close()
+
+    def test_other_sessions_are_refused_until_release(self):
+        with single_instance('ingest'):
+            self.assertFalse(self.try_lock_elsewhere('ingest'))
+            self.assertTrue(self.try_lock_elsewhere('other-ingest'))
+        self.assertTrue(self.try_lock_elsewhere('ingest'))
+        self.assertFalse(InstanceLock.objects.exists())